@@ -1,21 +1,18 @@
 import streamlit as st
 import os
-import io
-import base64
-import json
-import re
-import numpy as np
-import matplotlib.pyplot as plt
-from pydub import AudioSegment, silence
-from openai import OpenAI
-from dotenv import load_dotenv
+import html
+import time
+import uuid
+from transcriptor.config import (API_KEY, AUDIO_CACHE_MB, CACHE_DIR, CACHE_TRANSCRIPCION_MB, COLA_DB, COLA_MAX_PENDIENTES, COLA_MAX_POR_USUARIO,
+                                 COLA_MEMORIA_MB, COLA_TRABAJOS, CONCURRENCIA, MAX_SEGMENTO_MS, METRICAS_PUERTO, MODEL_NAME,
+                                 TRABAJOS_DIR)
+from transcriptor.trabajos import SeguimientoActa, Trabajo, TrabajoOcupadoError, id_trabajo
+from transcriptor.acta import formatear_tiempo, nombre_acta
+from transcriptor.metricas import servir_metricas
+# NumPy, PIL y el pipeline se importan tras la clave docente (ver DEPENDENCIAS DEL PROCESADO) y
+# el SDK de la API al generar el primer acta: la pantalla de bloqueo no carga nada de eso
 
 # ================= CONFIGURACIÓN INICIAL =================
-load_dotenv()
-
-API_KEY = os.getenv("OPENROUTER_API_KEY")
-BASE_URL = os.getenv("OPENROUTER_BASE_URL")
-MODEL_NAME = os.getenv("OPENROUTER_MODEL")
 KOFI_URL = "https://ko-fi.com/S6S61TZEJ8"
 raw_passwords = os.getenv("ACCESS_PASSWORD", "")
 VALID_PASSWORDS = [p.strip() for p in raw_passwords.split(",") if p.strip()]
@@ -64,232 +61,174 @@ st.markdown("""
         margin-bottom: 10px;
         opacity: 0.9;
     }
+
+    /* Bloques del acta: un clic lleva el reproductor a su inicio */
+    .acta-bloque {
+        cursor: pointer;
+        padding: 4px 8px;
+        border-radius: 6px;
+        white-space: pre-wrap;
+    }
+    .acta-bloque:hover {
+        background-color: rgba(128, 128, 128, 0.15);
+    }
+    .acta-tiempo {
+        font-family: monospace;
+        opacity: 0.8;
+    }
 </style>
 """, unsafe_allow_html=True)
 
-# ================= CONFIGURACIÓN DE IDIOMAS =================
-MAPA_ISO_IDIOMAS = {
-    'HR': 'CROATA', 'HY': 'ARMENIO', 'KO': 'COREANO', 'EN': 'INGLÉS',
-    'FR': 'FRANCÉS', 'IT': 'ITALIANO', 'DE': 'ALEMÁN', 'PT': 'PORTUGUÉS',
-    'NL': 'NEERLANDÉS', 'SV': 'SUECO', 'DA': 'DANÉS', 'FI': 'FINLANDÉS',
-    'NO': 'NORUEGO', 'IS': 'ISLANDÉS', 'RU': 'RUSO', 'PL': 'POLACO',
-    'RO': 'RUMANO', 'CS': 'CHECO', 'SK': 'ESLOVACO', 'HU': 'HÚNGARO',
-    'BG': 'BÚLGARO', 'SR': 'SERBIO', 'UK': 'UCRANIANO', 'EL': 'GRIEGO',
-    'SL': 'ESLOVENO', 'ET': 'ESTONIO', 'LV': 'LETÓN', 'LT': 'LITUANO',
-    'ZH': 'CHINO', 'JA': 'JAPONÉS', 'AR': 'ÁRABE', 'HI': 'HINDI',
-    'TR': 'TURCO', 'HE': 'HEBREO', 'VI': 'VIETNAMITA', 'TH': 'TAILANDÉS',
-    'ID': 'INDONESIO', 'FA': 'PERSA', 'CA': 'CATALÁN', 'GL': 'GALLEGO',
-    'EU': 'EUSKERA'
+# Un solo listener por página (sin recargar: sirve también mientras se transcribe)
+SCRIPT_SALTO_AUDIO = """
+<script>
+if (!window.actaSaltoAudio) {
+    window.actaSaltoAudio = true;
+    document.addEventListener("click", (evento) => {
+        const bloque = evento.target.closest(".acta-bloque");
+        const audio = document.querySelector("audio");
+        if (!bloque || !audio) return;
+        audio.currentTime = parseFloat(bloque.dataset.seek);
+        audio.play();
+    });
 }
+</script>
+"""
+DESCARGA_PARCIAL_S = 10 # Cada cuánto se renueva la descarga parcial mientras se transcribe aquí
 
 # ================= HERRAMIENTAS Y FUNCIONES =================
 
-def get_ai_client():
-    if not API_KEY: return None
-    return OpenAI(base_url=BASE_URL, api_key=API_KEY)
-
-def normalizar_audio(audio: AudioSegment) -> AudioSegment:
-    audio = audio.set_channels(1)
-    audio = audio.set_frame_rate(16000)
-    audio = audio.high_pass_filter(200) 
-    return audio
-
-def audio_to_base64(audio_segment: AudioSegment) -> str:
-    buffer = io.BytesIO()
-    audio_segment.export(buffer, format="mp3", bitrate="32k")
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-def formatear_tiempo(ms):
-    seconds = int(ms / 1000)
-    minutes = seconds // 60
-    seconds = seconds % 60
-    return f"{minutes:02d}:{seconds:02d}"
-
-def generar_onda_visual(audio_segment):
-    """Genera una imagen simple de la onda de audio para referencia visual."""
-    samples = np.array(audio_segment.get_array_of_samples())
-    if audio_segment.channels == 2:
-        samples = samples[::2]
-    samples = samples[::100]
-
-    fig, ax = plt.subplots(figsize=(10, 1.5))
-    ax.plot(samples, color='#1E88E5', alpha=0.6, linewidth=0.5)
-    ax.axis('off')
-    fig.patch.set_alpha(0)
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
-    buf.seek(0)
-    plt.close(fig)
-    return buf
-
-# ================= LÓGICA DE AUTO-CALIBRACIÓN =================
-
-def autocalibrar_audio(uploaded_file):
-    try:
-        audio = AudioSegment.from_file(uploaded_file)
-        peak = audio.max_dBFS
-        avg = audio.dBFS
-        
-        target_threshold = avg - 10 
-        suggested_slider = target_threshold - peak
-        suggested_slider = max(-60, min(-10, int(suggested_slider)))
-        
-        return suggested_slider, peak, avg
-    except:
-        return -28, 0, 0
-
-# ================= LÓGICA DE IA (DETECTAR Y TRANSCRIBIR) =================
-
-def crear_collage_audio(audio_total: AudioSegment, chunks_ranges: list) -> AudioSegment:
-    collage = AudioSegment.empty()
-    if not chunks_ranges: return audio_total[:60000]
-
-    num_muestras = min(len(chunks_ranges), 6)
-    step = len(chunks_ranges) // num_muestras if num_muestras > 0 else 1
-    
-    for i in range(0, len(chunks_ranges), step):
-        start, end = chunks_ranges[i]
-        duracion = end - start
-        if duracion > 8000:
-            mid = start + (duracion // 2)
-            clip = audio_total[mid - 3000 : mid + 3000] 
-        else:
-            clip = audio_total[start:end]
-        collage += clip
-        if len(collage) > 50000: break
-            
-    return normalizar_audio(collage)
-
-def detectar_lengua_b(client, audio_collage: AudioSegment) -> tuple:
-    b64_audio = audio_to_base64(audio_collage)
-    prompt_sistema = "Eres un lingüista experto. Identifica la LENGUA EXTRANJERA (no Español) en el audio. Responde SOLO con el código ISO 639-1 (2 letras)."
-    try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": prompt_sistema},
-                {
-                    "role": "user", 
-                    "content": [{"type": "text", "text": "Código ISO:"},
-                                {"type": "image_url", "image_url": {"url": f"data:audio/mp3;base64,{b64_audio}"}}]
-                }
-            ],
-            temperature=0, max_tokens=10
-        )
-        raw_text = response.choices[0].message.content.strip().upper()
-        patron_idiomas = r'\b(' + '|'.join(MAPA_ISO_IDIOMAS.keys()) + r')\b'
-        match = re.search(patron_idiomas, raw_text)
-        if match:
-            iso_code = match.group(1)
-            return MAPA_ISO_IDIOMAS.get(iso_code, iso_code), iso_code
-        else: return "IDIOMA_B", "XX"
-    except: return "DESCONOCIDO", "XX"
-
-def limpiar_repeticiones(texto):
-    """
-    Detecta y ELIMINA bucles de alucinación (ej: 'la la la la la').
-    Diferencia entre un tartamudeo natural (2-3 veces) y un error de IA (+4 veces).
+@st.cache_resource
+def get_cache_audio():
+    # Una única caché por proceso, compartida por todas las sesiones
+    return CacheAudio(AUDIO_CACHE_MB * 1024 * 1024)
+
+@st.cache_resource
+def get_cache_transcripciones():
+    return CacheTranscripciones(os.path.join(CACHE_DIR, "transcripciones.sqlite3"), CACHE_TRANSCRIPCION_MB * 1024 * 1024)
+
+@st.cache_resource
+def iniciar_metricas():
+    # Un solo endpoint /metrics por proceso de Streamlit (las sesiones comparten el registro)
+    return servir_metricas(METRICAS_PUERTO) if METRICAS_PUERTO else None
+
+def get_cola():
+    # Una conexión por sesión (no una por sondeo del fragmento). Los reruns de una sesión van en
+    # hilos distintos pero nunca a la vez, por eso la conexión admite cambiar de hilo
+    cola = st.session_state.get('cola')
+    if cola is None:
+        cola = st.session_state['cola'] = ColaTrabajos(COLA_DB, COLA_MAX_PENDIENTES, COLA_MAX_POR_USUARIO, mismo_hilo=False)
+    return cola
+
+def cargar_audio(uploaded_file):
+    """Devuelve (hash, muestras PCM 16 kHz mono). Cada contenido se decodifica una sola vez."""
+    return get_cache_audio().obtener_o_decodificar(uploaded_file.getvalue())
+
+def preparar_audio_largo(uploaded_file):
     """
-    if not texto: return ""
-    
-    # 1. Caso extremo: "la la la la la la" (Alucinación de ruido)
-    # Si una palabra corta (<=3 letras) se repite más de 4 veces, es ruido casi seguro. Borramos todo.
-    patron_ruido = r'\b(\w{1,3})(\s+\1){4,}'
-    if re.search(patron_ruido, texto, flags=re.IGNORECASE):
-        return "" # Devolvemos vacío, asumimos que era ruido de papel/tos
-
-    # 2. Caso leve: Tartamudeo real o bucle pequeño
-    # Si se repite 3 veces, lo dejamos como tartamudeo (ej: "pero pero pero...")
-    return texto
-
-def transcribir_segmento_forense(client, segment_audio: AudioSegment, lengua_b_nombre: str, lengua_b_iso: str, contexto_previo: str, idioma_previo: str) -> dict:
-    # 1. Normalización
-    b64_audio = audio_to_base64(normalizar_audio(segment_audio))
-    
-    # 2. Prompt Forense Anti-Ruido (Actualizado)
-    prompt_sistema = f"""
-    Eres un PERITO TRANSCRIPTOR FORENSE. 
-    Contexto: Examen de Interpretación Bilateral.
-    Idiomas: ESPAÑOL (ES) y {lengua_b_nombre.upper()} ({lengua_b_iso}).
-    
-    CONTEXTO PREVIO: "...{contexto_previo[-300:]}" (Idioma: {idioma_previo})
-
-    INSTRUCCIONES CLAVE:
-    1. TRANSCRIPCIÓN LITERAL (VERBATIM): Escribe EXACTAMENTE lo que escuchas.
-    2. PROHIBIDO CORREGIR: NO arregles la gramática, NO mejores el estilo, NO corrijas la pronunciación. Si el alumno dice "yo sabo", escribe "yo sabo".
-    3. INERCIA DE IDIOMA: Si el audio es ambiguo, corto o una continuación clara, MANTÉN el idioma anterior ({idioma_previo}). Solo cambia si es evidente.
-    4. GESTIÓN DE RUIDO:
-         - Si escuchas RUIDO DE PAPEL, GOLPES, TOS o RESPIRACIÓN FUERTE -> NO lo transcribas como "la la la" o sílabas sueltas. Devuelve texto vacío "".
-         - Solo transcribe si hay PALABRAS INTELIGIBLES. Si solo hay ruido, devuelve "".
-    5. PROHIBIDO REPETIR CONTEXTO: La información de "MEMORIA DE CONTEXTO" es lo que YA se dijo. NO lo vuelvas a escribir. Si el audio actual solo contiene silencio o repite lo anterior, devuelve "".
-    6. FORMATO: JSON estricto.
-    
-    Output: {{"idioma": "ES" o "{lengua_b_iso}", "texto": "..."}}
+    Audio que decodificado pasaría de COLA_MEMORIA_MB (o de duración desconocida): se guarda en
+    disco y se mide por bloques, sin tener nunca el PCM entero en memoria. Devuelve un dict con
+    hash, ruta y niveles, o None si cabe y puede decodificarse entero.
     """
-
+    if not COLA_MEMORIA_MB: return None
+    datos = uploaded_file.getvalue()
+    hash_audio = hash_contenido(datos)
+    ruta = os.path.join(CACHE_DIR, "subidas", hash_audio)
+    if not os.path.exists(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta + ".tmp", "wb") as f: f.write(datos)
+        os.replace(ruta + ".tmp", ruta)
+    estimados = bytes_pcm_estimados(ruta)
+    if estimados is not None and estimados <= COLA_MEMORIA_MB * 1024 * 1024:
+        os.remove(ruta); return None
+    max_peak, avg, total_muestras = niveles_en_streaming(leer_bloques(ruta))
+    return {"hash": hash_audio, "ruta": ruta, "max_peak": max_peak, "avg": avg, "total_muestras": total_muestras}
+
+@st.fragment(run_every=2)
+def seguimiento_cola(id_cola):
+    """Sondea el estado del trabajo en la cola sin recargar toda la página."""
+    est = get_cola().estado(id_cola)
+    if not est:
+        st.session_state.pop('en_cola', None); return
+    if est['estado'] == PENDIENTE:
+        st.info(f"⏳ Examen en cola ({get_cola().posicion(id_cola)} por delante). Puedes dejar esta página abierta.")
+    elif est['estado'] == EN_CURSO:
+        st.progress(est['progreso'], text=est['mensaje'] or "Procesando examen...")
+    else:
+        st.session_state.pop('en_cola', None)
+        if est['estado'] != COMPLETADO: st.session_state['error_cola'] = est['error']
+        st.rerun()
+
+def get_seguimiento(trabajo_id) -> SeguimientoActa:
+    # Uno por sesión: entre reruns (y en cada sondeo) solo se leen las líneas nuevas del diario
+    seguimiento = st.session_state.get('seguimiento_acta')
+    if seguimiento is None or seguimiento.trabajo.id != trabajo_id:
+        seguimiento = st.session_state['seguimiento_acta'] = SeguimientoActa(Trabajo(TRABAJOS_DIR, trabajo_id))
+    return seguimiento
+
+def html_bloque(inicio_ms, dat) -> str:
+    return (f'<div class="acta-bloque" data-seek="{inicio_ms / 1000:.2f}">'
+            f'<span class="acta-tiempo">[{formatear_tiempo(inicio_ms)}] [{html.escape(dat.get("idioma", "??"))}]</span>\n'
+            f'{html.escape(dat.get("texto", ""))}</div>')
+
+def pintar_bloques(zona, bloques):
+    # Un elemento por bloque: en vivo solo viajan al navegador los nuevos
+    for inicio_ms, dat in bloques:
+        zona.html(html_bloque(inicio_ms, dat))
+
+def boton_descarga(hueco, seguimiento, nombre, clave="descarga"):
+    terminado = seguimiento.trabajo.terminado
+    meta = seguimiento.trabajo.meta
+    etiqueta = "📥 Descargar Acta en TXT" if terminado else f"📥 Descargar acta parcial ({len(seguimiento.acta)} intervenciones)"
+    # on_click="ignore": descargar no recarga la página (ni corta una transcripción en curso)
+    hueco.download_button(label=etiqueta, data=seguimiento.acta.texto, file_name=nombre_acta(meta.get('nombre', nombre), meta.get('iso_lb', 'XX')),
+                          mime="text/plain", type="primary", use_container_width=True, on_click="ignore", key=clave)
+
+def pintar_acta(seguimiento, nombre) -> tuple:
+    """Acta clicable y descarga; devuelve (marco, zona, hueco) para seguir añadiendo bloques en vivo."""
+    seguimiento.actualizar()
+    marco = st.empty()
+    zona = marco.container(height=400)
+    pintar_bloques(zona, seguimiento.acta.bloques)
+    hueco = st.empty()
+    boton_descarga(hueco, seguimiento, nombre)
+    return marco, zona, hueco
+
+@st.fragment(run_every=2)
+def acta_en_vivo(seguimiento, nombre):
+    # El worker de la cola va anotando el diario: el acta crece sin recargar la página
+    pintar_acta(seguimiento, nombre)
+
+@st.cache_resource(max_entries=64)
+def get_envolvente(hash_audio, _muestras):
+    # Una por archivo (hash) y compartida entre sesiones: repintar o redimensionar no la recalcula
+    return Envolvente.desde_muestras(_muestras)
+
+@st.cache_resource(max_entries=64)
+def get_perfil(hash_audio, _muestras):
+    # Energía acumulada del archivo: cada combinación de ajustes se evalúa en <1 ms sin releer el audio
+    return PerfilEnergia.desde_muestras(_muestras)
+
+def vista_previa_chunks(umbral_db, min_silence_ms):
+    """Intervenciones que saldrían con estos ajustes (None si aún no hay audio o el silencio no es múltiplo de 10 ms)."""
+    if not st.session_state.get('perfil'): return None
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": prompt_sistema},
-                {
-                    "role": "user", 
-                    "content": [
-                        {"type": "text", "text": "Transcribe (Ignora ruidos de fondo/papel):"},
-                        {"type": "image_url", "image_url": {"url": f"data:audio/mp3;base64,{b64_audio}"}}
-                    ]
-                }
-            ],
-            response_format={"type": "json_object"}, 
-            temperature=0
-        )
-        
-        # --- VALIDACIONES ---
-        if not response or not response.choices: return {"idioma": "ERROR", "texto": ""}
-        mensaje = response.choices[0].message
-        if not mensaje or not mensaje.content: return {"idioma": "??", "texto": ""}
-
-        try:
-            content = json.loads(mensaje.content)
-        except json.JSONDecodeError: return {"idioma": "ERROR", "texto": ""}
-            
-        if isinstance(content, list): resultado = content[0] if content else {}
-        else: resultado = content
-            
-        if not isinstance(resultado, dict): return {"idioma": "??", "texto": ""}
-        
-        texto_raw = resultado.get("texto", "").strip()
-        
-        # Filtros de Alucinación
-        if texto_raw.lower() in ["json", "undefined", "null"]:
-            return {"idioma": "??", "texto": ""}
-        
-        # Filtro Anti-Eco (Python):
-        # Si el texto transcrito está contenido DENTRO del contexto previo (es una repetición exacta), lo borramos.
-        # Usamos los últimos 50 caracteres para comparar.
-        if len(texto_raw) > 10 and texto_raw in contexto_previo[-len(texto_raw)-20:]:
-             return {"idioma": "??", "texto": ""} # Es un eco, lo borramos
-            
-        # APLICAMOS EL FILTRO DE REPETICIÓN
-        texto_final = limpiar_repeticiones(texto_raw)
-        
-        resultado["texto"] = texto_final
-        return resultado
-
-    except Exception as e:
-        return {"idioma": "ERROR", "texto": f"[Error: {str(e)}]"}
+        return st.session_state['perfil'].chunks(umbral_db, min_silence_ms, MAX_SEGMENTO_MS)
+    except ValueError:
+        return None
 
 # ================= UI PRINCIPAL =================
 
 st.set_page_config(page_title="Transcriptor Bilateral", page_icon="🎓", layout="wide")
+iniciar_metricas()
 
 # --- GESTIÓN DE ESTADO ---
 if 'umbral_db' not in st.session_state: st.session_state['umbral_db'] = -28
 if 'min_silence_ms' not in st.session_state: st.session_state['min_silence_ms'] = 2000
 if 'file_id' not in st.session_state: st.session_state['file_id'] = None
 if 'calibrado' not in st.session_state: st.session_state['calibrado'] = False
-if 'waveform_img' not in st.session_state: st.session_state['waveform_img'] = None
+if 'envolvente' not in st.session_state: st.session_state['envolvente'] = None
+if 'perfil' not in st.session_state: st.session_state['perfil'] = None
 
 # --- SIDEBAR + FOOTER FIJO ---
 with st.sidebar:
@@ -352,6 +291,23 @@ if VALID_PASSWORDS:
         """, unsafe_allow_html=True)
         st.stop()
 
+# Identidad para el reparto justo y la cuota de la cola: la sesión. No se deriva de la clave
+# docente (compartida por muchos y no debe quedar, ni hasheada, en la base de datos de la cola)
+if 'usuario' not in st.session_state:
+    st.session_state['usuario'] = uuid.uuid4().hex[:12]
+
+# --- DEPENDENCIAS DEL PROCESADO ---
+# Solo con acceso. Cada rerun vuelve a ejecutar estas líneas, pero tras el primero los módulos
+# ya están en sys.modules y no cuestan nada
+from transcriptor.audio import CacheAudio, hash_contenido
+from transcriptor.onda import Envolvente, renderizar_png
+from transcriptor.vad import PerfilEnergia, autocalibrar_niveles
+from transcriptor.ia import PROMPT_VERSION, get_ai_client
+from transcriptor.cache import CacheTranscripciones
+from transcriptor.pipeline import AudioVacioError, procesar_examen, procesar_examen_streaming
+from transcriptor.streaming import bytes_pcm_estimados, leer_bloques, niveles_en_streaming
+from transcriptor.cola import COMPLETADO, EN_CURSO, PENDIENTE, ColaLlenaError, ColaTrabajos
+
 # --- AJUSTES MANUALES (Solo si hay acceso) ---
 with st.sidebar:
     mostrar_ajustes = st.checkbox("Ajustes manuales para ajuste fino", value=False)
@@ -362,11 +318,15 @@ with st.sidebar:
         min_silence_sec = st.number_input("Silencio Mínimo (s)", 0.5, 5.0, value=silencio_sec_default, step=0.5, help="Tiempo mínimo de pausa para considerar que ha terminado una frase.\n- Recomendado: 2.0 segundos.")
         st.session_state['umbral_db'] = umbral_db_slider
         st.session_state['min_silence_ms'] = int(min_silence_sec * 1000)
+        preview = vista_previa_chunks(st.session_state['umbral_db'], st.session_state['min_silence_ms'])
+        if preview is not None:
+            voz_min = sum(fin - ini for ini, fin in preview) / 60000
+            st.caption(f"✂️ Con estos ajustes: **{len(preview)}** fragmentos ({voz_min:.1f} min de voz)")
     else:
         st.success("✅ Configuración Automática Activa")
 
-client = get_ai_client()
-if not client: st.error("Error: API KEY no configurada"); st.stop()
+# El cliente (y el SDK) se crean al generar el primer acta; uno por proceso (get_ai_client)
+if not API_KEY: st.error("Error: API KEY no configurada"); st.stop()
 
 # --- ZONA DE CARGA ---
 uploaded_file = st.file_uploader("📂 Selecciona el archivo de audio (MP3, M4A, WAV, AAC)", type=['mp3', 'm4a', 'wav', 'aac'])
@@ -375,90 +335,150 @@ if uploaded_file:
     file_id_actual = uploaded_file.name + str(uploaded_file.size)
     if st.session_state['file_id'] != file_id_actual:
         with st.spinner("🔄 Analizando calidad del audio..."):
-            nuevo_umbral, _, _ = autocalibrar_audio(uploaded_file)
+            # El archivo grande de la subida anterior de esta sesión ya no hace falta
+            anterior = st.session_state.pop('audio_largo', None)
+            if anterior and os.path.exists(anterior['ruta']): os.remove(anterior['ruta'])
+            largo = preparar_audio_largo(uploaded_file)
+            if largo:
+                # Sin onda ni vista previa: necesitarían el audio entero en memoria
+                hash_audio, perfil, envolvente = largo['hash'], None, None
+                nuevo_umbral, _, _ = autocalibrar_niveles(largo['max_peak'], largo['avg'])
+                st.session_state['audio_largo'] = largo
+            else:
+                hash_audio, muestras = cargar_audio(uploaded_file)
+                perfil, envolvente = get_perfil(hash_audio, muestras), get_envolvente(hash_audio, muestras)
+                nuevo_umbral, _, _ = perfil.autocalibrar()
+            st.session_state['audio_hash'] = hash_audio
+            st.session_state.pop('trabajo_id', None)
+            st.session_state.pop('seguimiento_acta', None)
             st.session_state['umbral_db'] = nuevo_umbral
             st.session_state['min_silence_ms'] = 2000
             st.session_state['file_id'] = file_id_actual
             st.session_state['calibrado'] = True
             
-            uploaded_file.seek(0)
-            audio_temp = AudioSegment.from_file(uploaded_file)
-            st.session_state['waveform_img'] = generar_onda_visual(audio_temp)
+            st.session_state['envolvente'] = envolvente
+            st.session_state['perfil'] = perfil
             st.rerun()
 
     if st.session_state['calibrado']: st.success("✅ Audio listo. Calidad óptima detectada.")
-
-    if st.button("▶️ GENERAR ACTA DE EXAMEN", type="primary"):
-        with st.status("Procesando examen...", expanded=True) as status:
-            
-            uploaded_file.seek(0)
-            audio_total = AudioSegment.from_file(uploaded_file)
-            max_peak = audio_total.max_dBFS
-            thresh = max_peak + st.session_state['umbral_db']
-            
-            st.write("✂️ Detectando intervenciones del alumno...")
-            chunks = silence.detect_nonsilent(audio_total, min_silence_len=st.session_state['min_silence_ms'], silence_thresh=thresh, seek_step=100)
-            if not chunks: 
-                st.warning("⚠️ Voz muy baja. Reintentando con alta sensibilidad...")
-                chunks = silence.detect_nonsilent(audio_total, min_silence_len=1000, silence_thresh=max_peak-50, seek_step=100)
-            if not chunks: st.error("❌ Audio vacío o irreconocible."); st.stop()
-            st.write(f"✅ {len(chunks)} intervenciones localizadas.")
-            
-            st.write("🌍 Identificando idioma...")
-            collage = crear_collage_audio(audio_total, chunks)
-            nombre_lb, iso_lb = detectar_lengua_b(client, collage)
-            
-            st.write("📝 Transcribiendo con contexto inteligente...")
-            out_buf = io.StringIO()
-            out_buf.write(f"ALUMNO/EXAMEN: {uploaded_file.name}\n")
-            out_buf.write(f"IDIOMAS DETECTADOS: ESPAÑOL (ES) - {nombre_lb} ({iso_lb})\n")
-            out_buf.write("-" * 50 + "\n\n")
-            
-            prog = st.progress(0)
-            
-            # --- BUCLE CON CONTEXTO (Lógica V2.1.0) ---
-            historial_contexto = ""
-            idioma_actual = "ES"
-            
-            for i, (start, end) in enumerate(chunks):
-                seg = audio_total[max(0, start-200):min(len(audio_total), end+200)]
-                
-                # Llamada a la función forense V2.1.0
-                dat = transcribir_segmento_forense(client, seg, nombre_lb, iso_lb, historial_contexto, idioma_actual)
-                
-                texto_segmento = dat.get('texto','')
-                idioma_detectado = dat.get('idioma','??')
-                
-                # Actualizar contexto (si hay texto válido)
-                if texto_segmento:
-                    historial_contexto += f" {texto_segmento}"
-                    if len(historial_contexto) > 800: # Limite para no saturar
-                        historial_contexto = historial_contexto[-800:]
-                
-                # Actualizar inercia de idioma
-                if idioma_detectado in ["ES", iso_lb]:
-                    idioma_actual = idioma_detectado
-                
-                bloque = f"[{formatear_tiempo(start)}] [{idioma_detectado}]\n{texto_segmento}\n\n"
-                out_buf.write(bloque)
-                prog.progress((i+1)/len(chunks))
-            
-            st.session_state['resultado_texto'] = out_buf.getvalue()
-            st.session_state['resultado_nombre'] = f"Acta_{uploaded_file.name}_{iso_lb}.txt"
-            status.update(label="¡Proceso Completado!", state="complete", expanded=False)
+    if st.session_state.get('audio_largo'): st.info("🎞️ Grabación larga: se procesará por bloques, sin vista previa de la onda.")
+
+    if mostrar_ajustes and st.session_state['envolvente']:
+        # Vista previa: los fragmentos que saldrían con los ajustes actuales, sin llamar a la API
+        preview = vista_previa_chunks(st.session_state['umbral_db'], st.session_state['min_silence_ms'])
+        if preview is not None: st.image(renderizar_png(st.session_state['envolvente'], chunks=preview), use_container_width=True)
+
+    # Trabajo de este examen con los ajustes actuales (sobrevive a recargas y desconexiones)
+    trabajo = Trabajo(TRABAJOS_DIR, id_trabajo(st.session_state['audio_hash'], st.session_state['umbral_db'], st.session_state['min_silence_ms'], MODEL_NAME, PROMPT_VERSION))
+    if trabajo.existe:
+        st.session_state['trabajo_id'] = trabajo.id
+        if trabajo.meta.get('estado') == "con_errores" and not st.session_state.get('en_cola'):
+            st.warning("⚠️ Algunas intervenciones no se pudieron transcribir (error de la API). Pulsa GENERAR para reintentarlas.")
+        elif not trabajo.terminado and not st.session_state.get('en_cola'):
+            st.info("⏯️ Hay una transcripción a medias de este examen. Pulsa GENERAR para continuarla donde se quedó.")
+
+    generar = st.button("▶️ GENERAR ACTA DE EXAMEN", type="primary")
+    zona_estado = st.container() # Mensajes del procesado en esta sesión, encima del acta
+    procesar_aqui = False
+
+    if generar and COLA_TRABAJOS:
+        # Modo cola: la web solo encola; el worker (python -m transcriptor worker) procesa, por
+        # bloques si el audio no cabe en COLA_MEMORIA_MB
+        try:
+            st.session_state['en_cola'] = get_cola().encolar(
+                st.session_state['usuario'], uploaded_file.name, uploaded_file.getvalue(), st.session_state['audio_hash'],
+                st.session_state['umbral_db'], st.session_state['min_silence_ms']
+            )
+            st.session_state['trabajo_id'] = st.session_state['en_cola']
+            st.session_state.pop('error_cola', None)
+        except ColaLlenaError as e:
+            st.warning(str(e))
+
+    elif generar:
+        # Se procesa más abajo, con el acta ya en pantalla: cada bloque aparece al cerrarse
+        st.session_state['trabajo_id'] = trabajo.id
+        procesar_aqui = True
+
+    if st.session_state.get('en_cola'): seguimiento_cola(st.session_state['en_cola'])
+    if st.session_state.get('error_cola'): st.error(f"❌ Error procesando el examen: {st.session_state['error_cola']}")
 
 # --- RESULTADOS ---
-if 'resultado_texto' in st.session_state:
-    st.divider()
-    st.subheader("🎧 Revisión y Evaluación")
-    
-    if st.session_state['waveform_img']:
-        st.image(st.session_state['waveform_img'], use_container_width=True)
-    
-    uploaded_file.seek(0)
-    st.audio(uploaded_file)
-    
-    st.markdown("### 📜 Acta Transcrita")
-    st.text_area(label="Texto del examen", value=st.session_state['resultado_texto'], height=400, label_visibility="collapsed")
-    
-    st.download_button(label="📥 Descargar Acta en TXT", data=st.session_state['resultado_texto'], file_name=st.session_state['resultado_nombre'], mime="text/plain", type="primary", use_container_width=True)
\ No newline at end of file
+# El acta se lee del diario del trabajo en disco, de forma incremental: mientras se transcribe
+# (en esta sesión o en el worker de la cola) solo se leen y se pintan los bloques nuevos
+if uploaded_file and 'trabajo_id' in st.session_state:
+    seguimiento = get_seguimiento(st.session_state['trabajo_id'])
+    seguimiento.actualizar()
+    meta_res = seguimiento.trabajo.meta
+
+    if procesar_aqui or st.session_state.get('en_cola') or seguimiento.acta.cabecera or len(seguimiento.acta):
+        st.divider()
+        st.subheader("🎧 Revisión y Evaluación")
+
+        if st.session_state['envolvente']:
+            # Intervenciones sombreadas y rotuladas con el idioma detectado (hasta donde se lleve)
+            etiquetas = [dat.get('idioma', '??') for _, dat in seguimiento.acta.bloques]
+            onda = renderizar_png(st.session_state['envolvente'], chunks=meta_res.get('chunks', []), etiquetas=etiquetas)
+            st.image(onda, use_container_width=True)
+
+        uploaded_file.seek(0)
+        st.audio(uploaded_file)
+        st.html(SCRIPT_SALTO_AUDIO, unsafe_allow_javascript=True)
+
+        st.markdown("### 📜 Acta Transcrita")
+        st.caption("Pulsa cualquier intervención para escucharla en el reproductor.")
+        if st.session_state.get('en_cola'):
+            acta_en_vivo(seguimiento, uploaded_file.name)
+        else:
+            marco, zona, hueco = pintar_acta(seguimiento, uploaded_file.name)
+
+        if procesar_aqui:
+            with zona_estado, st.status("Procesando examen...", expanded=True) as status:
+                barra = []
+                vivo = {'zona': zona, 'descarga': time.monotonic(), 'n': 0}
+                def progreso(fraccion):
+                    # La barra se crea al empezar la transcripción, debajo de los mensajes de estado
+                    if not barra: barra.append(st.progress(0))
+                    barra[0].progress(fraccion)
+                    # Bloques recién anotados en el diario, al final del acta (o toda de nuevo si se reescribió)
+                    nuevos, reiniciado = seguimiento.actualizar()
+                    if reiniciado: vivo['zona'] = marco.container(height=400)
+                    pintar_bloques(vivo['zona'], nuevos)
+                    if nuevos and time.monotonic() - vivo['descarga'] > DESCARGA_PARCIAL_S:
+                        vivo['descarga'], vivo['n'] = time.monotonic(), vivo['n'] + 1
+                        boton_descarga(hueco, seguimiento, uploaded_file.name, clave=f"descarga_{vivo['n']}")
+
+                from openai import APIError
+                comunes = dict(concurrencia=CONCURRENCIA, cache=get_cache_transcripciones(), trabajo=trabajo, informar=st.write, progreso=progreso)
+                largo = st.session_state.get('audio_largo')
+                try:
+                    if largo:
+                        procesar_examen_streaming(
+                            get_ai_client(), uploaded_file.name, largo['ruta'], largo['hash'], largo['max_peak'], largo['total_muestras'],
+                            st.session_state['umbral_db'], st.session_state['min_silence_ms'], **comunes
+                        )
+                    else:
+                        # Mismo buffer PCM que la calibración y la onda (caché por hash de contenido)
+                        hash_audio, muestras = cargar_audio(uploaded_file)
+                        procesar_examen(
+                            get_ai_client(), uploaded_file.name, hash_audio, muestras,
+                            st.session_state['umbral_db'], st.session_state['min_silence_ms'], **comunes
+                        )
+                except AudioVacioError as e:
+                    st.error(str(e)); st.stop()
+                except TrabajoOcupadoError as e:
+                    st.warning(f"⏳ {e} El acta de arriba se actualizará al recargar la página."); st.stop()
+                except APIError as e:
+                    st.error(f"❌ La API no responde ({e}). Pulsa GENERAR de nuevo para continuar donde se quedó."); st.stop()
+
+                status.update(label="¡Proceso Completado!", state="complete", expanded=False)
+            st.rerun()
+
+        if meta_res.get('desglose') and seguimiento.trabajo.terminado:
+            with st.expander("⏱️ Desglose de tiempos"):
+                # Segundos sumados entre hilos: las etapas concurrentes pueden superar el tiempo real
+                st.dataframe([
+                    {"Etapa": etapa, "Tramos": e['n'], "Segundos": round(e['segundos'], 2), "KB": e['bytes'] // 1024,
+                     "Tokens": e['tokens'], "Reintentos": e['reintentos'], "Errores": e['errores'],
+                     "Resultados": ", ".join(f"{r}: {n}" for r, n in sorted(e['resultados'].items()))}
+                    for etapa, e in meta_res['desglose'].items()
+                ], hide_index=True, use_container_width=True)
@@ -0,0 +1,37 @@
+"""Medición en un proceso recién arrancado (RSS pico propio) que devuelve su resultado por una cola."""
+import queue
+import time
+
+
+def _esperar(proceso, cola, limite_s: float):
+    fin = time.monotonic() + limite_s
+    while True:
+        try:
+            return cola.get(timeout=1)
+        except queue.Empty:
+            if proceso.exitcode is None and time.monotonic() < fin: continue
+        # El resultado pudo llegar justo antes de que terminara
+        try:
+            return cola.get(timeout=1)
+        except queue.Empty:
+            motivo = f"terminó con código {proceso.exitcode}" if proceso.exitcode is not None else f"superó {limite_s:g} s"
+            raise RuntimeError(f"El proceso de medición {motivo} sin devolver resultado.") from None
+
+
+def medir_en_proceso(ctx, objetivo, args: tuple, limite_s: float = 1800):
+    """
+    Ejecuta objetivo(*args, cola) en un proceso de `ctx` y devuelve lo que ponga en la cola. Si
+    el proceso muere sin resultado (o pasa `limite_s`), falla con su código de salida en vez de
+    esperar para siempre.
+    """
+    cola = ctx.Queue()
+    proceso = ctx.Process(target=objetivo, args=(*args, cola))
+    proceso.start()
+    try:
+        resultado = _esperar(proceso, cola, limite_s)
+    except RuntimeError:
+        proceso.kill()
+        raise
+    finally:
+        proceso.join()
+    return resultado
@@ -0,0 +1,78 @@
+"""
+Arranque de la app: tiempo de import en frío, primer render y rerun, y dependencias pesadas cargadas.
+
+    python -m benchmarks.bench_arranque [--repeticiones 5]
+
+Cada medida se hace en un proceso nuevo (imports en frío, como un contenedor recién arrancado).
+Sale con código 1 si la pantalla de bloqueo carga NumPy, PIL, pydub o el SDK de la API, si el
+primer render con acceso carga pydub o el SDK, o si importar el pipeline arrastra alguno de los dos.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PESADOS = ("numpy", "PIL", "pydub", "openai")
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT = """
+import json, sys, time
+t0 = time.perf_counter()
+import {modulo}
+print(json.dumps({{"import": time.perf_counter() - t0, "cargados": [m for m in {pesados!r} if m in sys.modules]}}))
+"""
+
+# AppTest ejecuta app.py en este mismo proceso: se descuentan los módulos que ya trae streamlit
+_RENDER = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+previos = set(sys.modules)
+at = AppTest.from_file("app.py", default_timeout=120)
+t0 = time.perf_counter()
+at.run()
+t1 = time.perf_counter()
+at.run()
+t2 = time.perf_counter()
+print(json.dumps({{"primer_render": t1 - t0, "rerun": t2 - t1, "error": bool(at.exception),
+                  "cargados": [m for m in {pesados!r} if m in sys.modules and m not in previos]}}))
+"""
+
+# (nombre, código, variables de entorno, dependencias que NO deben cargarse)
+CASOS = [
+    ("import transcriptor.pipeline", _IMPORT.format(modulo="transcriptor.pipeline", pesados=PESADOS), {}, ("pydub", "openai")),
+    ("import transcriptor.cola", _IMPORT.format(modulo="transcriptor.cola", pesados=PESADOS), {}, ("pydub", "openai")),
+    ("render: pantalla de bloqueo", _RENDER.format(pesados=PESADOS), {"ACCESS_PASSWORD": "clave-de-prueba"}, PESADOS),
+    ("render: con acceso (sin audio)", _RENDER.format(pesados=PESADOS), {"ACCESS_PASSWORD": ""}, ("pydub", "openai")),
+]
+
+
+def ejecutar(codigo: str, entorno: dict) -> dict:
+    env = {**os.environ, "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY") or "sk-bench", "METRICAS_PUERTO": "0",
+           "PYTHONPATH": os.pathsep.join(filter(None, [RAIZ, os.environ.get("PYTHONPATH")])), **entorno}
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def medir(nombre: str, codigo: str, entorno: dict, prohibidos: tuple, repeticiones: int) -> bool:
+    resultados = [ejecutar(codigo, entorno) for _ in range(repeticiones)]
+    tiempos = {clave: statistics.median(r[clave] for r in resultados)
+               for clave in ("import", "primer_render", "rerun") if clave in resultados[0]}
+    cargados = resultados[0]["cargados"]
+    indebidos = [m for m in cargados if m in prohibidos]
+    ok = not indebidos and not any(r.get("error") for r in resultados)
+    linea = " | ".join(f"{clave} {t * 1000:7.1f} ms" for clave, t in tiempos.items())
+    print(f"  {nombre:<32} {linea} | cargados: {', '.join(cargados) or '-'}"
+          + ("" if ok else f"  <-- INDEBIDO: {', '.join(indebidos) or 'excepción en la app'}"))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Arranque en frío (mediana de {args.repeticiones} procesos):")
+    correcto = all([medir(*caso, args.repeticiones) for caso in CASOS])
+    sys.exit(0 if correcto else 1)
@@ -0,0 +1,77 @@
+"""
+Preparación del audio de cada petición (normalización + codificación) frente al camino MP3
+anterior: filtro paso alto de pydub en Python puro y un ffmpeg (vía archivos temporales) por
+segmento a 32 kbps.
+
+    python -m benchmarks.bench_codificacion [--minutos 10] [--max-kb 0]
+
+Sobre las intervenciones reales de un examen sintético (con margen, como en el pipeline)
+informa el tiempo total, los ms por segmento y los KB de base64 por minuto de audio. Con
+`--max-kb` cuenta además las peticiones que no caben en el presupuesto.
+"""
+import argparse
+import base64
+import io
+import time
+
+import numpy as np
+
+from benchmarks.sintetico import generar_examen
+from transcriptor.audio import a_segmento, duracion_ms, normalizar_audio
+from transcriptor.codificador import CodificadorEnProceso, CodificadorFfmpeg
+from transcriptor.pipeline import detectar_chunks
+from transcriptor.vad import autocalibrar_audio
+
+
+def _mp3_anterior(segmentos: list) -> list:
+    salidas = []
+    for seg in segmentos:
+        buffer = io.BytesIO()
+        seg.set_channels(1).set_frame_rate(16000).high_pass_filter(200).export(buffer, format="mp3", bitrate="32k")
+        salidas.append(base64.b64encode(buffer.getvalue()))
+    return salidas
+
+
+def _nuevo(codificador, segmentos: list) -> list:
+    normalizados = [np.frombuffer(normalizar_audio(seg).raw_data, dtype=np.int16) for seg in segmentos]
+    return [base64.b64encode(codificador.codificar(m)) for m in normalizados]
+
+
+def variantes(max_bytes: int):
+    yield "mp3 32k · pydub (anterior)", _mp3_anterior
+    for formato, kbps in (("mp3", 32), ("opus", 16), ("opus", 12)):
+        cod = CodificadorFfmpeg(formato, max_bytes)
+        cod.escalera = (kbps,) + tuple(k for k in cod.escalera if k < kbps)
+        yield f"{formato} {kbps}k · ffmpeg por segmento", lambda segs, c=cod: _nuevo(c, segs)
+        if formato in CodificadorEnProceso._SUBTIPOS:
+            try:
+                cod_p = CodificadorEnProceso(formato, max_bytes)
+            except ImportError:
+                continue
+            cod_p.escalera = cod.escalera
+            yield f"{formato} {kbps}k · en proceso", lambda segs, c=cod_p: _nuevo(c, segs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutos", type=float, default=10)
+    parser.add_argument("--max-kb", type=int, default=0, help="Presupuesto de base64 por petición (0 = sin límite)")
+    args = parser.parse_args()
+
+    muestras = generar_examen(args.minutos, semilla=7)
+    umbral_db, _, _ = autocalibrar_audio(muestras)
+    total = duracion_ms(muestras)
+    chunks = detectar_chunks(muestras, umbral_db, 2000)
+    segmentos = [a_segmento(muestras, max(0, a - 200), min(total, b + 200)) for a, b in chunks]
+    minutos_audio = sum(len(s) for s in segmentos) / 60000
+    print(f"{len(segmentos)} segmentos, {minutos_audio:.1f} min de voz:")
+
+    max_bytes = args.max_kb * 1024
+    for nombre, funcion in variantes(max_bytes):
+        t0 = time.perf_counter()
+        salidas = funcion(segmentos)
+        segundos = time.perf_counter() - t0
+        kb_min = sum(len(s) for s in salidas) / 1024 / minutos_audio
+        linea = f"  {nombre:<34} {segundos:6.2f} s ({segundos / len(segmentos) * 1000:5.1f} ms/seg) | {kb_min:6.1f} KB/min"
+        if max_bytes: linea += f" | {sum(len(s) > max_bytes for s in salidas)} fuera de presupuesto"
+        print(linea)
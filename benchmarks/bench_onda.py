@@ -0,0 +1,65 @@
+"""
+Forma de onda: envolvente min/max + rasterizado PNG frente al gráfico matplotlib de muestras[::100].
+
+    python -m benchmarks.bench_onda [--minutos 10 30 60] [--ancho 1600]
+
+matplotlib es opcional (ya no es dependencia de la app); si no está instalado solo se mide la envolvente.
+"""
+import argparse
+import io
+import time
+
+from benchmarks.sintetico import generar_examen
+from transcriptor.onda import Envolvente, renderizar_png, renderizar_svg
+
+
+def _matplotlib(muestras) -> float:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    t0 = time.perf_counter()
+    fig, ax = plt.subplots(figsize=(10, 1.5))
+    ax.plot(muestras[::100], color='#1E88E5', alpha=0.6, linewidth=0.5)
+    ax.axis('off')
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
+    plt.close(fig)
+    return time.perf_counter() - t0
+
+
+def medir(minutos: float, ancho: int) -> None:
+    muestras = generar_examen(minutos)
+    # Intervenciones ficticias cada 10 s para medir también las superposiciones
+    chunks = [[ms, ms + 6000] for ms in range(0, int(minutos * 60000), 10000)]
+    etiquetas = ["ES" if i % 3 else "IT" for i in range(len(chunks))]
+
+    t0 = time.perf_counter()
+    env = Envolvente.desde_muestras(muestras)
+    t_env = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    renderizar_png(env, ancho, chunks=chunks, etiquetas=etiquetas)
+    t_png = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    renderizar_svg(env, ancho, chunks=chunks, etiquetas=etiquetas)
+    t_svg = time.perf_counter() - t0
+
+    linea = (f"{minutos:>5g} min | envolvente {t_env * 1000:7.1f} ms ({env.nbytes / 2**20:.1f} MB)"
+             f" | PNG {t_png * 1000:6.1f} ms | SVG {t_svg * 1000:6.1f} ms")
+    try:
+        t_mpl = _matplotlib(muestras)
+        linea += f" | matplotlib {t_mpl * 1000:7.1f} ms"
+    except ImportError:
+        pass
+    print(linea)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutos", type=float, nargs="+", default=[10, 30, 60])
+    parser.add_argument("--ancho", type=int, default=1600)
+    args = parser.parse_args()
+
+    print(f"Forma de onda a {args.ancho} px (la envolvente se calcula una vez por archivo; repintar solo cuesta PNG/SVG):")
+    for m in args.minutos:
+        medir(m, args.ancho)
@@ -0,0 +1,184 @@
+"""
+Benchmark del pipeline completo sin red: audio sintético de examen, procesar_examen real y un
+servidor local compatible con OpenAI (benchmarks/stub_openai.py) con latencia y jitter.
+
+    python -m benchmarks.bench_pipeline [--minutos 5 15 30] [--latencia 0.3] [--jitter 0.1]
+    python -m benchmarks.bench_pipeline --guardar-baseline      # fija la referencia de esta máquina
+    python -m benchmarks.bench_pipeline --tasa-error 0.05 --jitter 0.5 --cobertura 90   # carga con fallos
+
+Por cada duración (en un proceso limpio) informa tiempos por etapa, RSS pico y peticiones por
+minuto de audio, tiempo hasta el primer segmento transcrito, latencia p99 de la API y líneas
+[Error] del acta, y los compara con la referencia guardada: sale con código 1 si alguna métrica
+empeora más que `--tolerancia`. Los tiempos por etapa salen del desglose de la traza del
+pipeline (transcriptor.metricas): las etapas concurrentes (normalización, codificación, espera
+de la API, filtros) son la suma de todos los hilos, no tiempo de reloj.
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+import wave
+
+# El stub acepta cualquier modelo, pero el cliente exige uno
+os.environ.setdefault("OPENROUTER_MODEL", "stub")
+
+from openai import OpenAI
+
+from benchmarks.aislado import medir_en_proceso
+from benchmarks.sintetico import generar_examen
+from benchmarks.stub_openai import ServidorStub
+from transcriptor import pipeline
+from transcriptor.audio import FRECUENCIA, decodificar_pcm
+from transcriptor.cliente import ClienteResiliente
+from transcriptor.metricas import Traza, trazar
+from transcriptor.vad import autocalibrar_audio
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline_pipeline.json")
+# Etapa del informe -> etapa de la traza (transcriptor.metricas)
+ETAPAS = {"decodificacion": "decodificacion", "calibracion": "calibracion", "vad": "vad", "collage": "collage",
+          "normalizacion": "normalizacion", "codificacion": "codificacion", "espera_api": "api", "filtros": "filtros"}
+# Diferencias absolutas por debajo de esto son ruido de medida, no regresiones
+MINIMOS = {"rss_mb": 5.0, "peticiones_por_min": 0.1, "lineas_error": 0.5}
+MINIMO_SEGUNDOS = 0.05
+
+
+def wav_bytes(muestras) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(FRECUENCIA)
+        w.writeframes(muestras.tobytes())
+    return buf.getvalue()
+
+
+def _rss_mb() -> float:
+    # ru_maxrss: KiB en Linux, bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == "darwin" else pico / 1024
+
+
+def _percentil(valores: list, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))] if valores else 0.0
+
+
+def _ejecutar(ruta: str, minutos: float, latencia: float, jitter: float, concurrencia: int, tasa_error: float,
+              reintentos: int, cobertura: float, cola):
+    with ServidorStub(latencia, jitter, tasa_error, semilla=1) as stub, trazar(Traza()) as traza:
+        # Mismo envoltorio que get_ai_client(), sin límite de tasa (el stub no lo necesita)
+        client = ClienteResiliente(OpenAI(base_url=stub.url, api_key="stub", max_retries=0), timeout=30,
+                                   reintentos=reintentos, espera_base=0.2, percentil_cobertura=cobertura)
+
+        primero = []
+        def progreso(fraccion):
+            if fraccion and not primero: primero.append(time.perf_counter() - t_inicio)
+
+        t_inicio = time.perf_counter()
+        with open(ruta, 'rb') as f: datos = f.read()
+        muestras = decodificar_pcm(datos)
+        umbral_db, _, _ = autocalibrar_audio(muestras)
+        resultado = pipeline.procesar_examen(client, "bench.wav", "bench", muestras, umbral_db, 2000, concurrencia=concurrencia,
+                                             progreso=progreso)
+        total = time.perf_counter() - t_inicio
+
+    cola.put({
+        "total_s": total,
+        "primer_segmento_s": primero[0] if primero else total,
+        "etapas": {etapa: resultado["desglose"].get(tramo, {}).get("segundos", 0.0) for etapa, tramo in ETAPAS.items()},
+        "rss_mb": _rss_mb(),
+        "p99_api_s": _percentil([t["duracion_s"] for t in traza.tramos if t["etapa"] == "api" and t.get("tipo") != "idioma"], 99),
+        "lineas_error": resultado["texto"].count("[Error:"),
+        "intervenciones": len(resultado["chunks"]),
+        "peticiones": stub.peticiones,
+        "peticiones_por_min": stub.peticiones / minutos,
+        "mb_enviados_por_min": stub.bytes_recibidos / 2**20 / minutos,
+    })
+
+
+def medir(minutos: float, latencia: float, jitter: float, concurrencia: int, tasa_error: float = 0.0,
+          reintentos: int = 4, cobertura: float = 0) -> dict:
+    # Proceso recién arrancado por medición: el RSS pico es el del pipeline (más los imports)
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "examen.wav")
+        with open(ruta, 'wb') as f: f.write(wav_bytes(generar_examen(minutos, semilla=7)))
+        return medir_en_proceso(mp.get_context("spawn"), _ejecutar,
+                                (ruta, minutos, latencia, jitter, concurrencia, tasa_error, reintentos, cobertura))
+
+
+def _metricas(r: dict) -> dict:
+    planas = {"total_s": r["total_s"], "primer_segmento_s": r.get("primer_segmento_s"), "rss_mb": r["rss_mb"], "peticiones_por_min": r["peticiones_por_min"], "p99_api_s": r.get("p99_api_s"),
+              "lineas_error": r.get("lineas_error")}
+    planas = {nombre: v for nombre, v in planas.items() if v is not None}
+    planas.update({f"{etapa}_s": v for etapa, v in r["etapas"].items()})
+    return planas
+
+
+def comparar(actual: dict, referencia: dict, tolerancia: float) -> list:
+    """Métricas que empeoran más de `tolerancia` (relativo) y más que el mínimo absoluto."""
+    regresiones = []
+    for nombre, valor in _metricas(actual).items():
+        previo = _metricas(referencia).get(nombre)
+        if previo is None: continue
+        minimo = MINIMOS.get(nombre, MINIMO_SEGUNDOS)
+        if valor > previo * (1 + tolerancia) and valor - previo > minimo:
+            regresiones.append(f"{nombre}: {previo:.3f} -> {valor:.3f} (+{(valor / previo - 1) * 100 if previo else float('inf'):.0f}%)")
+    return regresiones
+
+
+def imprimir(minutos: float, r: dict):
+    etapas = " ".join(f"{etapa} {v:.2f}" for etapa, v in r["etapas"].items())
+    print(f"{minutos:>5g} min | total {r['total_s']:6.2f} s | RSS pico {r['rss_mb']:6.1f} MB | "
+          f"{r['peticiones']} peticiones ({r['peticiones_por_min']:.2f}/min, {r['mb_enviados_por_min']:.2f} MB/min) | {r['intervenciones']} intervenciones")
+    print(f"        primer segmento {r['primer_segmento_s']:.2f} s | API p99 {r['p99_api_s']:.2f} s | {r['lineas_error']} líneas [Error] en el acta")
+    print(f"        etapas (s): {etapas}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutos", type=float, nargs="+", default=[5, 15, 30])
+    parser.add_argument("--latencia", type=float, default=0.3, help="Latencia base del stub (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Media de la cola exponencial añadida (s)")
+    parser.add_argument("--concurrencia", type=int, default=4)
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Fracción de respuestas HTTP 500 del stub")
+    parser.add_argument("--reintentos", type=int, default=4, help="Reintentos del cliente (0 = sin reintentos)")
+    parser.add_argument("--cobertura", type=float, default=0, help="Percentil de latencia a partir del que se cubre una petición (0 = no)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--guardar-baseline", action="store_true", help="Guardar estos resultados como referencia")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Empeoramiento relativo admitido")
+    args = parser.parse_args()
+
+    config = {"latencia": args.latencia, "jitter": args.jitter, "concurrencia": args.concurrencia,
+              "tasa_error": args.tasa_error, "reintentos": args.reintentos, "cobertura": args.cobertura}
+    resultados = {}
+    for minutos in args.minutos:
+        resultados[f"{minutos:g}"] = r = medir(minutos, args.latencia, args.jitter, args.concurrencia,
+                                                 args.tasa_error, args.reintentos, args.cobertura)
+        imprimir(minutos, r)
+
+    if args.guardar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"config": config, "resultados": resultados}, f, indent=2)
+        print(f"\nReferencia guardada en {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSin referencia en {args.baseline} (usa --guardar-baseline).")
+        sys.exit(0)
+    with open(args.baseline, encoding='utf-8') as f:
+        referencia = json.load(f)
+    if referencia.get("config") != config:
+        print(f"\n⚠️ La referencia se tomó con otra configuración del stub: {referencia.get('config')}")
+
+    regresiones = []
+    for clave, r in resultados.items():
+        if clave in referencia["resultados"]:
+            regresiones += [f"{clave} min · {x}" for x in comparar(r, referencia["resultados"][clave], args.tolerancia)]
+    if regresiones:
+        print("\n❌ Regresiones frente a la referencia:")
+        for linea in regresiones: print(f"  {linea}")
+        sys.exit(1)
+    print("\n✅ Sin regresiones frente a la referencia.")
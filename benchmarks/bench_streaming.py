@@ -0,0 +1,90 @@
+"""
+Memoria pico y tiempo de la decodificación en streaming frente a decodificar el archivo entero.
+
+    python -m benchmarks.bench_streaming [--minutos 30 120] [--bloque 30]
+
+Cada modo se ejecuta en un proceso aparte (RSS pico medido con resource). Sale con código 1 si
+las intervenciones detectadas en streaming difieren de las del modo normal.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+import wave
+
+from benchmarks.aislado import medir_en_proceso
+from benchmarks.sintetico import generar_examen
+from transcriptor.audio import FRECUENCIA, decodificar_pcm, niveles_dbfs
+from transcriptor.streaming import intervenciones_en_streaming, leer_bloques, niveles_en_streaming
+from transcriptor.vad import detectar_intervenciones
+
+MIN_SILENCIO = 2000
+UMBRAL = -28
+
+
+def escribir_wav(ruta: str, minutos: float):
+    # Por trozos de 10 min: el propio benchmark no debe necesitar el audio entero en memoria
+    with wave.open(ruta, 'wb') as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(FRECUENCIA)
+        hecho, semilla = 0.0, 0
+        while hecho < minutos:
+            trozo = min(10.0, minutos - hecho)
+            w.writeframes(generar_examen(trozo, semilla).tobytes())
+            hecho += trozo
+            semilla += 1
+
+
+def _rss_mb() -> float:
+    # ru_maxrss: KiB en Linux, bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == "darwin" else pico / 1024
+
+
+def _completo(ruta: str, cola):
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    with open(ruta, 'rb') as f: datos = f.read()
+    muestras = decodificar_pcm(datos)
+    del datos
+    pico, _ = niveles_dbfs(muestras)
+    rangos = detectar_intervenciones(muestras, MIN_SILENCIO, pico + UMBRAL, 100)
+    cola.put((time.perf_counter() - t0, _rss_mb() - base, rangos))
+
+
+def _streaming(ruta: str, segundos_bloque: float, cola):
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    pico, _, _ = niveles_en_streaming(leer_bloques(ruta, segundos_bloque))
+    rangos = [[ini, fin] for ini, fin, _ in intervenciones_en_streaming(leer_bloques(ruta, segundos_bloque), MIN_SILENCIO, pico + UMBRAL, 100)]
+    cola.put((time.perf_counter() - t0, _rss_mb() - base, rangos))
+
+
+def medir(objetivo, *args) -> tuple:
+    return medir_en_proceso(mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn"), objetivo, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutos", type=float, nargs="+", default=[30, 120])
+    parser.add_argument("--bloque", type=float, default=30.0, help="Segundos por bloque leído de ffmpeg")
+    args = parser.parse_args()
+
+    correcto = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutos in args.minutos:
+            ruta = os.path.join(tmp, f"examen_{minutos:g}.wav")
+            escribir_wav(ruta, minutos)
+            t_c, mem_c, rangos_c = medir(_completo, ruta)
+            t_s, mem_s, rangos_s = medir(_streaming, ruta, args.bloque)
+            ok = rangos_c == rangos_s
+            correcto &= ok
+            print(f"{minutos:>5g} min | completo {t_c:6.1f} s {mem_c:7.1f} MB | streaming {t_s:6.1f} s {mem_s:7.1f} MB"
+                  f" | {len(rangos_s)} intervenciones {'OK' if ok else 'DIFERENTE'}")
+            os.remove(ruta)
+
+    if not correcto:
+        print("❌ El modo streaming no reproduce las intervenciones del modo normal.")
+        sys.exit(1)
@@ -0,0 +1,109 @@
+"""
+Equivalencia y rendimiento del detector de silencios NumPy frente a pydub.
+
+    python -m benchmarks.bench_vad [--minutos 10 30 60] [--sin-pydub]
+
+Sale con código 1 si algún rango [inicio, fin] difiere de pydub.silence.detect_nonsilent o
+si el PerfilEnergia (vista previa de la app) no da los mismos fragmentos que el pipeline.
+"""
+import argparse
+import sys
+import time
+
+from pydub import silence
+
+from benchmarks.sintetico import generar_examen
+from transcriptor.audio import a_segmento, niveles_dbfs
+from transcriptor.config import MAX_SEGMENTO_MS
+from transcriptor.empaquetado import partir_largos
+from transcriptor.pipeline import AudioVacioError, detectar_chunks
+from transcriptor.vad import RANGO_UMBRAL_DB, PerfilEnergia, autocalibrar_niveles, detectar_intervenciones
+
+# (min_silence_len, desplazamiento dB sobre el pico, seek_step): incluye el caso por defecto de la app
+CASOS = [(2000, -28, 100), (1000, -50, 100), (1500, -20, 70), (700, -35, 1), (3000, -10, 250)]
+
+
+def comprobar_equivalencia(minutos: float = 2) -> bool:
+    correcto = True
+    for semilla in range(3):
+        muestras = generar_examen(minutos, semilla)
+        audio = a_segmento(muestras)
+        pico, _ = niveles_dbfs(muestras)
+        for min_sil, delta, paso in CASOS:
+            esperado = silence.detect_nonsilent(audio, min_silence_len=min_sil, silence_thresh=pico + delta, seek_step=paso)
+            obtenido = detectar_intervenciones(muestras, min_silence_len=min_sil, silence_thresh=pico + delta, seek_step=paso)
+            ok = esperado == obtenido
+            correcto &= ok
+            print(f"  semilla={semilla} min_sil={min_sil} umbral={delta} paso={paso}: {'OK' if ok else 'DIFERENTE'} ({len(obtenido)} rangos)")
+    return correcto
+
+
+def comprobar_perfil(minutos: float = 2) -> bool:
+    """Fragmentos del perfil == detectar_chunks + partir_largos en toda la rejilla de ajustes de la app."""
+    diferentes, total = 0, 0
+    for semilla in range(3):
+        muestras = generar_examen(minutos, semilla)[:-(semilla * 37) or None]
+        perfil = PerfilEnergia.desde_muestras(muestras)
+        for umbral_db in range(RANGO_UMBRAL_DB[0], RANGO_UMBRAL_DB[1] + 1, 5):
+            for min_sil in range(500, 5001, 500):
+                try:
+                    esperado = partir_largos(muestras, detectar_chunks(muestras, umbral_db, min_sil), MAX_SEGMENTO_MS)
+                except AudioVacioError:
+                    esperado = []
+                diferentes += perfil.chunks(umbral_db, min_sil, MAX_SEGMENTO_MS) != esperado
+                total += 1
+    print(f"  {total - diferentes}/{total} combinaciones idénticas")
+    return not diferentes
+
+
+def medir(minutos: float, con_pydub: bool) -> None:
+    muestras = generar_examen(minutos)
+    pico, _ = niveles_dbfs(muestras)
+    kwargs = dict(min_silence_len=2000, silence_thresh=pico - 28, seek_step=100)
+
+    t0 = time.perf_counter()
+    rangos = detectar_intervenciones(muestras, **kwargs)
+    t_numpy = time.perf_counter() - t0
+    linea = f"{minutos:>5g} min | numpy {t_numpy * 1000:8.1f} ms | {len(rangos)} intervenciones"
+
+    if con_pydub:
+        audio = a_segmento(muestras)
+        t0 = time.perf_counter()
+        silence.detect_nonsilent(audio, **kwargs)
+        t_pydub = time.perf_counter() - t0
+        linea += f" | pydub {t_pydub * 1000:9.1f} ms | x{t_pydub / t_numpy:,.0f}"
+    print(linea)
+
+    t0 = time.perf_counter()
+    perfil = PerfilEnergia.desde_muestras(muestras)
+    t_perfil = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for umbral_db in range(RANGO_UMBRAL_DB[0], RANGO_UMBRAL_DB[1] + 1):
+        perfil.chunks(umbral_db, 2000, MAX_SEGMENTO_MS)
+    t_eval = (time.perf_counter() - t0) / (RANGO_UMBRAL_DB[1] - RANGO_UMBRAL_DB[0] + 1)
+    t0 = time.perf_counter()
+    umbral_db, _, _ = perfil.autocalibrar()
+    t_auto = time.perf_counter() - t0
+    print(f"{'':>9} perfil {t_perfil * 1000:7.1f} ms ({perfil.nbytes / 1e6:.1f} MB) | vista previa {t_eval * 1000:5.2f} ms"
+          f" | autocalibrar {t_auto * 1000:6.1f} ms -> {umbral_db} dB (heurística {autocalibrar_niveles(*niveles_dbfs(muestras))[0]} dB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutos", type=float, nargs="+", default=[10, 30, 60])
+    parser.add_argument("--sin-pydub", action="store_true", help="No medir la referencia pydub (lenta)")
+    args = parser.parse_args()
+
+    print("Equivalencia con pydub.silence.detect_nonsilent:")
+    if not comprobar_equivalencia():
+        print("❌ El detector NumPy no reproduce los rangos de pydub.")
+        sys.exit(1)
+
+    print("\nPerfil de energía frente a detectar_chunks + partir_largos:")
+    if not comprobar_perfil():
+        print("❌ La vista previa no reproduce los fragmentos del pipeline.")
+        sys.exit(1)
+
+    print("\nRendimiento (min_silence_len=2000, seek_step=100):")
+    for m in args.minutos:
+        medir(m, not args.sin_pydub)
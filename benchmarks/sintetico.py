@@ -0,0 +1,25 @@
+"""Audio sintético tipo examen bilateral (ráfagas de voz, ruido de papel y pausas largas)."""
+import numpy as np
+
+from transcriptor.audio import FRECUENCIA
+
+
+def generar_examen(minutos: float, semilla: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(semilla)
+    total = int(minutos * 60 * FRECUENCIA)
+    muestras = rng.normal(0, 40, total)  # ruido de fondo de sala
+    pos = 0
+    while pos < total:
+        # Intervención: 1-15 s de "voz" (portadora modulada por sílabas)
+        dur = int(rng.uniform(1, 15) * FRECUENCIA)
+        t = np.arange(min(dur, total - pos)) / FRECUENCIA
+        silabas = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3, 6) * t) ** 2
+        voz = np.sin(2 * np.pi * rng.uniform(110, 240) * t) * silabas * rng.uniform(2000, 9000)
+        muestras[pos:pos + len(t)] += voz
+        pos += len(t)
+        # Pausa: 0.5-6 s, a veces con un golpe corto de papel
+        pausa = int(rng.uniform(0.5, 6) * FRECUENCIA)
+        if rng.random() < 0.3 and pos + 800 < total:
+            muestras[pos + 400:pos + 800] += rng.normal(0, 2500, 400)
+        pos += pausa
+    return np.clip(muestras, -32768, 32767).astype(np.int16)
@@ -0,0 +1,115 @@
+"""
+Servidor local compatible con POST /chat/completions de OpenAI para medir el pipeline sin red.
+
+Responde según el prompt (identificación de idioma, segmento suelto o lote de fragmentos) con
+latencia base + cola exponencial (`jitter`) y, opcionalmente, una fracción de errores HTTP 500.
+Las respuestas dependen solo del contenido de la petición: dos ejecuciones iguales dan la misma acta.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _contenido(cuerpo: dict) -> tuple:
+    mensajes = cuerpo.get("messages", [])
+    sistema = mensajes[0].get("content", "") if mensajes else ""
+    audio = ""
+    for parte in (mensajes[-1].get("content") if mensajes else None) or []:
+        if isinstance(parte, dict) and parte.get("type") == "image_url":
+            audio = parte["image_url"]["url"]
+    return sistema, audio
+
+
+def responder(cuerpo: dict, iso_lb: str = "IT") -> str:
+    sistema, audio = _contenido(cuerpo)
+    rng = random.Random(hashlib.sha256((sistema + audio).encode("utf-8")).digest())
+    if "PERITO" not in sistema:
+        return iso_lb
+    palabras = ["entonces", "el", "paciente", "dice", "que", "tiene", "dolor", "desde", "ayer", "vale"]
+    def segmento():
+        return {"idioma": rng.choice(["ES", iso_lb]), "texto": " ".join(rng.choice(palabras) for _ in range(rng.randint(3, 12)))}
+    n = re.search(r"EXACTAMENTE (\d+)", sistema)
+    if n:
+        return json.dumps({"segmentos": [segmento() for _ in range(int(n.group(1)))]}, ensure_ascii=False)
+    return json.dumps(segmento(), ensure_ascii=False)
+
+
+class ServidorStub:
+    """ThreadingHTTPServer en un hilo; `url` sirve como base_url del cliente OpenAI."""
+
+    def __init__(self, latencia: float = 0.5, jitter: float = 0.2, tasa_error: float = 0.0, semilla: int = 0, iso_lb: str = "IT"):
+        self.latencia, self.jitter, self.tasa_error, self.iso_lb = latencia, jitter, tasa_error, iso_lb
+        self.peticiones = 0
+        self.bytes_recibidos = 0
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                datos = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.peticiones += 1
+                    stub.bytes_recibidos += len(datos)
+                    espera = stub.latencia + (stub._rng.expovariate(1 / stub.jitter) if stub.jitter > 0 else 0)
+                    fallo = stub._rng.random() < stub.tasa_error
+                time.sleep(espera)
+                if fallo or not self.path.endswith("/chat/completions"):
+                    self._enviar(500 if fallo else 404, {"error": {"message": "stub", "type": "server_error"}})
+                    return
+                cuerpo = json.loads(datos)
+                contenido = responder(cuerpo, stub.iso_lb)
+                self._enviar(200, {
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                    "model": cuerpo.get("model") or "stub",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": contenido}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(datos) // 4, "completion_tokens": len(contenido) // 4, "total_tokens": (len(datos) + len(contenido)) // 4},
+                })
+
+            def _enviar(self, codigo: int, cuerpo: dict):
+                salida = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+                self.send_response(codigo)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(salida)))
+                self.end_headers()
+                self.wfile.write(salida)
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self._servidor.daemon_threads = True
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._servidor.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    args = parser.parse_args()
+    with ServidorStub(args.latencia, args.jitter, args.tasa_error) as stub:
+        print(f"OPENROUTER_BASE_URL={stub.url}  (Ctrl+C para salir)")
+        try:
+            while True: time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,41 @@
+import time
+import types
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from transcriptor.cliente import ClienteResiliente
+
+
+class _Base:
+    """chat.completions.create falso: duerme lo que diga la siguiente latencia de la lista (o `defecto`)."""
+
+    def __init__(self, latencias=(), defecto=0.02):
+        self.chat = types.SimpleNamespace(completions=self)
+        self._latencias, self.defecto = list(latencias), defecto
+        self._lock = threading.Lock()
+
+    def create(self, timeout=None, **kwargs):
+        with self._lock: espera = self._latencias.pop(0) if self._latencias else self.defecto
+        time.sleep(espera)
+        return espera
+
+
+def test_cobertura_gana_la_copia():
+    base = _Base([0.02] * 20 + [2.0])
+    cliente = ClienteResiliente(base, percentil_cobertura=90)
+    for _ in range(20): cliente.crear("segmento")
+    t0 = time.perf_counter()
+    respuesta, _, cubierta = cliente.crear("segmento")
+    assert cubierta and respuesta == 0.02
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_carga_no_dispara_coberturas():
+    # Más peticiones simultáneas que hilos del pool de copias: esperar turno no cuenta como latencia
+    base = _Base([0.3] * 20, defecto=0.1)
+    cliente = ClienteResiliente(base, percentil_cobertura=50)
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        list(pool.map(lambda _: cliente.crear("segmento"), range(20)))
+    with ThreadPoolExecutor(max_workers=200) as pool:
+        list(pool.map(lambda _: cliente.crear("segmento"), range(200)))
+    assert cliente._coberturas == 0
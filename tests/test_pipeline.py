@@ -0,0 +1,51 @@
+import threading
+
+from transcriptor import pipeline
+from transcriptor.cache import CacheTranscripciones
+from transcriptor.pipeline import _unir_piezas, transcribir_en_orden
+
+
+def _alternando(n):
+    """transcribir() falso: lenguas ES/IT alternas, cuenta las llamadas."""
+    llamadas = []
+    lock = threading.Lock()
+
+    def transcribir(i, contexto_previo, idioma_previo):
+        with lock: llamadas.append(i)
+        return {"idioma": "ES" if i % 2 == 0 else "IT", "texto": f"segmento {i}"}
+
+    return transcribir, llamadas
+
+
+def test_lenguas_alternas_una_peticion_por_segmento():
+    for concurrencia in (1, 4):
+        transcribir, llamadas = _alternando(40)
+        resultados = transcribir_en_orden(40, transcribir, "IT", concurrencia)
+        assert len(llamadas) == 40
+        assert [r["texto"] for r in resultados] == [f"segmento {i}" for i in range(40)]
+        assert [r["idioma"] for r in resultados] == ["ES" if i % 2 == 0 else "IT" for i in range(40)]
+
+
+def test_reanudacion_no_repite_previos():
+    transcribir, llamadas = _alternando(10)
+    previos = [{"idioma": "ES", "texto": "a"}, {"idioma": "IT", "texto": "b"}]
+    resultados = transcribir_en_orden(10, transcribir, "IT", 4, previos=previos)
+    assert sorted(llamadas) == list(range(2, 10))
+    assert resultados[:2] == previos
+
+
+def test_pieza_fallida_conserva_el_texto_de_las_demas():
+    dats = [{"idioma": "IT", "texto": "uno"}, {"idioma": "ERROR", "texto": "[Error: 503]"}, {"idioma": "IT", "texto": "tres"}]
+    assert _unir_piezas(dats) == {"idioma": "ERROR", "texto": "uno [Error: 503] tres"}
+    assert _unir_piezas([dats[0], dats[2]]) == {"idioma": "IT", "texto": "uno tres"}
+
+
+def test_intervencion_partida_cuenta_una_vez_en_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "preparar_segmento", lambda audio: "data:audio/mp3;base64,")
+    monkeypatch.setattr(pipeline, "transcribir_segmento_forense", lambda *args, **kwargs: {"idioma": "IT", "texto": "pieza"})
+    cache = CacheTranscripciones(str(tmp_path / "c.sqlite3"), 1 << 20)
+    transcriptor = pipeline._TranscriptorSegmentos(None, "h", ("Italiano", "IT"), cache)
+    for _ in range(2):
+        transcriptor.partida([0, 1000, 2000, 3000], lambda ini, fin: None, "", "ES")
+    assert transcriptor.uso_cache == {"aciertos": 1, "fallos": 1}
+    assert transcriptor.peticiones == 3
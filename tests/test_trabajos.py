@@ -0,0 +1,10 @@
+from transcriptor.trabajos import Trabajo
+
+
+def test_reanudacion_reintenta_desde_el_primer_error(tmp_path):
+    trabajo = Trabajo(str(tmp_path), "t")
+    trabajo.actualizar(estado="en_curso")
+    trabajo.anotar(0, {"idioma": "ES", "texto": "hola"}, 0)
+    trabajo.anotar(1, {"idioma": "ERROR", "texto": "[Error: 503]"}, 1000)
+    trabajo.anotar(2, {"idioma": "IT", "texto": "ciao"}, 2000)
+    assert trabajo.resultados() == [{"idioma": "ES", "texto": "hola"}]
@@ -0,0 +1 @@
+"""Núcleo del Transcriptor Bilateral (procesado de audio independiente de la UI)."""
@@ -0,0 +1,57 @@
+import os
+import sys
+import argparse
+
+from transcriptor.config import API_KEY, COLA_DB, COLA_MEMORIA_MB, COLA_PROCESOS, CONCURRENCIA, METRICAS_PUERTO
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m transcriptor", description="Transcriptor Bilateral sin interfaz web.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    lote = sub.add_parser("batch", help="Genera el acta TXT de todos los exámenes de una carpeta.")
+    lote.add_argument("carpeta", help="Carpeta con los audios (MP3, M4A, WAV, AAC).")
+    lote.add_argument("--salida", help="Carpeta de las actas y resumen.json (por defecto: <carpeta>/actas).")
+    lote.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos para decodificar y detectar silencios.")
+    lote.add_argument("--api-concurrencia", type=int, default=CONCURRENCIA, help="Peticiones simultáneas a la API entre TODOS los procesos.")
+    lote.add_argument("--umbral-db", type=int, help="Sensibilidad fija (dB). Por defecto: auto-calibración por archivo.")
+    lote.add_argument("--silencio-min", type=float, default=2.0, help="Silencio mínimo en segundos.")
+    lote.add_argument("--sin-cache", action="store_true", help="No reutilizar ni guardar transcripciones en caché.")
+    lote.add_argument("--streaming", action="store_true", help="Decodificar por bloques sin cargar el audio entero (grabaciones de varias horas).")
+
+    worker = sub.add_parser("worker", help="Atiende la cola de trabajos de la web (COLA_TRABAJOS=1) en segundo plano.")
+    worker.add_argument("--procesos", type=int, default=COLA_PROCESOS, help="Exámenes procesados a la vez (máximo de trabajos simultáneos).")
+    worker.add_argument("--api-concurrencia", type=int, default=CONCURRENCIA, help="Peticiones simultáneas a la API entre TODOS los procesos.")
+    worker.add_argument("--memoria-mb", type=int, default=COLA_MEMORIA_MB, help="Audio decodificado máximo por trabajo; los más largos se procesan por bloques (0 = sin límite).")
+    worker.add_argument("--sin-cache", action="store_true", help="No reutilizar ni guardar transcripciones en caché.")
+    worker.add_argument("--metricas-puerto", type=int, default=METRICAS_PUERTO, help="Servir /metrics (Prometheus) desde este puerto, uno por proceso (0 = no).")
+
+    args = parser.parse_args(argv)
+
+    if not API_KEY:
+        print("Error: API KEY no configurada", file=sys.stderr)
+        return 2
+
+    if args.comando == "worker":
+        from transcriptor.cola import ejecutar_workers
+        ejecutar_workers(
+            COLA_DB, procesos=max(1, args.procesos), api_concurrencia=max(1, args.api_concurrencia),
+            usar_cache=not args.sin_cache, memoria_max_bytes=args.memoria_mb * 1024 * 1024,
+            metricas_puerto=args.metricas_puerto
+        )
+        return 0
+
+    if args.comando == "batch":
+        from transcriptor.lote import procesar_carpeta
+        resumen = procesar_carpeta(
+            args.carpeta, args.salida or os.path.join(args.carpeta, "actas"),
+            workers=max(1, args.workers), api_concurrencia=max(1, args.api_concurrencia),
+            umbral_db=args.umbral_db, min_silence_ms=int(args.silencio_min * 1000),
+            usar_cache=not args.sin_cache, streaming=args.streaming
+        )
+        print(f"{resumen['correctos']} actas generadas, {resumen['errores']} errores en {resumen['total_s']:.1f} s.")
+        return 1 if resumen['errores'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
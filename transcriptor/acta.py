@@ -0,0 +1,43 @@
+# ================= FORMATO DEL ACTA (TXT) =================
+
+def formatear_tiempo(ms):
+    seconds = int(ms / 1000)
+    minutes = seconds // 60
+    seconds = seconds % 60
+    return f"{minutes:02d}:{seconds:02d}"
+
+def cabecera_acta(nombre: str, nombre_lb: str, iso_lb: str) -> str:
+    return (
+        f"ALUMNO/EXAMEN: {nombre}\n"
+        f"IDIOMAS DETECTADOS: ESPAÑOL (ES) - {nombre_lb} ({iso_lb})\n"
+        + "-" * 50 + "\n\n"
+    )
+
+def bloque_acta(inicio_ms: int, dat: dict) -> str:
+    return f"[{formatear_tiempo(inicio_ms)}] [{dat.get('idioma','??')}]\n{dat.get('texto','')}\n\n"
+
+def nombre_acta(nombre: str, iso_lb: str) -> str:
+    return f"Acta_{nombre}_{iso_lb}.txt"
+
+
+class ActaIncremental:
+    """
+    Acta que solo crece por el final: cada bloque se formatea una vez al añadirlo y el texto
+    completo se compone bajo demanda (descarga), sin rehacer lo ya escrito.
+    """
+
+    def __init__(self, cabecera: str = ""):
+        self.cabecera = cabecera
+        self.bloques = []  # (inicio_ms, dat) en orden
+        self._textos = []
+
+    def __len__(self) -> int:
+        return len(self.bloques)
+
+    def agregar(self, inicio_ms: int, dat: dict):
+        self.bloques.append((inicio_ms, dat))
+        self._textos.append(bloque_acta(inicio_ms, dat))
+
+    @property
+    def texto(self) -> str:
+        return self.cabecera + "".join(self._textos)
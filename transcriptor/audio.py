@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import io
+import math
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from transcriptor.metricas import tramo
+
+# pydub se importa solo donde se crea un AudioSegment: la calibración, la onda y el VAD
+# trabajan sobre el buffer NumPy y no lo necesitan
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+# ================= FORMATO PCM COMÚN =================
+# Todo el pipeline trabaja sobre un único buffer mono, 16 kHz, int16.
+FRECUENCIA = 16000
+ANCHO_MUESTRA = 2
+MAX_AMPLITUD = float(2 ** (8 * ANCHO_MUESTRA) / 2)
+MUESTRAS_POR_MS = FRECUENCIA // 1000
+
+
+def hash_contenido(datos: bytes) -> str:
+    return hashlib.sha256(datos).hexdigest()
+
+
+def decodificar_pcm(datos: bytes) -> np.ndarray:
+    """Decodifica (ffmpeg) una sola vez y devuelve las muestras int16 de solo lectura."""
+    from pydub import AudioSegment
+    with tramo("decodificacion", bytes=len(datos)):
+        audio = AudioSegment.from_file(io.BytesIO(datos))
+        audio = audio.set_channels(1).set_frame_rate(FRECUENCIA).set_sample_width(ANCHO_MUESTRA)
+    # np.frombuffer sobre bytes no copia y ya devuelve un array inmutable
+    return np.frombuffer(audio.raw_data, dtype=np.int16)
+
+
+def duracion_ms(muestras: np.ndarray) -> int:
+    # Mismo redondeo que len(AudioSegment)
+    return round(1000 * len(muestras) / FRECUENCIA)
+
+
+def a_segmento(muestras: np.ndarray, inicio_ms: int = 0, fin_ms: int = None) -> AudioSegment:
+    """
+    Recorta [inicio_ms, fin_ms) del buffer compartido en un AudioSegment. Cada segmento es una
+    COPIA (AudioSegment necesita bytes): cuesta 32 KB por segundo recortado, no el audio entero.
+    """
+    from pydub import AudioSegment
+    ini = max(0, int(inicio_ms)) * MUESTRAS_POR_MS
+    fin = len(muestras) if fin_ms is None else min(len(muestras), int(fin_ms) * MUESTRAS_POR_MS)
+    return AudioSegment(
+        data=muestras[ini:max(ini, fin)].tobytes(),
+        sample_width=ANCHO_MUESTRA, frame_rate=FRECUENCIA, channels=1
+    )
+
+
+def niveles_dbfs(muestras: np.ndarray) -> tuple:
+    """Equivalente vectorizado de (AudioSegment.max_dBFS, AudioSegment.dBFS)."""
+    if len(muestras) == 0:
+        return -float("inf"), -float("inf")
+    # Sin copia int32 del audio entero: -min cabe en un int de Python aunque sea -32768
+    pico = max(int(muestras.max()), -int(muestras.min()))
+    # Suma por bloques en float64: exacta y sin materializar un array int64 del tamaño del audio
+    suma = 0.0
+    for i in range(0, len(muestras), 1 << 20):
+        bloque = muestras[i:i + (1 << 20)].astype(np.float64)
+        suma += float(np.dot(bloque, bloque))
+    rms = int(np.sqrt(suma / len(muestras)))
+    max_db = 20 * np.log10(pico / MAX_AMPLITUD) if pico else -float("inf")
+    avg_db = 20 * np.log10(rms / MAX_AMPLITUD) if rms else -float("inf")
+    return float(max_db), float(avg_db)
+
+
+# ================= PREPARACIÓN PARA LA API =================
+
+BLOQUE_FFT = 1 << 16
+
+@functools.lru_cache(maxsize=8)
+def _respuesta_paso_alto(corte_hz: float) -> tuple:
+    rc = 1.0 / (corte_hz * 2 * math.pi)
+    a = rc / (rc + 1.0 / FRECUENCIA)
+    h = a ** np.arange(1, int(math.ceil(math.log(1e-18) / math.log(a))) + 1)
+    return a, len(h), np.fft.rfft(h, BLOQUE_FFT)
+
+def filtro_paso_alto(muestras: np.ndarray, corte_hz: float) -> np.ndarray:
+    """
+    Equivalente a AudioSegment.high_pass_filter (RC de primer orden) sin el bucle Python por
+    muestra. y[i] = a * (y[i-1] + x[i] - x[i-1]) con y[0] = x[0] es la convolución de d
+    (d[0] = x[0] / a, d[i] = x[i] - x[i-1]) con h[j] = a^(j+1), que se trunca cuando a^j ya no
+    afecta a un double y se aplica por FFT en bloques (overlap-add).
+    No es idéntico bit a bit: el redondeo de la FFT difiere del de la recurrencia en ~1e-9, y
+    una muestra cuyo valor filtrado cae justo en un entero puede truncarse 1 LSB distinta
+    (del orden de 1 muestra cada 10^5-10^6; inaudible y sin efecto en la transcripción).
+    """
+    if len(muestras) < 2: return muestras.copy()
+    a, n_h, H = _respuesta_paso_alto(corte_hz)
+    x = muestras.astype(np.float64)
+    d = np.empty_like(x)
+    d[0] = x[0] / a
+    d[1:] = np.diff(x)
+    y = np.zeros(len(x) + n_h)
+    paso = BLOQUE_FFT - n_h
+    for i in range(0, len(x), paso):
+        bloque = np.fft.irfft(np.fft.rfft(d[i:i + paso], BLOQUE_FFT) * H, BLOQUE_FFT)
+        fin = min(len(y), i + BLOQUE_FFT)
+        y[i:fin] += bloque[:fin - i]
+    # Recorte al rango int16 y truncado hacia cero, como int() en pydub
+    return np.clip(y[:len(x)], -MAX_AMPLITUD, MAX_AMPLITUD - 1).astype(np.int16)
+
+def normalizar_audio(audio: AudioSegment) -> AudioSegment:
+    from pydub import AudioSegment
+    audio = audio.set_channels(1)
+    audio = audio.set_frame_rate(16000)
+    if audio.sample_width != ANCHO_MUESTRA: return audio.high_pass_filter(200)
+    filtrado = filtro_paso_alto(np.frombuffer(audio.raw_data, dtype=np.int16), 200)
+    return AudioSegment(data=filtrado.tobytes(), sample_width=ANCHO_MUESTRA, frame_rate=FRECUENCIA, channels=1)
+
+
+# ================= CACHÉ LRU DE AUDIO DECODIFICADO =================
+
+class CacheAudio:
+    """
+    Caché LRU (acotada por bytes) de buffers PCM indexados por hash de contenido.
+    Pensada para compartirse entre sesiones: mismo archivo = una sola decodificación.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._datos)
+
+    @property
+    def bytes_ocupados(self) -> int:
+        return self._bytes
+
+    def obtener(self, clave: str):
+        with self._lock:
+            muestras = self._datos.get(clave)
+            if muestras is not None:
+                self._datos.move_to_end(clave)
+            return muestras
+
+    def guardar(self, clave: str, muestras: np.ndarray):
+        # Un audio más grande que toda la caché no se guarda (vaciaría el resto)
+        if muestras.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                return
+            self._datos[clave] = muestras
+            self._bytes += muestras.nbytes
+            while self._bytes > self.max_bytes:
+                _, expulsado = self._datos.popitem(last=False)
+                self._bytes -= expulsado.nbytes
+
+    def obtener_o_decodificar(self, datos: bytes) -> tuple:
+        """Devuelve (hash, muestras). Solo decodifica si el contenido no está en caché."""
+        clave = hash_contenido(datos)
+        muestras = self.obtener(clave)
+        if muestras is None:
+            muestras = decodificar_pcm(datos)
+            self.guardar(clave, muestras)
+        return clave, muestras
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+# ================= CACHÉ PERSISTENTE DE TRANSCRIPCIONES =================
+# Guarda el resultado de transcribir_segmento_forense direccionado por contenido:
+# (hash del audio, rango con margen, modelo, versión de prompt, par de idiomas, contexto).
+# Un "regenerar" tras mover los deslizadores solo envía a la API los segmentos cuyos
+# límites (o contexto efectivo) han cambiado.
+
+
+def clave_segmento(hash_audio: str, inicio_ms: int, fin_ms: int, modelo: str, version_prompt: str,
+                   iso_lb: str, contexto_previo: str, idioma_previo: str, subrangos: list = None) -> str:
+    partes = [hash_audio, int(inicio_ms), int(fin_ms), modelo, version_prompt, f"ES-{iso_lb}", contexto_previo, idioma_previo]
+    # Lote de intervenciones en una sola petición: la clave incluye cómo se empaquetó
+    if subrangos: partes.append([[int(a), int(b)] for a, b in subrangos])
+    return hashlib.sha256(json.dumps(partes, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def clave_idioma(hash_audio: str, modelo: str, version_prompt: str) -> str:
+    # La lengua B es del archivo: no depende de los ajustes de detección de intervenciones
+    partes = ["idioma", hash_audio, modelo, version_prompt]
+    return hashlib.sha256(json.dumps(partes).encode("utf-8")).hexdigest()
+
+
+class CacheTranscripciones:
+    """SQLite local con expulsión por tamaño (se descartan primero las entradas menos usadas)."""
+
+    def __init__(self, ruta: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        directorio = os.path.dirname(ruta)
+        if directorio: os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS segmentos ("
+            " clave TEXT PRIMARY KEY, valor TEXT NOT NULL, bytes INTEGER NOT NULL, usado REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_usado ON segmentos(usado)")
+        self._db.commit()
+
+    def obtener(self, clave: str):
+        with self._lock:
+            fila = self._db.execute("SELECT valor FROM segmentos WHERE clave = ?", (clave,)).fetchone()
+            if fila is None: return None
+            self._db.execute("UPDATE segmentos SET usado = ? WHERE clave = ?", (time.time(), clave))
+            self._db.commit()
+        return json.loads(fila[0])
+
+    def guardar(self, clave: str, resultado: dict):
+        valor = json.dumps(resultado, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO segmentos (clave, valor, bytes, usado) VALUES (?, ?, ?, ?)",
+                (clave, valor, len(valor.encode("utf-8")), time.time())
+            )
+            self._expulsar()
+            self._db.commit()
+
+    def _expulsar(self):
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM segmentos").fetchone()[0]
+        if total <= self.max_bytes: return
+        sobrante = total - self.max_bytes
+        filas = self._db.execute("SELECT clave, bytes FROM segmentos ORDER BY usado ASC").fetchall()
+        borrar = []
+        for clave, tam in filas:
+            if sobrante <= 0: break
+            borrar.append((clave,))
+            sobrante -= tam
+        self._db.executemany("DELETE FROM segmentos WHERE clave = ?", borrar)
@@ -0,0 +1,146 @@
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+# ================= CLIENTE DE API RESILIENTE =================
+# Un único cliente por proceso (conexiones HTTP reutilizadas por todas las sesiones y hilos)
+# envuelto con:
+# - límite de tasa (token bucket) compartido por todo el proceso,
+# - timeout por petición y reintentos con espera exponencial y jitter ante 429/5xx/cortes,
+# - cobertura opcional (hedging): si una petición tarda más que el percentil configurado de
+#   las últimas de su tipo, se lanza una copia y gana la primera que responda.
+
+CODIGOS_REINTENTABLES = (408, 409, 429)
+VENTANA_LATENCIAS = 200
+MIN_MUESTRAS_COBERTURA = 20
+MAX_FRACCION_COBERTURA = 0.1    # Como mucho una copia por cada 10 peticiones
+
+
+def es_reintentable(error: Exception) -> bool:
+    # Import diferido: el SDK (~0,5 s) solo se carga al crear el cliente, ya está en memoria aquí
+    from openai import APIConnectionError, APIStatusError
+    # APITimeoutError es una APIConnectionError
+    if isinstance(error, APIConnectionError): return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in CODIGOS_REINTENTABLES or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: Exception):
+    respuesta = getattr(error, "response", None)
+    try:
+        return float(respuesta.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _en_hilo(funcion, *args) -> Future:
+    """Ejecuta `funcion` en un hilo propio, sin esperar turno en ningún pool, y devuelve su Future."""
+    futuro = Future()
+    def ejecutar():
+        futuro.set_running_or_notify_cancel()
+        try:
+            futuro.set_result(funcion(*args))
+        except BaseException as e:
+            futuro.set_exception(e)
+    threading.Thread(target=ejecutar, daemon=True, name="api").start()
+    return futuro
+
+
+class LimitadorTasa:
+    """Token bucket: `por_minuto` peticiones sostenidas con ráfagas de hasta `rafaga`."""
+
+    def __init__(self, por_minuto: float, rafaga: int = 5):
+        self.ritmo = por_minuto / 60
+        self.capacidad = max(1, rafaga)
+        self._fichas = float(self.capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.ritmo)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.ritmo
+            time.sleep(espera)
+
+
+class ClienteResiliente:
+    """
+    Envuelve un cliente OpenAI (o compatible) sin reintentos propios. `crear(tipo, **kwargs)`
+    equivale a chat.completions.create y devuelve (respuesta, reintentos, cubierta).
+    Si se agotan los reintentos se propaga el último error.
+    """
+
+    def __init__(self, base, timeout: float = 90.0, reintentos: int = 4, espera_base: float = 1.0, espera_max: float = 30.0,
+                 limitador: LimitadorTasa = None, percentil_cobertura: float = 0):
+        self.base = base
+        self.timeout, self.reintentos = timeout, reintentos
+        self.espera_base, self.espera_max = espera_base, espera_max
+        self.limitador = limitador
+        self.percentil_cobertura = percentil_cobertura
+        self._latencias = {}
+        self._peticiones = self._coberturas = 0
+        self._lock = threading.Lock()
+        # Solo para las copias: la petición original nunca espera turno en el pool
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="api-copia") if percentil_cobertura else None
+
+    def _intento(self, tipo: str, kwargs: dict, limitar: bool = True):
+        if limitar and self.limitador: self.limitador.adquirir()
+        t0 = time.perf_counter()
+        respuesta = self.base.chat.completions.create(timeout=self.timeout, **kwargs)
+        with self._lock:
+            self._latencias.setdefault(tipo, deque(maxlen=VENTANA_LATENCIAS)).append(time.perf_counter() - t0)
+        return respuesta
+
+    def _umbral_cobertura(self, tipo: str):
+        with self._lock:
+            latencias = sorted(self._latencias.get(tipo, ()))
+            if len(latencias) < MIN_MUESTRAS_COBERTURA: return None
+            return latencias[min(len(latencias) - 1, int(len(latencias) * self.percentil_cobertura / 100))]
+
+    def _reservar_cobertura(self) -> bool:
+        with self._lock:
+            if self._coberturas >= MAX_FRACCION_COBERTURA * self._peticiones: return False
+            self._coberturas += 1
+            return True
+
+    def _cubierto(self, tipo: str, kwargs: dict) -> tuple:
+        with self._lock: self._peticiones += 1
+        umbral = self._umbral_cobertura(tipo) if self._pool else None
+        if umbral is None: return self._intento(tipo, kwargs), False
+
+        # El plazo de cobertura cuenta desde que sale la petición: ni la espera del límite de tasa
+        # ni una cola de hilos lo consumen (dispararían copias innecesarias bajo carga)
+        if self.limitador: self.limitador.adquirir()
+        original = _en_hilo(self._intento, tipo, kwargs, False)
+        hechas, _ = wait([original], timeout=umbral)
+        if hechas or not self._reservar_cobertura(): return original.result(), False
+
+        # La más lenta de las dos sigue en segundo plano y su respuesta se descarta
+        copia = self._pool.submit(self._intento, tipo, kwargs)
+        pendientes = {original, copia}
+        while True:
+            hechas, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hechas:
+                if futuro.exception() is None or not pendientes:
+                    return futuro.result(), futuro is copia
+
+    def crear(self, tipo: str, **kwargs) -> tuple:
+        for intento in range(self.reintentos + 1):
+            try:
+                respuesta, cubierta = self._cubierto(tipo, kwargs)
+                return respuesta, intento, cubierta
+            except Exception as e:
+                if intento == self.reintentos or not es_reintentable(e): raise
+                # Espera exponencial con jitter completo (o la que pida el servidor en Retry-After)
+                espera = _retry_after(e)
+                if espera is None: espera = random.uniform(0, min(self.espera_max, self.espera_base * 2 ** intento))
+                time.sleep(min(self.espera_max, espera))
@@ -0,0 +1,130 @@
+import io
+import base64
+import shutil
+import functools
+import subprocess
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from transcriptor.audio import FRECUENCIA, MUESTRAS_POR_MS
+from transcriptor.config import AUDIO_FORMATO, AUDIO_MAX_KB, AUDIO_MOTOR
+
+# ================= CODIFICACIÓN DE SEGMENTOS PARA LA API =================
+# El audio viaja en base64 dentro de la petición: cuantos menos bytes, menos subida y menos
+# espera. Un códec de voz (Opus a 12-16 kbps) ocupa la mitad que el MP3 de 32 kbps. Dos motores:
+# - ffmpeg: un proceso por segmento (tubería, sin archivos),
+# - en proceso: libsndfile vía `soundfile` (dependencia opcional; Opus/FLAC), sin lanzar ningún
+#   proceso (por ejemplo donde no hay ffmpeg o lanzar procesos es caro).
+# Con un presupuesto de bytes por petición se elige el mayor bitrate que quepa.
+
+FORMATOS = {
+    # formato: (tipo MIME, contenedor de ffmpeg, argumentos del códec, escalera de kbps)
+    "mp3": ("audio/mp3", "mp3", ["-c:a", "libmp3lame"], (32, 24, 16)),
+    "opus": ("audio/ogg", "ogg", ["-c:a", "libopus", "-application", "voip", "-compression_level", "5"], (16, 12, 8)),
+    "flac": ("audio/flac", "flac", ["-c:a", "flac"], (None,)),
+}
+_ENTRADA_PCM = ["-f", "s16le", "-ar", str(FRECUENCIA), "-ac", "1"]
+
+
+def _ffmpeg() -> str:
+    # El mismo ejecutable que decodifica (AudioSegment.converter), también si se ha configurado otro
+    from pydub import AudioSegment
+    return AudioSegment.converter
+
+
+def _base64_estimado(duracion_ms: int, kbps: int) -> int:
+    # Carga útil + cabeceras/contenedor (~5 % y 1 KB), pasado a base64
+    return int((duracion_ms * kbps / 8 * 1.05 + 1024) * 4 / 3)
+
+
+class Codificador(ABC):
+    """Muestras int16 (16 kHz mono) -> bytes del formato elegido; `max_bytes` acota el base64 (0 = sin límite)."""
+
+    motor = None
+
+    def __init__(self, formato: str = "mp3", max_bytes: int = 0):
+        if formato not in FORMATOS: raise ValueError(f"Formato de audio no soportado: {formato}")
+        self.formato, self.max_bytes = formato, max_bytes
+        self.mime, self.contenedor, self.args_codec, self.escalera = FORMATOS[formato]
+
+    @property
+    def firma(self) -> str:
+        return f"{self.formato}-{self.motor}"
+
+    def kbps_para(self, duracion_ms: int):
+        """Mayor bitrate de la escalera cuyo base64 estimado cabe en el presupuesto (o el menor)."""
+        if not self.max_bytes: return self.escalera[0]
+        for kbps in self.escalera:
+            if kbps is None or _base64_estimado(duracion_ms, kbps) <= self.max_bytes: return kbps
+        return self.escalera[-1]
+
+    @abstractmethod
+    def _codificar(self, muestras: np.ndarray, kbps) -> bytes:
+        """Codifica a `kbps` (None: sin bitrate, códec sin pérdidas)."""
+
+    def codificar(self, muestras: np.ndarray) -> bytes:
+        kbps = self.kbps_para(len(muestras) // MUESTRAS_POR_MS)
+        datos = self._codificar(muestras, kbps)
+        # La estimación puede quedarse corta: se baja un escalón mientras no quepa
+        resto = list(self.escalera[self.escalera.index(kbps) + 1:])
+        while self.max_bytes and resto and (len(datos) + 2) // 3 * 4 > self.max_bytes:
+            datos = self._codificar(muestras, resto.pop(0))
+        return datos
+
+    def a_data_url(self, muestras: np.ndarray) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.codificar(muestras)).decode('utf-8')}"
+
+
+class CodificadorFfmpeg(Codificador):
+    motor = "ffmpeg"
+
+    def _args_salida(self, kbps) -> list:
+        return self.args_codec + (["-b:a", f"{kbps}k"] if kbps else [])
+
+    def _codificar(self, muestras: np.ndarray, kbps) -> bytes:
+        orden = [_ffmpeg(), "-hide_banner", "-loglevel", "error", *_ENTRADA_PCM, "-i", "pipe:0",
+                 *self._args_salida(kbps), "-f", self.contenedor, "pipe:1"]
+        return subprocess.run(orden, input=muestras.tobytes(), capture_output=True, check=True).stdout
+
+
+class CodificadorEnProceso(Codificador):
+    """libsndfile (paquete opcional `soundfile`): Opus y FLAC sin lanzar procesos."""
+
+    motor = "proceso"
+    _SUBTIPOS = {"opus": ("OGG", "OPUS"), "flac": ("FLAC", "PCM_16")}
+
+    def __init__(self, formato: str = "opus", max_bytes: int = 0):
+        super().__init__(formato, max_bytes)
+        if formato not in self._SUBTIPOS: raise ValueError(f"Formato no disponible en proceso: {formato}")
+        import soundfile
+        self._sf = soundfile
+
+    def _codificar(self, muestras: np.ndarray, kbps) -> bytes:
+        buffer = io.BytesIO()
+        formato, subtipo = self._SUBTIPOS[self.formato]
+        # libsndfile reparte el bitrate de Opus linealmente entre 256 kbps (nivel 0) y 6 kbps (nivel 1)
+        nivel = min(1.0, max(0.0, (256 - kbps) / 250)) if kbps else None
+        self._sf.write(buffer, muestras, FRECUENCIA, format=formato, subtype=subtipo, compression_level=nivel)
+        return buffer.getvalue()
+
+
+def crear_codificador(formato: str = "mp3", motor: str = "auto", max_bytes: int = 0) -> Codificador:
+    """
+    `motor`: 'ffmpeg', 'proceso' o 'auto'. En auto se usa ffmpeg (AudioSegment.converter) si se
+    encuentra: lanzar el proceso cuesta ~20 ms y su libopus (complejidad 5) es más rápido que el
+    de libsndfile. Solo sin ffmpeg, y con el paquete opcional `soundfile` instalado
+    (requirements-opcional.txt), se codifica en proceso.
+    """
+    if motor == "ffmpeg" or formato not in CodificadorEnProceso._SUBTIPOS or (motor == "auto" and shutil.which(_ffmpeg())):
+        return CodificadorFfmpeg(formato, max_bytes)
+    try:
+        return CodificadorEnProceso(formato, max_bytes)
+    except ImportError:
+        if motor == "proceso": raise
+        return CodificadorFfmpeg(formato, max_bytes)
+
+
+@functools.lru_cache(maxsize=None)
+def codificador_por_defecto() -> Codificador:
+    return crear_codificador(AUDIO_FORMATO, AUDIO_MOTOR, AUDIO_MAX_KB * 1024)
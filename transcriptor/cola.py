@@ -0,0 +1,215 @@
+import os
+import time
+import sqlite3
+import traceback
+from multiprocessing import Manager, Process
+
+from transcriptor.audio import decodificar_pcm
+from transcriptor.config import MODEL_NAME, TRABAJOS_DIR
+from transcriptor.ia import PROMPT_VERSION
+from transcriptor.lote import inicializar_worker, recursos_worker
+from transcriptor.metricas import Traza, servir_metricas, trazar
+from transcriptor.pipeline import procesar_examen, procesar_examen_streaming
+from transcriptor.streaming import bytes_pcm_estimados, leer_bloques, niveles_en_streaming
+from transcriptor.trabajos import Trabajo, id_trabajo
+
+# ================= COLA DE TRABAJOS EN SEGUNDO PLANO =================
+# La UI solo guarda el audio subido y encola; un proceso aparte (python -m transcriptor worker)
+# con un número fijo de procesos ejecuta los exámenes. Todo en un SQLite local: sin servicios
+# externos. El id de la cola es el id del Trabajo, así que el acta se lee del diario en disco
+# y un worker reiniciado continúa los exámenes a medias.
+
+PENDIENTE, EN_CURSO, COMPLETADO, ERROR = "pendiente", "en_curso", "completado", "error"
+
+
+class ColaLlenaError(Exception):
+    """Control de admisión: la cola (o la cuota del usuario) no admite más trabajos ahora."""
+
+
+class ColaTrabajos:
+
+    def __init__(self, ruta_db: str, max_pendientes: int = 50, max_por_usuario: int = 3, mismo_hilo: bool = True):
+        self.max_pendientes = max_pendientes
+        self.max_por_usuario = max_por_usuario
+        self.dir_audio = os.path.join(os.path.dirname(ruta_db) or ".", "cola_audio")
+        os.makedirs(self.dir_audio, exist_ok=True)
+        self._db = sqlite3.connect(ruta_db, timeout=30, isolation_level=None, check_same_thread=mismo_hilo)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cola ("
+            " id TEXT PRIMARY KEY, usuario TEXT NOT NULL, nombre TEXT NOT NULL, ruta_audio TEXT NOT NULL,"
+            " hash_audio TEXT NOT NULL, umbral_db INTEGER NOT NULL, min_silence_ms INTEGER NOT NULL,"
+            " estado TEXT NOT NULL, progreso REAL NOT NULL DEFAULT 0, mensaje TEXT NOT NULL DEFAULT '',"
+            " error TEXT, creado REAL NOT NULL, iniciado REAL, terminado REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_cola_estado ON cola(estado, creado)")
+
+    def encolar(self, usuario: str, nombre: str, datos: bytes, hash_audio: str, umbral_db: int, min_silence_ms: int) -> str:
+        id_trab = id_trabajo(hash_audio, umbral_db, min_silence_ms, MODEL_NAME, PROMPT_VERSION)
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            fila = self._db.execute("SELECT estado FROM cola WHERE id = ?", (id_trab,)).fetchone()
+            if fila and fila["estado"] in (PENDIENTE, EN_CURSO):
+                self._db.execute("COMMIT")
+                return id_trab
+
+            pendientes = self._db.execute("SELECT COUNT(*) FROM cola WHERE estado = ?", (PENDIENTE,)).fetchone()[0]
+            if pendientes >= self.max_pendientes:
+                raise ColaLlenaError(f"⏳ Hay {pendientes} exámenes en cola. Inténtalo de nuevo en unos minutos.")
+            activos = self._db.execute(
+                "SELECT COUNT(*) FROM cola WHERE usuario = ? AND estado IN (?, ?)", (usuario, PENDIENTE, EN_CURSO)
+            ).fetchone()[0]
+            if activos >= self.max_por_usuario:
+                raise ColaLlenaError(f"⏳ Ya tienes {activos} exámenes en proceso. Espera a que termine alguno.")
+
+            ruta_audio = os.path.join(self.dir_audio, hash_audio)
+            if not os.path.exists(ruta_audio):
+                with open(ruta_audio + ".tmp", "wb") as f: f.write(datos)
+                os.replace(ruta_audio + ".tmp", ruta_audio)
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO cola (id, usuario, nombre, ruta_audio, hash_audio, umbral_db, min_silence_ms, estado, creado)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (id_trab, usuario, nombre, ruta_audio, hash_audio, int(umbral_db), int(min_silence_ms), PENDIENTE, time.time())
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return id_trab
+
+    def estado(self, id_trab: str):
+        fila = self._db.execute("SELECT * FROM cola WHERE id = ?", (id_trab,)).fetchone()
+        return dict(fila) if fila else None
+
+    def posicion(self, id_trab: str) -> int:
+        fila = self._db.execute("SELECT creado FROM cola WHERE id = ?", (id_trab,)).fetchone()
+        if not fila: return 0
+        return self._db.execute(
+            "SELECT COUNT(*) FROM cola WHERE estado = ? AND creado < ?", (PENDIENTE, fila["creado"])
+        ).fetchone()[0]
+
+    def tomar_siguiente(self):
+        """
+        Reparto justo: primero el usuario con menos trabajos en curso y, a igualdad, el que
+        lleva más tiempo sin ser atendido; dentro del usuario, por orden de llegada.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            fila = self._db.execute(
+                "SELECT p.* FROM cola p WHERE p.estado = ? ORDER BY"
+                " (SELECT COUNT(*) FROM cola r WHERE r.usuario = p.usuario AND r.estado = ?),"
+                " COALESCE((SELECT MAX(r.iniciado) FROM cola r WHERE r.usuario = p.usuario), 0),"
+                " p.creado LIMIT 1",
+                (PENDIENTE, EN_CURSO)
+            ).fetchone()
+            if fila:
+                self._db.execute(
+                    "UPDATE cola SET estado = ?, iniciado = ?, progreso = 0, mensaje = '', error = NULL WHERE id = ?",
+                    (EN_CURSO, time.time(), fila["id"])
+                )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return dict(fila) if fila else None
+
+    def informar(self, id_trab: str, progreso: float = None, mensaje: str = None):
+        if progreso is not None:
+            self._db.execute("UPDATE cola SET progreso = ? WHERE id = ?", (progreso, id_trab))
+        if mensaje is not None:
+            self._db.execute("UPDATE cola SET mensaje = ? WHERE id = ?", (mensaje, id_trab))
+
+    def terminar(self, id_trab: str, error: str = None):
+        fila = self.estado(id_trab)
+        self._db.execute(
+            "UPDATE cola SET estado = ?, error = ?, terminado = ?, progreso = CASE WHEN ? IS NULL THEN 1 ELSE progreso END WHERE id = ?",
+            (ERROR if error else COMPLETADO, error, time.time(), error, id_trab)
+        )
+        # El audio ya no hace falta si ningún otro trabajo pendiente lo usa
+        if fila:
+            restantes = self._db.execute(
+                "SELECT COUNT(*) FROM cola WHERE ruta_audio = ? AND estado IN (?, ?)", (fila["ruta_audio"], PENDIENTE, EN_CURSO)
+            ).fetchone()[0]
+            if not restantes and os.path.exists(fila["ruta_audio"]):
+                os.remove(fila["ruta_audio"])
+
+    def recuperar_huerfanos(self) -> int:
+        """Trabajos 'en_curso' de un worker que murió: vuelven a la cola (el diario los reanuda)."""
+        return self._db.execute("UPDATE cola SET estado = ? WHERE estado = ?", (PENDIENTE, EN_CURSO)).rowcount
+
+
+# ================= WORKERS =================
+
+def _ejecutar_trabajo(cola: ColaTrabajos, job: dict, memoria_max_bytes: int):
+    ruta = job["ruta_audio"]
+    comunes = dict(
+        concurrencia=recursos_worker['concurrencia'], cache=recursos_worker['cache'], limite_api=recursos_worker['limite_api'],
+        trabajo=Trabajo(TRABAJOS_DIR, job["id"]),
+        informar=lambda mensaje: cola.informar(job["id"], mensaje=mensaje),
+        progreso=lambda fraccion: cola.informar(job["id"], progreso=fraccion)
+    )
+
+    # El límite se comprueba ANTES de decodificar: el audio que no cabe (o cuya duración no se
+    # conoce) se procesa en streaming y el PCM entero nunca llega a estar en memoria
+    estimados = bytes_pcm_estimados(ruta) if memoria_max_bytes else 0
+    if estimados is None or estimados > memoria_max_bytes:
+        cola.informar(job["id"], mensaje="🎞️ Audio largo: se procesa por bloques.")
+        max_peak, _, total_muestras = niveles_en_streaming(leer_bloques(ruta))
+        return procesar_examen_streaming(
+            recursos_worker['client'], job["nombre"], ruta, job["hash_audio"], max_peak, total_muestras,
+            job["umbral_db"], job["min_silence_ms"], **comunes
+        )
+
+    with open(ruta, "rb") as f: datos = f.read()
+    muestras = decodificar_pcm(datos)
+    del datos
+    return procesar_examen(recursos_worker['client'], job["nombre"], job["hash_audio"], muestras, job["umbral_db"], job["min_silence_ms"], **comunes)
+
+
+def _bucle_worker(ruta_db: str, limite_api, concurrencia: int, usar_cache: bool, memoria_max_bytes: int, espera: float,
+                  metricas_puerto: int = 0):
+    inicializar_worker(limite_api, concurrencia, usar_cache)
+    if metricas_puerto: servir_metricas(metricas_puerto)
+    cola = ColaTrabajos(ruta_db)
+    while True:
+        job = cola.tomar_siguiente()
+        if not job:
+            time.sleep(espera)
+            continue
+        try:
+            # Traza por trabajo: la decodificación cuenta en el desglose
+            with trazar(Traza(job["id"])):
+                resultado = _ejecutar_trabajo(cola, job, memoria_max_bytes)
+            # Con intervenciones fallidas no se da por completado: al volver a encolarlo se reintentan
+            error = f"{resultado['errores']} intervenciones sin transcribir (error de la API)." if resultado['errores'] else None
+            cola.terminar(job["id"], error=error)
+        except Exception as e:
+            traceback.print_exc()
+            cola.terminar(job["id"], error=str(e))
+
+
+def ejecutar_workers(ruta_db: str, procesos: int, api_concurrencia: int, usar_cache: bool = True,
+                     memoria_max_bytes: int = 0, espera: float = 1.0, metricas_puerto: int = 0, informar=print):
+    """
+    Pool fijo de procesos (= máximo de exámenes simultáneos) con semáforo de API compartido.
+    Con `metricas_puerto`, el proceso i sirve /metrics en metricas_puerto + i.
+    """
+    recuperados = ColaTrabajos(ruta_db).recuperar_huerfanos()
+    if recuperados: informar(f"⏯️ {recuperados} trabajos interrumpidos vuelven a la cola.")
+
+    with Manager() as manager:
+        limite_api = manager.BoundedSemaphore(api_concurrencia)
+        hijos = [
+            Process(target=_bucle_worker, daemon=True,
+                    args=(ruta_db, limite_api, api_concurrencia, usar_cache, memoria_max_bytes, espera, metricas_puerto + i if metricas_puerto else 0))
+            for i in range(procesos)
+        ]
+        for h in hijos: h.start()
+        informar(f"👷 {procesos} workers atendiendo la cola {ruta_db} (API: {api_concurrencia} peticiones simultáneas).")
+        if metricas_puerto: informar(f"📈 Métricas Prometheus en :{metricas_puerto}-{metricas_puerto + procesos - 1}/metrics")
+        try:
+            for h in hijos: h.join()
+        except KeyboardInterrupt:
+            for h in hijos: h.terminate()
@@ -0,0 +1,52 @@
+import os
+from dotenv import load_dotenv
+
+# ================= CONFIGURACIÓN INICIAL =================
+load_dotenv()
+
+API_KEY = os.getenv("OPENROUTER_API_KEY")
+BASE_URL = os.getenv("OPENROUTER_BASE_URL")
+MODEL_NAME = os.getenv("OPENROUTER_MODEL")
+AUDIO_CACHE_MB = int(os.getenv("AUDIO_CACHE_MB", "256"))
+CONCURRENCIA = int(os.getenv("TRANSCRIPCION_CONCURRENCIA", "4"))
+CACHE_DIR = os.getenv("TRANSCRIPCION_CACHE_DIR", ".cache")
+CACHE_TRANSCRIPCION_MB = int(os.getenv("TRANSCRIPCION_CACHE_MB", "64"))
+TRABAJOS_DIR = os.path.join(CACHE_DIR, "trabajos")
+
+# Empaquetado de segmentos (0 = desactivado): intervenciones cortas consecutivas en una sola
+# petición y monólogos largos partidos por su punto de menor energía
+AGRUPAR_MS = int(float(os.getenv("TRANSCRIPCION_AGRUPAR_S", "20")) * 1000)
+AGRUPAR_MAX = int(os.getenv("TRANSCRIPCION_AGRUPAR_MAX", "6"))
+MAX_SEGMENTO_MS = int(float(os.getenv("TRANSCRIPCION_MAX_SEGMENTO_S", "45")) * 1000)
+
+# Identificación de la lengua B: collage corto primero y el completo (~50 s) solo si el código
+# devuelto no es una lengua conocida (0 = directamente el completo)
+IDIOMA_COLLAGE_CORTO_MS = int(float(os.getenv("IDIOMA_COLLAGE_CORTO_S", "15")) * 1000)
+
+# Audio enviado a la API: formato (mp3, opus o flac), motor (auto, ffmpeg o proceso) y
+# presupuesto de base64 por petición en KB (0 = sin límite; se baja el bitrate para caber)
+AUDIO_FORMATO = os.getenv("AUDIO_FORMATO", "mp3").lower()
+AUDIO_MOTOR = os.getenv("AUDIO_MOTOR", "auto").lower()
+AUDIO_MAX_KB = int(os.getenv("AUDIO_MAX_KB", "0"))
+
+# Cliente de la API: timeout por petición, reintentos (429/5xx/cortes), límite de tasa por
+# proceso (0 = sin límite) y cobertura de las peticiones más lentas (percentil; 0 = desactivada)
+API_TIMEOUT_S = float(os.getenv("API_TIMEOUT_S", "90"))
+API_REINTENTOS = int(os.getenv("API_REINTENTOS", "4"))
+API_PETICIONES_MIN = float(os.getenv("API_PETICIONES_MIN", "0"))
+API_RAFAGA = int(os.getenv("API_RAFAGA", "5"))
+API_COBERTURA_PERCENTIL = float(os.getenv("API_COBERTURA_PERCENTIL", "0"))
+
+# Instrumentación: log JSONL de tramos por etapa, puerto del endpoint Prometheus (0 = sin endpoint)
+# y dirección en la que escucha (solo local por defecto; 0.0.0.0 para que lo lea otra máquina)
+METRICAS_JSONL = os.getenv("METRICAS_JSONL", "")
+METRICAS_PUERTO = int(os.getenv("METRICAS_PUERTO", "0"))
+METRICAS_HOST = os.getenv("METRICAS_HOST", "127.0.0.1")
+
+# Cola de trabajos en segundo plano (python -m transcriptor worker)
+COLA_TRABAJOS = os.getenv("COLA_TRABAJOS", "").lower() in ("1", "true", "si", "sí")
+COLA_DB = os.path.join(CACHE_DIR, "cola.sqlite3")
+COLA_PROCESOS = int(os.getenv("COLA_PROCESOS", "2"))
+COLA_MAX_PENDIENTES = int(os.getenv("COLA_MAX_PENDIENTES", "50"))
+COLA_MAX_POR_USUARIO = int(os.getenv("COLA_MAX_POR_USUARIO", "3"))
+COLA_MEMORIA_MB = int(os.getenv("COLA_MEMORIA_MB", "512"))
@@ -0,0 +1,78 @@
+import numpy as np
+
+from transcriptor.audio import MUESTRAS_POR_MS
+
+# ================= EMPAQUETADO ADAPTATIVO DE SEGMENTOS =================
+# Entre la detección y la transcripción: cada intervención corta ("sí", una tos) costaba una
+# petición completa con todo el prompt forense, y los monólogos largos generaban cargas MP3
+# enormes y respuestas lentas. Aquí se parten los segmentos largos por su punto de menor
+# energía y se agrupan los cortos consecutivos en una sola petición. Cada intervención
+# conserva su propia marca de tiempo en el acta: las piezas de una intervención partida se
+# transcriben por separado y sus textos se vuelven a unir en una sola línea.
+
+FRAME_CORTE_MS = 100
+
+
+def se_parte(duracion_ms: int, max_ms: int) -> bool:
+    """Si puntos_de_corte partirá una intervención de `duracion_ms` (solo cuentan los frames completos)."""
+    return bool(max_ms) and duracion_ms // FRAME_CORTE_MS * FRAME_CORTE_MS > max_ms
+
+
+def puntos_de_corte(muestras: np.ndarray, max_ms: int) -> list:
+    """
+    Desplazamientos (ms, relativos al inicio de `muestras`) donde partir un segmento de más de
+    `max_ms`: en cada tramo se elige el frame de menor energía de su segunda mitad, así ninguna
+    pieza pasa de `max_ms` ni baja de `max_ms / 2` (salvo la última).
+    """
+    tam = FRAME_CORTE_MS * MUESTRAS_POR_MS
+    n_frames = len(muestras) // tam
+    if not max_ms or n_frames * FRAME_CORTE_MS <= max_ms: return []
+    matriz = muestras[:n_frames * tam].astype(np.float64).reshape(n_frames, tam)
+    return cortes_por_energia(np.einsum('ij,ij->i', matriz, matriz), len(muestras) // MUESTRAS_POR_MS, max_ms)
+
+
+def cortes_por_energia(energia: np.ndarray, total_ms: int, max_ms: int) -> list:
+    """puntos_de_corte a partir de la energía por frame ya calculada (p. ej. del PerfilEnergia)."""
+    n_frames = len(energia)
+    if not max_ms or n_frames * FRAME_CORTE_MS <= max_ms: return []
+    cortes, inicio = [], 0
+    por_tramo = max(2, max_ms // FRAME_CORTE_MS)
+    while total_ms - inicio > max_ms:
+        f0 = inicio // FRAME_CORTE_MS
+        desde, hasta = f0 + por_tramo // 2, min(f0 + por_tramo, n_frames)
+        if hasta <= desde: break
+        # Corte en el centro del frame más silencioso (argmin: el primero si hay empate)
+        f = desde + int(np.argmin(energia[desde:hasta]))
+        inicio = f * FRAME_CORTE_MS + FRAME_CORTE_MS // 2
+        cortes.append(inicio)
+    return cortes
+
+
+def partir_largos(muestras: np.ndarray, chunks: list, max_ms: int) -> list:
+    """Sustituye cada [inicio, fin] de más de `max_ms` por sus piezas consecutivas."""
+    if not max_ms: return chunks
+    resultado = []
+    for inicio, fin in chunks:
+        cortes = puntos_de_corte(muestras[inicio * MUESTRAS_POR_MS:fin * MUESTRAS_POR_MS], max_ms)
+        limites = [inicio] + [inicio + c for c in cortes] + [fin]
+        resultado += [[a, b] for a, b in zip(limites, limites[1:])]
+    return resultado
+
+
+def agrupar(rangos, objetivo_ms: int, max_por_grupo: int, max_ms: int = 0):
+    """
+    Genera grupos de índices consecutivos cuya duración sumada no pasa de `objetivo_ms`
+    (un segmento más largo va solo, igual que los que se van a partir por pasar de `max_ms`).
+    Acepta un iterador: en streaming solo necesita ver el segmento siguiente para cerrar cada grupo.
+    """
+    grupo, duracion, partido = [], 0, False
+    for i, (inicio, fin) in enumerate(rangos):
+        d = fin - inicio
+        solo = se_parte(d, max_ms)
+        if grupo and (partido or solo or not objetivo_ms or duracion + d > objetivo_ms or len(grupo) >= max_por_grupo):
+            yield grupo
+            grupo, duracion = [], 0
+        grupo.append(i)
+        duracion += d
+        partido = solo
+    if grupo: yield grupo
@@ -0,0 +1,29 @@
+import re
+
+# ================= FILTROS FORENSES (POST-PROCESADO DE TEXTO) =================
+
+# Una palabra corta (<=3 letras) repetida más de 4 veces seguidas (compilado una vez por proceso)
+PATRON_RUIDO = re.compile(r'\b(\w{1,3})(\s+\1){4,}', flags=re.IGNORECASE)
+
+def limpiar_repeticiones(texto):
+    """
+    Detecta y ELIMINA bucles de alucinación (ej: 'la la la la la').
+    Diferencia entre un tartamudeo natural (2-3 veces) y un error de IA (+4 veces).
+    """
+    if not texto: return ""
+    
+    # 1. Caso extremo: "la la la la la la" (Alucinación de ruido)
+    # Si una palabra corta (<=3 letras) se repite más de 4 veces, es ruido casi seguro. Borramos todo.
+    if PATRON_RUIDO.search(texto):
+        return "" # Devolvemos vacío, asumimos que era ruido de papel/tos
+
+    # 2. Caso leve: Tartamudeo real o bucle pequeño
+    # Si se repite 3 veces, lo dejamos como tartamudeo (ej: "pero pero pero...")
+    return texto
+
+def es_eco(texto, contexto_previo):
+    """
+    Filtro Anti-Eco: el texto transcrito está contenido DENTRO del final del contexto previo
+    (repetición exacta de lo ya dicho).
+    """
+    return len(texto) > 10 and texto in contexto_previo[-len(texto)-20:]
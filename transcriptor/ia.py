@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import re
+import json
+import functools
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from transcriptor.audio import ANCHO_MUESTRA, a_segmento, normalizar_audio
+from transcriptor.cliente import ClienteResiliente, LimitadorTasa
+from transcriptor.codificador import codificador_por_defecto
+from transcriptor.config import (API_COBERTURA_PERCENTIL, API_KEY, API_PETICIONES_MIN, API_RAFAGA, API_REINTENTOS,
+                                 API_TIMEOUT_S, BASE_URL, MODEL_NAME)
+from transcriptor.filtros import es_eco, limpiar_repeticiones
+from transcriptor.metricas import registrar, tramo
+
+# El SDK de la API (~0,5 s de import) y pydub se cargan al usarse por primera vez: importar el
+# pipeline (la app antes de procesar, la cola, el worker) no los arrastra
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+# ================= CONFIGURACIÓN DE IDIOMAS =================
+MAPA_ISO_IDIOMAS = {
+    'HR': 'CROATA', 'HY': 'ARMENIO', 'KO': 'COREANO', 'EN': 'INGLÉS',
+    'FR': 'FRANCÉS', 'IT': 'ITALIANO', 'DE': 'ALEMÁN', 'PT': 'PORTUGUÉS',
+    'NL': 'NEERLANDÉS', 'SV': 'SUECO', 'DA': 'DANÉS', 'FI': 'FINLANDÉS',
+    'NO': 'NORUEGO', 'IS': 'ISLANDÉS', 'RU': 'RUSO', 'PL': 'POLACO',
+    'RO': 'RUMANO', 'CS': 'CHECO', 'SK': 'ESLOVACO', 'HU': 'HÚNGARO',
+    'BG': 'BÚLGARO', 'SR': 'SERBIO', 'UK': 'UCRANIANO', 'EL': 'GRIEGO',
+    'SL': 'ESLOVENO', 'ET': 'ESTONIO', 'LV': 'LETÓN', 'LT': 'LITUANO',
+    'ZH': 'CHINO', 'JA': 'JAPONÉS', 'AR': 'ÁRABE', 'HI': 'HINDI',
+    'TR': 'TURCO', 'HE': 'HEBREO', 'VI': 'VIETNAMITA', 'TH': 'TAILANDÉS',
+    'ID': 'INDONESIO', 'FA': 'PERSA', 'CA': 'CATALÁN', 'GL': 'GALLEGO',
+    'EU': 'EUSKERA'
+}
+# Primer código conocido en la respuesta de identificación (compilado una vez por proceso)
+PATRON_ISO = re.compile(r'\b(' + '|'.join(MAPA_ISO_IDIOMAS) + r')\b')
+
+@functools.lru_cache(maxsize=None)
+def get_ai_client():
+    # Uno por proceso: todas las sesiones y hilos comparten conexiones y límite de tasa
+    if not API_KEY: return None
+    from openai import OpenAI
+    limitador = LimitadorTasa(API_PETICIONES_MIN, API_RAFAGA) if API_PETICIONES_MIN > 0 else None
+    return ClienteResiliente(
+        OpenAI(base_url=BASE_URL, api_key=API_KEY, max_retries=0), timeout=API_TIMEOUT_S, reintentos=API_REINTENTOS,
+        limitador=limitador, percentil_cobertura=API_COBERTURA_PERCENTIL
+    )
+
+def _crear_respuesta(client, tipo: str, **kwargs):
+    """client.chat.completions.create medido (tramo 'api'): bytes enviados, tokens de respuesta y reintentos."""
+    with tramo("api", tipo=tipo, bytes=len(json.dumps(kwargs["messages"]))) as t:
+        completions = getattr(getattr(client, "chat", None), "completions", None)
+        crudo = getattr(completions, "with_raw_response", None)
+        if isinstance(client, ClienteResiliente):
+            response, t["reintentos"], cubierta = client.crear(tipo, **kwargs)
+            if cubierta: t["resultado"] = "cobertura"
+        elif crudo is not None:
+            # La respuesta cruda del SDK expone los reintentos que hizo internamente
+            bruto = crudo.create(**kwargs)
+            t["reintentos"] = bruto.retries_taken
+            response = bruto.parse()
+        else:
+            response = completions.create(**kwargs)
+        t["tokens"] = getattr(getattr(response, "usage", None), "completion_tokens", 0) or 0
+    return response
+
+def _preparar_audio(audio: AudioSegment, normalizar: bool = True) -> str:
+    """Audio -> data URL (base64) con el codificador configurado (AUDIO_FORMATO)."""
+    if normalizar:
+        with tramo("normalizacion"):
+            audio = normalizar_audio(audio)
+    codificador = codificador_por_defecto()
+    with tramo("codificacion", formato=codificador.firma) as t:
+        url_audio = codificador.a_data_url(np.frombuffer(audio.set_sample_width(ANCHO_MUESTRA).raw_data, dtype=np.int16))
+        t["bytes"] = len(url_audio)
+    return url_audio
+
+# ================= LÓGICA DE IA (DETECTAR Y TRANSCRIBIR) =================
+
+DURACION_COLLAGE_MS = 50000
+
+def crear_collage_audio(muestras: np.ndarray, chunks_ranges: list, max_ms: int = DURACION_COLLAGE_MS) -> AudioSegment:
+    from pydub import AudioSegment
+    collage = AudioSegment.empty()
+    if not chunks_ranges: return a_segmento(muestras, 0, 60000)
+
+    # Hasta 6 clips (de ~6 s) repartidos por el examen; menos si el collage es corto
+    num_muestras = min(len(chunks_ranges), 6, -(-max_ms // 6000))
+    step = len(chunks_ranges) // num_muestras if num_muestras > 0 else 1
+    
+    for i in range(0, len(chunks_ranges), step):
+        start, end = chunks_ranges[i]
+        duracion = end - start
+        if duracion > 8000:
+            mid = start + (duracion // 2)
+            clip = a_segmento(muestras, mid - 3000, mid + 3000)
+        else:
+            clip = a_segmento(muestras, start, end)
+        collage += clip
+        if len(collage) > max_ms: break
+            
+    return normalizar_audio(collage)
+
+# Cambiar si se modifica el prompt de identificación: invalida la lengua B guardada en caché
+PROMPT_IDIOMA_VERSION = "1.0.0"
+
+def preparar_collage(audio_collage: AudioSegment) -> str:
+    return _preparar_audio(audio_collage, normalizar=False) # El collage ya sale normalizado
+
+def detectar_lengua_b(client, audio_collage: AudioSegment, url_audio: str = None) -> tuple:
+    from openai import APIError
+    url_audio = url_audio or preparar_collage(audio_collage)
+    prompt_sistema = "Eres un lingüista experto. Identifica la LENGUA EXTRANJERA (no Español) en el audio. Responde SOLO con el código ISO 639-1 (2 letras)."
+    try:
+        response = _crear_respuesta(
+            client, "idioma",
+            model=MODEL_NAME,
+            messages=[
+                {"role": "system", "content": prompt_sistema},
+                {
+                    "role": "user", 
+                    "content": [{"type": "text", "text": "Código ISO:"},
+                                {"type": "image_url", "image_url": {"url": url_audio}}]
+                }
+            ],
+            temperature=0, max_tokens=10
+        )
+        raw_text = response.choices[0].message.content.strip().upper()
+        match = PATRON_ISO.search(raw_text)
+        if match:
+            iso_code = match.group(1)
+            return MAPA_ISO_IDIOMAS.get(iso_code, iso_code), iso_code
+        else: return "IDIOMA_B", "XX"
+    except APIError:
+        # API caída tras los reintentos: mejor fallar (el trabajo se reanuda) que seguir sin lengua B
+        raise
+    except Exception: return "DESCONOCIDO", "XX"
+
+# Cambiar si se modifica prompt_sistema o el post-procesado: invalida la caché de transcripciones
+PROMPT_VERSION = "2.1.0"
+
+def _instrucciones_forenses(lengua_b_nombre: str, lengua_b_iso: str, contexto_previo: str, idioma_previo: str) -> str:
+    # Parte común del prompt forense (segmento suelto y lote)
+    return f"""
+    Eres un PERITO TRANSCRIPTOR FORENSE. 
+    Contexto: Examen de Interpretación Bilateral.
+    Idiomas: ESPAÑOL (ES) y {lengua_b_nombre.upper()} ({lengua_b_iso}).
+    
+    CONTEXTO PREVIO: "...{contexto_previo[-300:]}" (Idioma: {idioma_previo})
+
+    INSTRUCCIONES CLAVE:
+    1. TRANSCRIPCIÓN LITERAL (VERBATIM): Escribe EXACTAMENTE lo que escuchas.
+    2. PROHIBIDO CORREGIR: NO arregles la gramática, NO mejores el estilo, NO corrijas la pronunciación. Si el alumno dice "yo sabo", escribe "yo sabo".
+    3. INERCIA DE IDIOMA: Si el audio es ambiguo, corto o una continuación clara, MANTÉN el idioma anterior ({idioma_previo}). Solo cambia si es evidente.
+    4. GESTIÓN DE RUIDO:
+         - Si escuchas RUIDO DE PAPEL, GOLPES, TOS o RESPIRACIÓN FUERTE -> NO lo transcribas como "la la la" o sílabas sueltas. Devuelve texto vacío "".
+         - Solo transcribe si hay PALABRAS INTELIGIBLES. Si solo hay ruido, devuelve "".
+    5. PROHIBIDO REPETIR CONTEXTO: La información de "MEMORIA DE CONTEXTO" es lo que YA se dijo. NO lo vuelvas a escribir. Si el audio actual solo contiene silencio o repite lo anterior, devuelve "".
+    6. FORMATO: JSON estricto.
+    
+"""
+
+def _pedir_json(client, tipo: str, prompt_sistema: str, url_audio: str, instruccion: str):
+    """Llamada común: devuelve el JSON de la respuesta, o un dict de resultado si no es válida."""
+    response = _crear_respuesta(
+        client, tipo,
+        model=MODEL_NAME,
+        messages=[
+            {"role": "system", "content": prompt_sistema},
+            {
+                "role": "user", 
+                "content": [
+                    {"type": "text", "text": instruccion},
+                    {"type": "image_url", "image_url": {"url": url_audio}}
+                ]
+            }
+        ],
+        response_format={"type": "json_object"}, 
+        temperature=0
+    )
+    
+    # --- VALIDACIONES ---
+    if not response or not response.choices:
+        registrar("filtros", resultado="error"); return None, {"idioma": "ERROR", "texto": ""}
+    mensaje = response.choices[0].message
+    if not mensaje or not mensaje.content:
+        registrar("filtros", resultado="vacio"); return None, {"idioma": "??", "texto": ""}
+
+    try:
+        return json.loads(mensaje.content), None
+    except json.JSONDecodeError:
+        registrar("filtros", resultado="invalido"); return None, {"idioma": "ERROR", "texto": ""}
+
+def _filtrar(resultado, contexto_previo: str, filtrar_eco: bool) -> tuple:
+    # Devuelve (motivo, resultado): el motivo queda en el tramo 'filtros'
+    if not isinstance(resultado, dict): return "invalido", {"idioma": "??", "texto": ""}
+    
+    texto_raw = resultado.get("texto", "").strip()
+    
+    # Filtros de Alucinación
+    if texto_raw.lower() in ["json", "undefined", "null"]:
+        return "alucinacion", {"idioma": "??", "texto": ""}
+    
+    # Filtro Anti-Eco (Python):
+    # Si el texto transcrito está contenido DENTRO del contexto previo (es una repetición exacta), lo borramos.
+    # En modo concurrente lo aplica transcribir_en_orden contra el contexto real (filtrar_eco=False).
+    if filtrar_eco and es_eco(texto_raw, contexto_previo):
+         return "eco", {"idioma": "??", "texto": ""} # Es un eco, lo borramos
+        
+    # APLICAMOS EL FILTRO DE REPETICIÓN
+    texto_final = limpiar_repeticiones(texto_raw)
+    
+    resultado["texto"] = texto_final
+    if not texto_final: return ("repeticion" if texto_raw else "vacio"), resultado
+    return "ok", resultado
+
+def _depurar_resultado(resultado, contexto_previo: str, filtrar_eco: bool) -> dict:
+    with tramo("filtros") as t:
+        t["resultado"], resultado = _filtrar(resultado, contexto_previo, filtrar_eco)
+    return resultado
+
+def preparar_segmento(segment_audio: AudioSegment) -> str:
+    """Normalización + codificación de un segmento (no depende de la lengua B: se puede adelantar)."""
+    return _preparar_audio(segment_audio)
+
+def transcribir_segmento_forense(client, segment_audio: AudioSegment, lengua_b_nombre: str, lengua_b_iso: str, contexto_previo: str, idioma_previo: str, filtrar_eco: bool = True, url_audio: str = None) -> dict:
+    # 1. Normalización (salvo que llegue ya preparado con preparar_segmento)
+    url_audio = url_audio or _preparar_audio(segment_audio)
+    
+    # 2. Prompt Forense Anti-Ruido (Actualizado)
+    prompt_sistema = _instrucciones_forenses(lengua_b_nombre, lengua_b_iso, contexto_previo, idioma_previo) + f"""    Output: {{"idioma": "ES" o "{lengua_b_iso}", "texto": "..."}}
+    """
+
+    try:
+        content, fallo = _pedir_json(client, "segmento", prompt_sistema, url_audio, "Transcribe (Ignora ruidos de fondo/papel):")
+        if fallo: return fallo
+            
+        if isinstance(content, list): resultado = content[0] if content else {}
+        else: resultado = content
+            
+        return _depurar_resultado(resultado, contexto_previo, filtrar_eco)
+
+    except Exception as e:
+        return {"idioma": "ERROR", "texto": f"[Error: {str(e)}]"}
+
+# ================= LOTES DE INTERVENCIONES CORTAS =================
+
+SEPARACION_LOTE_MS = 800 # Silencio entre fragmentos del audio empaquetado
+
+def preparar_lote(fragmentos: list) -> tuple:
+    """Fragmentos concatenados y separados por silencio -> (data URL, posiciones (inicio, fin) en ms)."""
+    from pydub import AudioSegment
+    separacion = AudioSegment.silent(duration=SEPARACION_LOTE_MS, frame_rate=16000)
+    audio, posiciones = AudioSegment.empty(), []
+    for frag in fragmentos:
+        if len(audio): audio += separacion
+        posiciones.append((len(audio), len(audio) + len(frag)))
+        audio += frag
+    return _preparar_audio(audio), posiciones
+
+def transcribir_lote_forense(client, fragmentos: list, lengua_b_nombre: str, lengua_b_iso: str, contexto_previo: str, idioma_previo: str, preparado: tuple = None):
+    """
+    Varias intervenciones consecutivas en UNA petición: se concatenan separadas por silencio y
+    el modelo devuelve un resultado por fragmento. Devuelve la lista (mismo orden y longitud que
+    `fragmentos`) o None si la respuesta no encaja (el llamante las transcribe por separado).
+    El Anti-Eco lo aplica siempre el pipeline en orden. `preparado`: salida de preparar_lote.
+    """
+    url_audio, posiciones = preparado or preparar_lote(fragmentos)
+
+    lista = "\n".join(
+        f"    {n}. De {ini / 1000:.1f} s a {fin / 1000:.1f} s" for n, (ini, fin) in enumerate(posiciones, 1)
+    )
+    prompt_sistema = _instrucciones_forenses(lengua_b_nombre, lengua_b_iso, contexto_previo, idioma_previo) + f"""    El audio contiene {len(fragmentos)} FRAGMENTOS consecutivos del examen separados por silencios:
+{lista}
+    Transcribe CADA fragmento por separado y en orden (texto vacío "" si solo hay ruido).
+    Output: {{"segmentos": [{{"idioma": "ES" o "{lengua_b_iso}", "texto": "..."}}, ...]}} con EXACTAMENTE {len(fragmentos)} elementos.
+    """
+
+    try:
+        content, fallo = _pedir_json(client, "lote", prompt_sistema, url_audio, f"Transcribe los {len(fragmentos)} fragmentos (Ignora ruidos de fondo/papel):")
+        if fallo: return None
+        segmentos = content.get("segmentos") if isinstance(content, dict) else content
+        if not isinstance(segmentos, list) or len(segmentos) != len(fragmentos): return None
+        return [_depurar_resultado(r, contexto_previo, filtrar_eco=False) for r in segmentos]
+    except Exception:
+        return None
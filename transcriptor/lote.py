@@ -0,0 +1,131 @@
+import os
+import json
+import time
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from transcriptor.audio import FRECUENCIA, decodificar_pcm, hash_contenido
+from transcriptor.cache import CacheTranscripciones
+from transcriptor.config import CACHE_DIR, CACHE_TRANSCRIPCION_MB, MODEL_NAME, TRABAJOS_DIR
+from transcriptor.ia import PROMPT_VERSION, get_ai_client
+from transcriptor.metricas import Traza, tramo, trazar
+from transcriptor.pipeline import procesar_examen, procesar_examen_streaming
+from transcriptor.streaming import hash_archivo, leer_bloques, niveles_en_streaming
+from transcriptor.trabajos import Trabajo, id_trabajo
+from transcriptor.vad import autocalibrar_audio, autocalibrar_niveles
+
+# ================= PROCESADO POR LOTES (SIN UI) =================
+# Cada archivo va a un proceso del pool (decodificación y VAD son CPU); las llamadas a la
+# API de todos los procesos comparten un único semáforo de concurrencia.
+
+EXTENSIONES_AUDIO = ('.mp3', '.m4a', '.wav', '.aac')
+
+# Recursos de cada proceso del pool (cliente, semáforo de API compartido, caché). Los usan
+# también los workers de la cola (cola.py)
+recursos_worker = {}
+
+
+def inicializar_worker(limite_api, concurrencia: int, usar_cache: bool):
+    """Inicializador de cada proceso: prepara `recursos_worker` una sola vez por proceso."""
+    recursos_worker['client'] = get_ai_client()
+    recursos_worker['limite_api'] = limite_api
+    recursos_worker['concurrencia'] = concurrencia
+    recursos_worker['cache'] = CacheTranscripciones(os.path.join(CACHE_DIR, "transcripciones.sqlite3"), CACHE_TRANSCRIPCION_MB * 1024 * 1024) if usar_cache else None
+
+
+def listar_examenes(carpeta: str) -> list:
+    return sorted(
+        os.path.join(carpeta, f) for f in os.listdir(carpeta)
+        if f.lower().endswith(EXTENSIONES_AUDIO) and os.path.isfile(os.path.join(carpeta, f))
+    )
+
+
+def procesar_archivo(ruta: str, salida: str, umbral_db: int = None, min_silence_ms: int = 2000, streaming: bool = False) -> dict:
+    """Genera el acta TXT de un examen (en un proceso del pool) y devuelve su resumen."""
+    nombre = os.path.basename(ruta)
+    resumen = {"archivo": nombre, "ok": False, "tiempos": {}}
+    tiempos = resumen["tiempos"]
+    t_inicio = time.perf_counter()
+    try:
+        # Traza del examen completo (decodificación y calibración incluidas)
+        with trazar(Traza()):
+            if streaming:
+                # Dos pasadas por la tubería de ffmpeg: niveles (umbral) y luego detección + transcripción
+                t0 = time.perf_counter()
+                hash_audio = hash_archivo(ruta)
+                with tramo("calibracion"):
+                    max_peak, avg, total_muestras = niveles_en_streaming(leer_bloques(ruta))
+                    if umbral_db is None: umbral_db, _, _ = autocalibrar_niveles(max_peak, avg)
+                tiempos['calibracion'] = time.perf_counter() - t0
+            else:
+                t0 = time.perf_counter()
+                with open(ruta, 'rb') as f: datos = f.read()
+                hash_audio = hash_contenido(datos)
+                muestras = decodificar_pcm(datos)
+                total_muestras = len(muestras)
+                del datos
+                tiempos['decodificacion'] = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                if umbral_db is None: umbral_db, _, _ = autocalibrar_audio(muestras)
+                tiempos['calibracion'] = time.perf_counter() - t0
+
+            # Trabajo reanudable: relanzar el lote continúa los exámenes que quedaron a medias
+            trabajo = Trabajo(TRABAJOS_DIR, id_trabajo(hash_audio, umbral_db, min_silence_ms, MODEL_NAME, PROMPT_VERSION))
+            comunes = dict(concurrencia=recursos_worker['concurrencia'], cache=recursos_worker['cache'], limite_api=recursos_worker['limite_api'], trabajo=trabajo)
+            if streaming:
+                resultado = procesar_examen_streaming(
+                    recursos_worker['client'], nombre, ruta, hash_audio, max_peak, total_muestras, umbral_db, min_silence_ms, **comunes
+                )
+            else:
+                resultado = procesar_examen(recursos_worker['client'], nombre, hash_audio, muestras, umbral_db, min_silence_ms, **comunes)
+            tiempos.update(resultado['tiempos'])
+
+            ruta_acta = os.path.join(salida, resultado['nombre_acta'])
+            with open(ruta_acta, 'w', encoding='utf-8') as f: f.write(resultado['texto'])
+
+            resumen.update({
+                "ok": True, "acta": ruta_acta, "iso_lb": resultado['iso_lb'], "umbral_db": umbral_db,
+                "intervenciones": len(resultado['chunks']), "peticiones": resultado['peticiones'], "cache": resultado['cache'],
+                "duracion_audio_s": total_muestras / FRECUENCIA, "desglose": resultado['desglose'],
+            })
+            # Relanzar el lote reanuda el examen y reintenta solo las intervenciones fallidas
+            if resultado['errores']:
+                resumen.update(ok=False, error=f"{resultado['errores']} intervenciones sin transcribir (error de la API)")
+    except Exception as e:
+        resumen["error"] = str(e)
+    tiempos['total'] = time.perf_counter() - t_inicio
+    return resumen
+
+
+def procesar_carpeta(carpeta: str, salida: str, workers: int, api_concurrencia: int,
+                     umbral_db: int = None, min_silence_ms: int = 2000, usar_cache: bool = True, streaming: bool = False,
+                     informar=print) -> dict:
+    archivos = listar_examenes(carpeta)
+    os.makedirs(salida, exist_ok=True)
+    resultados = []
+    t_inicio = time.perf_counter()
+
+    with Manager() as manager:
+        limite_api = manager.BoundedSemaphore(api_concurrencia)
+        with ProcessPoolExecutor(max_workers=workers, initializer=inicializar_worker,
+                                 initargs=(limite_api, api_concurrencia, usar_cache)) as pool:
+            futuros = [pool.submit(procesar_archivo, ruta, salida, umbral_db, min_silence_ms, streaming) for ruta in archivos]
+            for n, futuro in enumerate(as_completed(futuros), 1):
+                r = futuro.result()
+                resultados.append(r)
+                estado = f"✅ {r['acta']}" if r['ok'] else f"❌ {r['error']}"
+                informar(f"[{n}/{len(archivos)}] {r['archivo']} ({r['tiempos']['total']:.1f} s) {estado}")
+
+    resumen = {
+        "carpeta": os.path.abspath(carpeta),
+        "workers": workers,
+        "api_concurrencia": api_concurrencia,
+        "total_s": time.perf_counter() - t_inicio,
+        "correctos": sum(r['ok'] for r in resultados),
+        "errores": sum(not r['ok'] for r in resultados),
+        "archivos": sorted(resultados, key=lambda r: r['archivo']),
+    }
+    with open(os.path.join(salida, "resumen.json"), 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    return resumen
@@ -0,0 +1,182 @@
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from transcriptor.config import METRICAS_HOST, METRICAS_JSONL
+
+# ================= INSTRUMENTACIÓN POR ETAPAS =================
+# Cada etapa "hoja" del pipeline (decodificación, VAD, collage, normalización, codificación,
+# llamada a la API, filtros) abre un tramo con su duración y atributos (bytes, tokens,
+# reintentos, resultado del filtro). Cada tramo se suma a:
+# - el registro del proceso (texto Prometheus, opcionalmente servido por HTTP),
+# - la traza del trabajo en curso (desglose por examen en el resumen y en la UI),
+# - un log JSONL si METRICAS_JSONL está configurado.
+# Los tramos no se anidan, así que las sumas por etapa no cuentan nada dos veces.
+
+BUCKETS_S = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_traza_actual = contextvars.ContextVar("traza_actual", default=None)
+
+
+class Traza:
+    """Tramos de un trabajo. Se activa con `trazar(traza)` y la heredan los hilos de en_contexto()."""
+
+    def __init__(self, trabajo_id: str = None):
+        self.trabajo_id = trabajo_id
+        self.tramos = []
+        self._lock = threading.Lock()
+
+    def agregar(self, tramo: dict):
+        with self._lock: self.tramos.append(tramo)
+
+    def desglose(self) -> dict:
+        """{etapa: {n, segundos, bytes, tokens, reintentos, errores, resultados}} (segundos sumados entre hilos)."""
+        etapas = {}
+        with self._lock: tramos = list(self.tramos)
+        for t in tramos:
+            e = etapas.setdefault(t["etapa"], {"n": 0, "segundos": 0.0, "bytes": 0, "tokens": 0, "reintentos": 0, "errores": 0, "resultados": {}})
+            e["n"] += 1
+            e["segundos"] += t.get("duracion_s", 0.0)
+            e["bytes"] += t.get("bytes", 0)
+            e["tokens"] += t.get("tokens", 0)
+            e["reintentos"] += t.get("reintentos", 0)
+            e["errores"] += "error" in t
+            if "resultado" in t: e["resultados"][t["resultado"]] = e["resultados"].get(t["resultado"], 0) + 1
+        return etapas
+
+
+class RegistroMetricas:
+    """Agregados del proceso en formato de exposición de Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = defaultdict(lambda: [0] * (len(BUCKETS_S) + 1))
+        self._suma = defaultdict(float)
+        self._cuenta = defaultdict(int)
+        self._bytes = defaultdict(int)
+        self._tokens = defaultdict(int)
+        self._reintentos = defaultdict(int)
+        self._errores = defaultdict(int)
+        self._resultados = defaultdict(int)
+
+    def observar(self, tramo: dict):
+        etapa, duracion = tramo["etapa"], tramo.get("duracion_s", 0.0)
+        with self._lock:
+            self._buckets[etapa][bisect.bisect_left(BUCKETS_S, duracion)] += 1
+            self._suma[etapa] += duracion
+            self._cuenta[etapa] += 1
+            self._bytes[etapa] += tramo.get("bytes", 0)
+            self._tokens[etapa] += tramo.get("tokens", 0)
+            self._reintentos[etapa] += tramo.get("reintentos", 0)
+            if "error" in tramo: self._errores[etapa] += 1
+            if "resultado" in tramo: self._resultados[(etapa, tramo["resultado"])] += 1
+
+    def texto_prometheus(self) -> str:
+        lineas = [
+            "# HELP transcriptor_etapa_segundos Duración de cada etapa del pipeline.",
+            "# TYPE transcriptor_etapa_segundos histogram",
+        ]
+        with self._lock:
+            for etapa in sorted(self._cuenta):
+                acumulado = 0
+                for limite, n in zip(BUCKETS_S + ("+Inf",), self._buckets[etapa]):
+                    acumulado += n
+                    lineas.append(f'transcriptor_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+                lineas.append(f'transcriptor_etapa_segundos_sum{{etapa="{etapa}"}} {self._suma[etapa]:.6f}')
+                lineas.append(f'transcriptor_etapa_segundos_count{{etapa="{etapa}"}} {self._cuenta[etapa]}')
+            for nombre, ayuda, datos in (
+                ("transcriptor_etapa_bytes_total", "Bytes procesados o enviados por etapa.", self._bytes),
+                ("transcriptor_tokens_respuesta_total", "Tokens de respuesta de la API.", self._tokens),
+                ("transcriptor_reintentos_total", "Reintentos de llamadas a la API.", self._reintentos),
+                ("transcriptor_etapa_errores_total", "Tramos terminados con excepción.", self._errores),
+            ):
+                lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+                lineas += [f'{nombre}{{etapa="{etapa}"}} {valor}' for etapa, valor in sorted(datos.items())]
+            lineas += ["# HELP transcriptor_resultado_total Resultados por etapa (filtros por segmento, peticiones cubiertas).", "# TYPE transcriptor_resultado_total counter"]
+            lineas += [f'transcriptor_resultado_total{{etapa="{e}",resultado="{r}"}} {n}' for (e, r), n in sorted(self._resultados.items())]
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = RegistroMetricas()
+_jsonl = {"archivo": None, "lock": threading.Lock()}
+
+
+def _escribir_jsonl(tramo: dict):
+    with _jsonl["lock"]:
+        if _jsonl["archivo"] is None:
+            _jsonl["archivo"] = open(METRICAS_JSONL, "a", encoding="utf-8")
+        # Una línea por write(): con O_APPEND no se mezclan líneas de varios procesos
+        _jsonl["archivo"].write(json.dumps(tramo, ensure_ascii=False) + "\n")
+        _jsonl["archivo"].flush()
+
+
+def registrar(etapa: str, duracion_s: float = 0.0, **atributos):
+    """Registra un tramo ya medido (o un evento instantáneo, p. ej. un eco descartado)."""
+    tramo = {"etapa": etapa, "duracion_s": duracion_s, **atributos}
+    REGISTRO.observar(tramo)
+    traza = _traza_actual.get()
+    if traza is not None: traza.agregar(tramo)
+    if METRICAS_JSONL:
+        _escribir_jsonl({"ts": time.time(), "trabajo": traza.trabajo_id if traza else None, **tramo})
+
+
+@contextmanager
+def tramo(etapa: str, **atributos):
+    """Mide el bloque; los atributos se pueden completar dentro (t['bytes'] = ...)."""
+    datos = dict(atributos)
+    t0 = time.perf_counter()
+    try:
+        yield datos
+    except BaseException as e:
+        datos["error"] = type(e).__name__
+        raise
+    finally:
+        registrar(etapa, time.perf_counter() - t0, **datos)
+
+
+def traza_actual():
+    return _traza_actual.get()
+
+
+@contextmanager
+def trazar(traza: Traza):
+    token = _traza_actual.set(traza)
+    try:
+        yield traza
+    finally:
+        _traza_actual.reset(token)
+
+
+def en_contexto(funcion):
+    """Envuelve `funcion` para ejecutarla en otro hilo con la traza actual (ThreadPoolExecutor)."""
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.run(funcion, *args, **kwargs)
+
+
+def servir_metricas(puerto: int, host: str = METRICAS_HOST) -> ThreadingHTTPServer:
+    """Endpoint GET /metrics (texto Prometheus) en un hilo de este proceso."""
+
+    class Manejador(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = REGISTRO.texto_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
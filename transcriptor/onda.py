@@ -0,0 +1,166 @@
+import io
+from xml.sax.saxutils import escape
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from transcriptor.audio import FRECUENCIA, MAX_AMPLITUD
+
+# ================= FORMA DE ONDA (ENVOLVENTE MIN/MAX) =================
+# En lugar de submuestrear (que pierde los picos) se calcula una envolvente min/max/RMS a
+# resolución fina en una sola pasada vectorizada. Cualquier ancho en píxeles se deriva de
+# ella sin volver a tocar las muestras, y se rasteriza directamente a PNG (o SVG).
+
+MIN_BINS = 8192               # Resolución mínima de la envolvente base (audios cortos)
+MS_POR_BIN = 10               # Resolución de la envolvente base en audios largos
+MUESTRAS_POR_LOTE = 1 << 20
+
+COLOR_ONDA = (30, 136, 229)   # '#1E88E5', mismo azul que la versión matplotlib
+COLOR_ES = (67, 160, 71)
+COLOR_LB = (251, 140, 0)
+COLOR_OTRO = (158, 158, 158)
+
+
+def _hex(color: tuple) -> str:
+    return "#%02X%02X%02X" % color
+
+
+def color_idioma(etiqueta: str) -> tuple:
+    if etiqueta == "ES": return COLOR_ES
+    if not etiqueta or etiqueta in ("??", "ERROR"): return COLOR_OTRO
+    return COLOR_LB
+
+
+class Envolvente:
+    """Envolvente min/max/energía por bins de `muestras_por_bin` (el último puede ser parcial)."""
+
+    def __init__(self, minimos: np.ndarray, maximos: np.ndarray, energia: np.ndarray, n_muestras: int, muestras_por_bin: int):
+        self.minimos, self.maximos, self.energia = minimos, maximos, energia
+        self.n_muestras = n_muestras
+        self.muestras_por_bin = muestras_por_bin
+
+    @classmethod
+    def desde_muestras(cls, muestras: np.ndarray) -> "Envolvente":
+        n = len(muestras)
+        tam = max(1, min(MS_POR_BIN * FRECUENCIA // 1000, n // MIN_BINS))
+        n_bins = -(-n // tam)
+        minimos = np.zeros(n_bins, dtype=np.int16)
+        maximos = np.zeros(n_bins, dtype=np.int16)
+        energia = np.zeros(n_bins, dtype=np.float64)
+        paso = max(1, MUESTRAS_POR_LOTE // tam) * tam
+        for ini in range(0, n, paso):
+            lote = muestras[ini:ini + paso]
+            b0 = ini // tam
+            completos = len(lote) // tam
+            if completos:
+                matriz = lote[:completos * tam].reshape(completos, tam)
+                minimos[b0:b0 + completos] = matriz.min(axis=1)
+                maximos[b0:b0 + completos] = matriz.max(axis=1)
+                m = matriz.astype(np.float64)
+                energia[b0:b0 + completos] = np.einsum('ij,ij->i', m, m)
+            resto = lote[completos * tam:]
+            if len(resto):
+                minimos[b0 + completos], maximos[b0 + completos] = resto.min(), resto.max()
+                r = resto.astype(np.float64)
+                energia[b0 + completos] = np.dot(r, r)
+        return cls(minimos, maximos, energia, n, tam)
+
+    @property
+    def duracion_ms(self) -> int:
+        return round(1000 * self.n_muestras / FRECUENCIA)
+
+    @property
+    def nbytes(self) -> int:
+        return self.minimos.nbytes + self.maximos.nbytes + self.energia.nbytes
+
+    def a_ancho(self, ancho: int) -> tuple:
+        """(min, max, rms) por píxel, normalizados a [-1, 1]."""
+        n_bins = len(self.minimos)
+        if not n_bins:
+            cero = np.zeros(ancho)
+            return cero, cero, cero
+        inicios = np.linspace(0, n_bins, ancho + 1)[:-1].astype(np.int64)
+        minimos = np.minimum.reduceat(self.minimos, inicios) / MAX_AMPLITUD
+        maximos = np.maximum.reduceat(self.maximos, inicios) / MAX_AMPLITUD
+        cuenta = np.full(n_bins, self.muestras_por_bin, dtype=np.float64)
+        cuenta[-1] = self.n_muestras - (n_bins - 1) * self.muestras_por_bin
+        rms = np.sqrt(np.add.reduceat(self.energia, inicios) / np.add.reduceat(cuenta, inicios)) / MAX_AMPLITUD
+        return minimos, maximos, rms
+
+
+# ================= RASTERIZADO =================
+
+def _columnas(env: Envolvente, ancho: int, inicio_ms: int, fin_ms: int) -> tuple:
+    dur = max(1, env.duracion_ms)
+    x0 = int(np.clip(inicio_ms * ancho // dur, 0, ancho - 1))
+    x1 = int(np.clip(-(-fin_ms * ancho // dur), x0 + 1, ancho))
+    return x0, x1
+
+
+def _rotulos(env: Envolvente, ancho: int, chunks: list, etiquetas: list, min_px: int = 18) -> list:
+    # Un rótulo por cada racha de intervenciones en el mismo idioma, si cabe
+    rotulos, anterior, ultimo_x = [], None, -min_px
+    for (inicio, fin), etiqueta in zip(chunks, etiquetas):
+        if etiqueta == anterior: continue
+        anterior = etiqueta
+        x0, _ = _columnas(env, ancho, inicio, fin)
+        if x0 - ultimo_x < min_px: continue
+        rotulos.append((x0, etiqueta))
+        ultimo_x = x0
+    return rotulos
+
+
+def renderizar_png(env: Envolvente, ancho: int = 1600, alto: int = 120, chunks: list = None, etiquetas: list = None) -> io.BytesIO:
+    """
+    PNG (fondo transparente) con la envolvente min/max y el RMS encima. Opcionalmente sombrea
+    las intervenciones `chunks` ([inicio_ms, fin_ms]) y las rotula con `etiquetas` (código de idioma).
+    """
+    chunks, etiquetas = chunks or [], etiquetas or []
+    minimos, maximos, rms = env.a_ancho(ancho)
+    img = np.zeros((alto, ancho, 4), dtype=np.uint8)
+
+    for i, (inicio, fin) in enumerate(chunks):
+        x0, x1 = _columnas(env, ancho, inicio, fin)
+        img[:, x0:x1] = (*color_idioma(etiquetas[i] if i < len(etiquetas) else None), 45)
+
+    mitad = (alto - 1) / 2
+    filas = np.arange(alto)[:, None]
+    arriba = np.floor(mitad - maximos * mitad)
+    abajo = np.ceil(mitad - minimos * mitad)
+    img[(filas >= arriba) & (filas <= abajo)] = (*COLOR_ONDA, 150)
+    img[np.abs(filas - mitad) <= rms * mitad] = (*COLOR_ONDA, 255)
+
+    imagen = Image.fromarray(img, "RGBA")
+    if etiquetas:
+        dibujo = ImageDraw.Draw(imagen)
+        for x, etiqueta in _rotulos(env, ancho, chunks, etiquetas):
+            dibujo.text((x + 2, 1), etiqueta, fill=(*color_idioma(etiqueta), 255))
+
+    buf = io.BytesIO()
+    imagen.save(buf, format="PNG", optimize=False)
+    buf.seek(0)
+    return buf
+
+
+def renderizar_svg(env: Envolvente, ancho: int = 1600, alto: int = 120, chunks: list = None, etiquetas: list = None) -> str:
+    """Mismo dibujo que renderizar_png en SVG (escalable, texto seleccionable)."""
+    chunks, etiquetas = chunks or [], etiquetas or []
+    minimos, maximos, rms = env.a_ancho(ancho)
+    mitad = alto / 2
+    xs = np.arange(ancho) + 0.5
+
+    def poligono(superior, inferior):
+        puntos = np.concatenate((np.column_stack((xs, superior)), np.column_stack((xs[::-1], inferior[::-1]))))
+        return " ".join(f"{x:.1f},{y:.1f}" for x, y in puntos)
+
+    partes = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{ancho}" height="{alto}" viewBox="0 0 {ancho} {alto}">']
+    for i, (inicio, fin) in enumerate(chunks):
+        x0, x1 = _columnas(env, ancho, inicio, fin)
+        color = _hex(color_idioma(etiquetas[i] if i < len(etiquetas) else None))
+        partes.append(f'<rect x="{x0}" y="0" width="{x1 - x0}" height="{alto}" fill="{color}" fill-opacity="0.18"/>')
+    partes.append(f'<polygon points="{poligono(mitad - maximos * mitad, mitad - minimos * mitad)}" fill="{_hex(COLOR_ONDA)}" fill-opacity="0.6"/>')
+    partes.append(f'<polygon points="{poligono(mitad - rms * mitad, mitad + rms * mitad)}" fill="{_hex(COLOR_ONDA)}"/>')
+    for x, etiqueta in _rotulos(env, ancho, chunks, etiquetas):
+        partes.append(f'<text x="{x + 2}" y="11" font-family="sans-serif" font-size="10" fill="{_hex(color_idioma(etiqueta))}">{escape(etiqueta)}</text>')
+    partes.append('</svg>')
+    return "\n".join(partes)
@@ -0,0 +1,622 @@
+import time
+import functools
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from transcriptor.acta import ActaIncremental, cabecera_acta, nombre_acta
+from transcriptor.audio import FRECUENCIA, MUESTRAS_POR_MS, a_segmento, duracion_ms, niveles_dbfs
+from transcriptor.cache import clave_idioma, clave_segmento
+from transcriptor.config import AGRUPAR_MAX, AGRUPAR_MS, IDIOMA_COLLAGE_CORTO_MS, MAX_SEGMENTO_MS, MODEL_NAME
+from transcriptor.empaquetado import agrupar, puntos_de_corte, se_parte
+from transcriptor.filtros import es_eco
+from transcriptor.metricas import Traza, en_contexto, registrar, traza_actual, tramo, trazar
+from transcriptor.ia import (DURACION_COLLAGE_MS, MAPA_ISO_IDIOMAS, PROMPT_IDIOMA_VERSION, PROMPT_VERSION, crear_collage_audio,
+                             detectar_lengua_b, preparar_collage, preparar_lote, preparar_segmento, transcribir_lote_forense,
+                             transcribir_segmento_forense)
+from transcriptor.streaming import intervenciones_en_streaming, leer_bloques
+from transcriptor.vad import PASO_VAD_MS, detectar_intervenciones, intervenciones_con_respaldo
+
+# ================= TRANSCRIPCIÓN CONCURRENTE CON CONTEXTO =================
+
+MAX_CONTEXTO = 800 # Limite para no saturar
+
+
+def _avanzar_contexto(historial_contexto: str, idioma_actual: str, dat: dict, iso_lb: str) -> tuple:
+    texto_segmento = dat.get('texto', '')
+    idioma_detectado = dat.get('idioma', '??')
+
+    # Actualizar contexto (si hay texto válido)
+    if texto_segmento:
+        historial_contexto += f" {texto_segmento}"
+        if len(historial_contexto) > MAX_CONTEXTO:
+            historial_contexto = historial_contexto[-MAX_CONTEXTO:]
+
+    # Actualizar inercia de idioma
+    if idioma_detectado in ["ES", iso_lb]:
+        idioma_actual = idioma_detectado
+
+    return historial_contexto, idioma_actual
+
+
+def transcribir_en_orden(n_segmentos, transcribir, iso_lb: str, concurrencia: int = 4, al_completar=None, previos=None) -> list:
+    """
+    Ejecuta `transcribir(i, contexto_previo, idioma_previo) -> dict` para los segmentos
+    0..n-1 con hasta `concurrencia` peticiones en vuelo, entregando los resultados EN ORDEN.
+
+    Contexto (Lógica V2.1.0 en ventana deslizante):
+    - El segmento j se envía con el contexto de los segmentos 0..j-concurrencia (exacto con
+      concurrencia=1; lookahead acotado en otro caso). Depende solo de los resultados, no de
+      los tiempos de respuesta, así que es estable entre ejecuciones (apto para cachear).
+    - Sin segunda pasada: que el modelo devuelva la inercia enviada no distingue el sesgo de un
+      acierto (con lenguas que se alternan, la inercia del lookahead suele ser la del propio
+      segmento) y repetirlos duplicaba las peticiones. El filtro Anti-Eco se aplica siempre
+      aquí, contra el contexto real (la función no debe aplicarlo).
+
+    `n_segmentos` puede ser un entero o una función `existe(j) -> bool` (segmentos que llegan en
+    streaming y cuyo total aún no se conoce).
+
+    `transcribir` puede devolver una lista de resultados (lote de intervenciones enviadas en una
+    sola petición): el Anti-Eco y el contexto avanzan sub-segmento a sub-segmento.
+
+    `previos`: resultados ya cerrados de los primeros segmentos (reanudación). Solo se usan
+    para reconstruir el contexto; se continúa desde el primer segmento que falta.
+
+    `iso_lb` puede ser una función (lengua B aún identificándose): solo se consulta al cerrar.
+
+    `al_completar(i, resultado)` se invoca en el hilo llamante y en orden (apto para la UI).
+    """
+    obtener_iso = iso_lb if callable(iso_lb) else (lambda: iso_lb)
+    resultados = list(previos or [])
+    concurrencia = max(1, concurrencia)
+    # estados[m] = (contexto, inercia) tras cerrar los segmentos 0..m-1
+    estados = [("", "ES")]
+    for dat in resultados:
+        estado = estados[-1]
+        for sub in (dat if isinstance(dat, list) else [dat]):
+            estado = _avanzar_contexto(*estado, sub, obtener_iso())
+        estados.append(estado)
+    enviados = {}
+    siguiente = i = len(resultados)
+    existe = n_segmentos if callable(n_segmentos) else (lambda j: j < n_segmentos)
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        while existe(i):
+            while siguiente < i + concurrencia and existe(siguiente):
+                contexto_envio, idioma_envio = estados[max(0, siguiente - concurrencia + 1)]
+                enviados[siguiente] = pool.submit(en_contexto(transcribir), siguiente, contexto_envio, idioma_envio)
+                siguiente += 1
+
+            historial_contexto, idioma_actual = estados[-1]
+            dat = enviados.pop(i).result()
+
+            subs = []
+            for sub in (dat if isinstance(dat, list) else [dat]):
+                if es_eco(sub.get('texto', ''), historial_contexto):
+                    sub = {"idioma": "??", "texto": ""} # Es un eco, lo borramos
+                    registrar("filtros", resultado="eco")
+                historial_contexto, idioma_actual = _avanzar_contexto(historial_contexto, idioma_actual, sub, obtener_iso())
+                subs.append(sub)
+            dat = subs if isinstance(dat, list) else subs[0]
+
+            estados.append((historial_contexto, idioma_actual))
+            resultados.append(dat)
+            if al_completar: al_completar(i, dat)
+            i += 1
+
+    return resultados
+
+
+# ================= PROCESADO COMPLETO DE UN EXAMEN =================
+
+class AudioVacioError(Exception):
+    """No se ha encontrado ninguna intervención ni con alta sensibilidad."""
+
+
+def detectar_chunks(muestras, umbral_db: int, min_silence_ms: int, avisar=None) -> list:
+    max_peak, _ = niveles_dbfs(muestras)
+    detectar = lambda ms, thresh: detectar_intervenciones(muestras, min_silence_len=ms, silence_thresh=thresh, seek_step=PASO_VAD_MS)
+    chunks = intervenciones_con_respaldo(detectar, max_peak, umbral_db, min_silence_ms, avisar)
+    if not chunks: raise AudioVacioError("❌ Audio vacío o irreconocible.")
+    return chunks
+
+class _TranscriptorSegmentos:
+    """
+    transcribir_segmento_forense con caché de resultados y límite de API (común a ambos modos).
+    `lengua`: (nombre, iso) de la lengua B o el Future de su identificación en curso.
+    """
+
+    def __init__(self, client, hash_audio: str, lengua, cache=None, limite_api=None):
+        self.client, self.hash_audio, self._lengua = client, hash_audio, lengua
+        self.cache = cache
+        self.limite_api = limite_api if limite_api is not None else nullcontext()
+        self.uso_cache = {"aciertos": 0, "fallos": 0}
+        self.peticiones = 0
+        self._lock = threading.Lock()
+
+    @property
+    def lengua(self) -> tuple:
+        """(nombre, iso); espera a la identificación si aún no ha terminado."""
+        return self._lengua.result() if isinstance(self._lengua, Future) else self._lengua
+
+    @property
+    def identificando(self) -> bool:
+        return isinstance(self._lengua, Future) and not self._lengua.done()
+
+    def _contar(self, acierto: bool, n: int = 1):
+        with self._lock: self.uso_cache["aciertos" if acierto else "fallos"] += n
+
+    def __call__(self, ini: int, fin: int, obtener_audio, contexto_previo: str, idioma_previo: str) -> dict:
+        dat, acierto = self._pedir(ini, fin, obtener_audio, contexto_previo, idioma_previo)
+        if acierto is not None: self._contar(acierto)
+        return dat
+
+    def _pedir(self, ini: int, fin: int, obtener_audio, contexto_previo: str, idioma_previo: str) -> tuple:
+        """-> (resultado, acierto de caché o None sin caché), sin contarlo en uso_cache."""
+        # Mientras se identifica la lengua B se adelanta la normalización y codificación (no dependen de ella)
+        url_audio = preparar_segmento(obtener_audio()) if self.identificando else None
+        nombre_lb, iso_lb = self.lengua
+        clave = None
+        if self.cache is not None:
+            # La clave usa solo el contexto que realmente ve el prompt
+            clave = clave_segmento(self.hash_audio, ini, fin, MODEL_NAME, PROMPT_VERSION, iso_lb, contexto_previo[-300:], idioma_previo)
+            dat = self.cache.obtener(clave)
+            if dat is not None: return dat, True
+
+        # Normalización y codificación (CPU) fuera del semáforo: el hueco de API solo lo ocupa la petición
+        url_audio = url_audio or preparar_segmento(obtener_audio())
+        # Llamada a la función forense V2.1.0 (el Anti-Eco lo aplica el pipeline en orden)
+        with self.limite_api:
+            dat = transcribir_segmento_forense(self.client, None, nombre_lb, iso_lb, contexto_previo, idioma_previo,
+                                               filtrar_eco=False, url_audio=url_audio)
+        with self._lock: self.peticiones += 1
+        if clave and dat.get('idioma') != "ERROR": self.cache.guardar(clave, dat)
+        return dat, (False if clave else None)
+
+    def lote(self, rangos: list, obtener_audios, contexto_previo: str, idioma_previo: str) -> list:
+        """Varias intervenciones (rangos con margen) en una petición; si la respuesta no encaja, una a una."""
+        audios = obtener_audios() if self.identificando else None
+        preparado = preparar_lote(audios) if audios else None
+        nombre_lb, iso_lb = self.lengua
+        clave = None
+        if self.cache is not None:
+            clave = clave_segmento(self.hash_audio, rangos[0][0], rangos[-1][1], MODEL_NAME, PROMPT_VERSION, iso_lb,
+                                   contexto_previo[-300:], idioma_previo, subrangos=rangos)
+            dats = self.cache.obtener(clave)
+            if dats is not None:
+                self._contar(True, len(rangos))
+                return dats
+
+        audios = audios or obtener_audios()
+        preparado = preparado or preparar_lote(audios) # Fuera del semáforo, como en __call__
+        with self.limite_api:
+            dats = transcribir_lote_forense(self.client, audios, nombre_lb, iso_lb, contexto_previo, idioma_previo, preparado=preparado)
+        with self._lock: self.peticiones += 1
+        if dats is None:
+            # Respaldo: por separado, encadenando el contexto como lo haría el pipeline
+            dats, contexto, idioma = [], contexto_previo, idioma_previo
+            for (ini, fin), audio in zip(rangos, audios):
+                dat = self(ini, fin, lambda: audio, contexto, idioma)
+                contexto, idioma = _avanzar_contexto(contexto, idioma, dat, iso_lb)
+                dats.append(dat)
+            return dats
+
+        if self.cache is not None: self._contar(False, len(rangos))
+        if clave and all(dat.get('idioma') != "ERROR" for dat in dats): self.cache.guardar(clave, dats)
+        return dats
+
+    def partida(self, limites: list, obtener_audio, contexto_previo: str, idioma_previo: str) -> dict:
+        """
+        Intervención larga partida en piezas (`limites` = [ini, corte, ..., fin], con el margen
+        solo en los extremos): una petición por pieza, todas a la vez, y un único resultado con
+        los textos unidos, para la misma línea del acta. Todas las piezas van con el contexto de
+        la intervención (no el de la pieza anterior): a cambio, un monólogo largo tarda lo que
+        su pieza más lenta y no la suma de todas.
+        """
+        piezas = list(zip(limites, limites[1:]))
+        if len(piezas) == 1:
+            return self(*piezas[0], lambda: obtener_audio(*piezas[0]), contexto_previo, idioma_previo)
+        with ThreadPoolExecutor(max_workers=len(piezas)) as pool:
+            futuros = [pool.submit(en_contexto(self._pedir), ini, fin, lambda ini=ini, fin=fin: obtener_audio(ini, fin), contexto_previo, idioma_previo)
+                       for ini, fin in piezas]
+        dats, aciertos = zip(*(f.result() for f in futuros))
+        # Una intervención cuenta una vez en uso_cache: acierto solo si todas sus piezas lo son
+        if self.cache is not None: self._contar(all(aciertos))
+        return _unir_piezas(list(dats))
+
+
+def _unir_piezas(dats: list) -> dict:
+    """
+    Un resultado por intervención: textos en orden y el idioma de la mayoría de piezas con texto.
+    Una pieza fallida deja su marca [Error: ...] en su sitio sin perder el texto de las demás,
+    pero la intervención cuenta como ERROR para que se reintente al reanudar (las piezas
+    buenas salen entonces de la caché).
+    """
+    if len(dats) == 1: return dats[0]
+    if any(dat.get('idioma') == "ERROR" for dat in dats):
+        partes = [dat.get('texto') or "[Error]" if dat.get('idioma') == "ERROR" else dat.get('texto', '') for dat in dats]
+        return {"idioma": "ERROR", "texto": " ".join(p for p in partes if p)}
+    con_texto = [dat for dat in dats if dat.get('texto')]
+    texto = " ".join(dat['texto'] for dat in con_texto)
+    if not con_texto: return {"idioma": "??", "texto": ""}
+    idiomas = [dat.get('idioma', '??') for dat in con_texto]
+    return {"idioma": max(idiomas, key=idiomas.count), "texto": texto}
+
+
+def _avisar_errores(errores: list, informar):
+    if errores:
+        informar(f"⚠️ {len(errores)} intervenciones sin transcribir (error de la API). Relanza el examen para reintentarlas.")
+
+
+def _previos_por_grupo(previos: list, grupos, existe) -> tuple:
+    """Resultados del diario (uno por intervención) agrupados como se enviaron; solo grupos completos."""
+    unidades, n, u = [], 0, 0
+    while existe(u):
+        grupo = grupos[u]
+        if n + len(grupo) > len(previos): break
+        subs = previos[n:n + len(grupo)]
+        unidades.append(subs if len(grupo) > 1 else subs[0])
+        n += len(grupo)
+        u += 1
+    return unidades, n
+
+
+# Collage corto primero (modo progresivo) y el completo solo si el código no es una lengua conocida
+ESCALONES_COLLAGE = ((IDIOMA_COLLAGE_CORTO_MS,) if 0 < IDIOMA_COLLAGE_CORTO_MS < DURACION_COLLAGE_MS else ()) + (DURACION_COLLAGE_MS,)
+
+
+def _identificar_lengua(client, hash_audio: str, crear_collage, cache, limite_api, trabajo, informar, tiempos: dict):
+    """
+    Lengua B del examen: de la caché (por hash del audio, sirve con cualquier ajuste) o
+    identificada en un hilo aparte mientras arrancan las primeras transcripciones, que solo la
+    esperan justo antes de llamar a la API. `crear_collage(max_ms)` -> AudioSegment.
+    Devuelve (nombre, iso) o un Future con ese resultado.
+    """
+    clave = clave_idioma(hash_audio, MODEL_NAME, PROMPT_IDIOMA_VERSION) if cache is not None else None
+    guardada = cache.obtener(clave) if clave else None
+    if guardada:
+        informar(f"♻️ Lengua B en caché: {guardada['lengua_b']}.")
+        if trabajo: trabajo.actualizar(**guardada)
+        tiempos['idioma'] = 0.0
+        return guardada['lengua_b'], guardada['iso_lb']
+
+    informar("🌍 Identificando idioma...")
+    def preparar(max_ms):
+        with tramo("collage", max_ms=max_ms):
+            collage = crear_collage(max_ms)
+        return collage, preparar_collage(collage)
+
+    # El primer collage se prepara aquí, antes de arrancar las transcripciones: en otro hilo
+    # competiría por la CPU con su preparación adelantada y retrasaría la petición de idioma
+    t0 = time.perf_counter()
+    primero = preparar(ESCALONES_COLLAGE[0])
+
+    def identificar():
+        for n, max_ms in enumerate(ESCALONES_COLLAGE):
+            collage, url_audio = preparar(max_ms) if n else primero
+            with limite_api:
+                nombre_lb, iso_lb = detectar_lengua_b(client, collage, url_audio=url_audio)
+            if iso_lb in MAPA_ISO_IDIOMAS: break
+        # Antes de resolver el Future: ningún segmento se anota sin la lengua B en el trabajo
+        if trabajo: trabajo.actualizar(lengua_b=nombre_lb, iso_lb=iso_lb)
+        if clave and iso_lb in MAPA_ISO_IDIOMAS: cache.guardar(clave, {"lengua_b": nombre_lb, "iso_lb": iso_lb})
+        tiempos['idioma'] = time.perf_counter() - t0
+        return nombre_lb, iso_lb
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    futuro = pool.submit(en_contexto(identificar))
+    pool.shutdown(wait=False)
+    return futuro
+
+
+def _con_traza(procesar):
+    """
+    Ejecuta el procesado bajo una Traza (la del llamante si ya hay una activa, p. ej. con la
+    decodificación dentro) y añade al resultado y al trabajo el desglose de tiempos por etapa.
+    Con `trabajo`, lo ejecuta en exclusiva (TrabajoOcupadoError si otro ejecutor lo tiene).
+    """
+    @functools.wraps(procesar)
+    def envuelto(*args, trabajo=None, **kwargs):
+        traza = traza_actual() or Traza()
+        if trabajo and not traza.trabajo_id: traza.trabajo_id = trabajo.id
+        with trazar(traza), (trabajo.en_exclusiva() if trabajo else nullcontext()):
+            resultado = procesar(*args, trabajo=trabajo, **kwargs)
+        resultado["desglose"] = traza.desglose()
+        if trabajo: trabajo.actualizar(desglose=resultado["desglose"])
+        return resultado
+    return envuelto
+
+
+@_con_traza
+def procesar_examen(client, nombre: str, hash_audio: str, muestras, umbral_db: int, min_silence_ms: int,
+                    concurrencia: int = 4, cache=None, limite_api=None, trabajo=None, informar=None, progreso=None,
+                    agrupar_ms: int = AGRUPAR_MS, max_segmento_ms: int = MAX_SEGMENTO_MS) -> dict:
+    """
+    Pipeline completo de un examen sobre el buffer PCM compartido: intervenciones, lengua B,
+    transcripción concurrente con contexto y acta TXT.
+
+    - `cache`: CacheTranscripciones opcional (solo se envían a la API los segmentos nuevos).
+    - `limite_api`: semáforo opcional compartido para acotar las peticiones simultáneas
+      entre varios exámenes/procesos.
+    - `trabajo`: Trabajo opcional. Intervenciones, lengua B y cada segmento cerrado quedan en
+      disco; si ya tenía resultados, se continúa desde el primer segmento que falta.
+    - `informar(mensaje)` y `progreso(fraccion)`: retroalimentación (st.write / st.progress, print...).
+    - `agrupar_ms` / `max_segmento_ms`: empaquetado (0 desactiva). Las intervenciones cortas
+      consecutivas van juntas en una petición y las más largas que `max_segmento_ms` se envían
+      en piezas (cortadas por su punto de menor energía) que vuelven a formar una sola línea.
+    """
+    informar = informar or (lambda mensaje: None)
+    limite_api = limite_api if limite_api is not None else nullcontext()
+    meta = trabajo.meta if trabajo else {}
+    tiempos = {}
+
+    t0 = time.perf_counter()
+    if "chunks" in meta:
+        chunks = meta["chunks"]
+    else:
+        informar("✂️ Detectando intervenciones del alumno...")
+        with tramo("vad", bytes=muestras.nbytes):
+            chunks = detectar_chunks(muestras, umbral_db, min_silence_ms, avisar=informar)
+        if trabajo: trabajo.actualizar(nombre=nombre, hash_audio=hash_audio, chunks=chunks, estado="en_curso")
+    grupos = list(agrupar(chunks, agrupar_ms, AGRUPAR_MAX, max_segmento_ms))
+    tiempos['vad'] = time.perf_counter() - t0
+    informar(f"✅ {len(chunks)} intervenciones localizadas ({len(grupos)} peticiones).")
+
+    if "iso_lb" in meta:
+        lengua, tiempos['idioma'] = (meta["lengua_b"], meta["iso_lb"]), 0.0
+    else:
+        lengua = _identificar_lengua(client, hash_audio, lambda max_ms: crear_collage_audio(muestras, chunks, max_ms),
+                                     cache, limite_api, trabajo, informar, tiempos)
+
+    t0 = time.perf_counter()
+    anotados, previos, n_previos = [], [], 0
+    if trabajo:
+        anotados = trabajo.resultados()
+        previos, n_previos = _previos_por_grupo(anotados, grupos, lambda u: u < len(grupos))
+        trabajo.truncar(n_previos)
+        if previos: informar(f"⏯️ Reanudando: {n_previos} de {len(chunks)} intervenciones ya transcritas.")
+    informar("📝 Transcribiendo con contexto inteligente...")
+    acta = ActaIncremental() # Cabecera al final: puede que la lengua B aún se esté identificando
+    for (start, _), dat in zip(chunks, anotados[:n_previos]): acta.agregar(start, dat)
+    if progreso: progreso(n_previos / len(chunks))
+
+    transcriptor = _TranscriptorSegmentos(client, hash_audio, lengua, cache, limite_api)
+    dur_total = duracion_ms(muestras)
+
+    def con_margen(i):
+        start, end = chunks[i]
+        return max(0, start-200), min(dur_total, end+200)
+
+    def transcribir_grupo(g, contexto_previo, idioma_previo):
+        if len(grupos[g]) == 1:
+            start, end = chunks[grupos[g][0]]
+            ini, fin = con_margen(grupos[g][0])
+            if se_parte(end - start, max_segmento_ms):
+                cortes = puntos_de_corte(muestras[start * MUESTRAS_POR_MS:end * MUESTRAS_POR_MS], max_segmento_ms)
+                limites = [ini] + [start + c for c in cortes] + [fin]
+                return transcriptor.partida(limites, lambda a, b: a_segmento(muestras, a, b), contexto_previo, idioma_previo)
+            return transcriptor(ini, fin, lambda: a_segmento(muestras, ini, fin), contexto_previo, idioma_previo)
+        rangos = [con_margen(i) for i in grupos[g]]
+        return transcriptor.lote(rangos, lambda: [a_segmento(muestras, ini, fin) for ini, fin in rangos], contexto_previo, idioma_previo)
+
+    errores = []
+    def cerrar_grupo(g, dat):
+        for i, sub in zip(grupos[g], dat if isinstance(dat, list) else [dat]):
+            if trabajo: trabajo.anotar(i, sub, chunks[i][0])
+            if sub.get('idioma') == "ERROR": errores.append(i)
+            acta.agregar(chunks[i][0], sub)
+        if progreso: progreso((grupos[g][-1]+1)/len(chunks))
+
+    transcribir_en_orden(len(grupos), transcribir_grupo, lambda: transcriptor.lengua[1], concurrencia, al_completar=cerrar_grupo, previos=previos)
+    tiempos['transcripcion'] = time.perf_counter() - t0
+    nombre_lb, iso_lb = transcriptor.lengua
+    acta.cabecera = cabecera_acta(nombre, nombre_lb, iso_lb)
+    if trabajo: trabajo.actualizar(estado="con_errores" if errores else "completado")
+    _avisar_errores(errores, informar)
+    if cache is not None:
+        informar(f"♻️ Caché: {transcriptor.uso_cache['aciertos']} segmentos reutilizados, {transcriptor.uso_cache['fallos']} enviados a la API.")
+
+    return {
+        "texto": acta.texto,
+        "nombre_acta": nombre_acta(nombre, iso_lb),
+        "lengua_b": nombre_lb,
+        "iso_lb": iso_lb,
+        "chunks": chunks,
+        "cache": transcriptor.uso_cache,
+        "peticiones": transcriptor.peticiones,
+        "errores": len(errores),
+        "tiempos": tiempos,
+        "trabajo_id": trabajo.id if trabajo else None,
+    }
+
+
+# ================= MODO STREAMING (GRABACIONES LARGAS) =================
+# Mismo pipeline sin materializar el audio: los segmentos salen de la tubería de ffmpeg según
+# se cierran y se envían a la API a medida que llegan. Solo viven en memoria los segmentos en
+# vuelo (y los pocos que se guardan para el collage de idioma).
+
+MARGEN_MS = 200
+COLLAGE_SEGMENTOS = 12          # Intervenciones iniciales usadas para identificar la lengua B
+COLLAGE_MAX_MS = 120000
+
+
+class _ListaPerezosa:
+    """Lista que solo consume del generador lo necesario para responder a existe(j)."""
+
+    def __init__(self, generador):
+        self._gen = generador
+        self.elementos = []
+        self._agotado = False
+
+    def existe(self, j: int) -> bool:
+        while not self._agotado and len(self.elementos) <= j:
+            try:
+                elemento = next(self._gen)
+            except StopIteration:
+                self._agotado = True
+                break
+            self._agregar(elemento)
+        return j < len(self.elementos)
+
+    def _agregar(self, elemento):
+        self.elementos.append(elemento)
+
+    def __getitem__(self, j: int):
+        return self.elementos[j]
+
+
+class _SegmentosPerezosos(_ListaPerezosa):
+    """Intervenciones (inicio, fin) del streaming; el audio se guarda aparte hasta descartarlo."""
+
+    def __init__(self, generador):
+        super().__init__(generador)
+        self._audio = {}
+
+    @property
+    def rangos(self) -> list:
+        return self.elementos
+
+    def _agregar(self, elemento):
+        ini, fin, muestras = elemento
+        self._audio[len(self.elementos)] = muestras
+        self.elementos.append((ini, fin))
+
+    def audio(self, j: int) -> np.ndarray:
+        return self._audio[j]
+
+    def descartar(self, j: int):
+        self._audio.pop(j, None)
+
+    def iterar_rangos(self):
+        j = 0
+        while self.existe(j):
+            yield self.elementos[j]
+            j += 1
+
+
+def _segmentos_streaming(ruta: str, max_peak: float, umbral_db: int, min_silence_ms: int, segundos_bloque: float, avisar=None):
+    # Misma lógica que detectar_chunks: si no hay nada, segunda lectura con alta sensibilidad
+    hay = False
+    for seg in intervenciones_en_streaming(leer_bloques(ruta, segundos_bloque), min_silence_ms, max_peak + umbral_db, 100, MARGEN_MS):
+        hay = True
+        yield seg
+    if hay: return
+    if avisar: avisar("⚠️ Voz muy baja. Reintentando con alta sensibilidad...")
+    yield from intervenciones_en_streaming(leer_bloques(ruta, segundos_bloque), 1000, max_peak - 50, 100, MARGEN_MS)
+
+
+def _sin_margen(seg: _SegmentosPerezosos, j: int) -> np.ndarray:
+    ini, fin = seg.rangos[j]
+    desde = (ini - max(0, ini - MARGEN_MS)) * MUESTRAS_POR_MS
+    return seg.audio(j)[desde:desde + (fin - ini) * MUESTRAS_POR_MS]
+
+
+@_con_traza
+def procesar_examen_streaming(client, nombre: str, ruta: str, hash_audio: str, max_peak: float, total_muestras: int,
+                              umbral_db: int, min_silence_ms: int, concurrencia: int = 4, cache=None, limite_api=None,
+                              trabajo=None, informar=None, progreso=None, segundos_bloque: float = 30.0,
+                              agrupar_ms: int = AGRUPAR_MS, max_segmento_ms: int = MAX_SEGMENTO_MS) -> dict:
+    """
+    Variante de procesar_examen para archivos de varias horas: `max_peak` y `total_muestras`
+    vienen de una primera pasada (niveles_en_streaming) y esta segunda pasada detecta, identifica
+    la lengua B y transcribe sin tener nunca el audio entero en memoria.
+
+    Diferencia con el modo normal: el collage de idioma se toma de las primeras intervenciones
+    (no repartido por todo el examen), porque el resto aún no se ha leído.
+    """
+    informar = informar or (lambda mensaje: None)
+    limite_api = limite_api if limite_api is not None else nullcontext()
+    meta = trabajo.meta if trabajo else {}
+    # La detección va intercalada con la transcripción: su tiempo cuenta en 'transcripcion'
+    tiempos = {'vad': 0.0}
+    dur_total = round(1000 * total_muestras / FRECUENCIA)
+
+    informar("✂️ Detectando intervenciones en streaming...")
+    segmentos = _segmentos_streaming(ruta, max_peak, umbral_db, min_silence_ms, segundos_bloque, avisar=informar)
+    seg = _SegmentosPerezosos(segmentos)
+    grupos = _ListaPerezosa(agrupar(seg.iterar_rangos(), agrupar_ms, AGRUPAR_MAX, max_segmento_ms))
+    if trabajo and not meta: trabajo.actualizar(nombre=nombre, hash_audio=hash_audio, estado="en_curso")
+
+    if "iso_lb" in meta:
+        lengua, tiempos['idioma'] = (meta["lengua_b"], meta["iso_lb"]), 0.0
+    else:
+        j = 0
+        while j < COLLAGE_SEGMENTOS and seg.existe(j) and seg.rangos[j][0] < COLLAGE_MAX_MS:
+            j += 1
+        if not seg.existe(0): raise AudioVacioError("❌ Audio vacío o irreconocible.")
+        clips = [_sin_margen(seg, k) for k in range(j)]
+        rangos, pos = [], 0
+        for clip in clips:
+            rangos.append((pos // MUESTRAS_POR_MS, (pos + len(clip)) // MUESTRAS_POR_MS))
+            pos += len(clip)
+        lengua = _identificar_lengua(client, hash_audio, lambda max_ms: crear_collage_audio(np.concatenate(clips), rangos, max_ms),
+                                     cache, limite_api, trabajo, informar, tiempos)
+
+    t0 = time.perf_counter()
+    anotados, previos, n_previos = [], [], 0
+    if trabajo:
+        anotados = trabajo.resultados()
+        previos, n_previos = _previos_por_grupo(anotados, grupos, grupos.existe)
+        trabajo.truncar(n_previos)
+        if previos: informar(f"⏯️ Reanudando: {n_previos} intervenciones ya transcritas.")
+    informar("📝 Transcribiendo con contexto inteligente...")
+    acta = ActaIncremental() # Cabecera al final: puede que la lengua B aún se esté identificando
+    for j, dat in enumerate(anotados[:n_previos]):
+        acta.agregar(seg.rangos[j][0], dat)
+        seg.descartar(j)
+    if not seg.existe(0): raise AudioVacioError("❌ Audio vacío o irreconocible.")
+
+    transcriptor = _TranscriptorSegmentos(client, hash_audio, lengua, cache, limite_api)
+
+    def con_margen(i):
+        start, end = seg.rangos[i]
+        return max(0, start-MARGEN_MS), min(dur_total, end+MARGEN_MS)
+
+    def transcribir_grupo(g, contexto_previo, idioma_previo):
+        if len(grupos[g]) == 1:
+            i = grupos[g][0]
+            start, end = seg.rangos[i]
+            ini, fin = con_margen(i)
+            if se_parte(end - start, max_segmento_ms):
+                # seg.audio(i) empieza en el margen inicial (ini)
+                limites = [ini] + [start + c for c in puntos_de_corte(_sin_margen(seg, i), max_segmento_ms)] + [fin]
+                return transcriptor.partida(limites, lambda a, b: a_segmento(seg.audio(i), a - ini, b - ini), contexto_previo, idioma_previo)
+            return transcriptor(ini, fin, lambda: a_segmento(seg.audio(i)), contexto_previo, idioma_previo)
+        rangos = [con_margen(i) for i in grupos[g]]
+        return transcriptor.lote(rangos, lambda: [a_segmento(seg.audio(i)) for i in grupos[g]], contexto_previo, idioma_previo)
+
+    errores = []
+    def cerrar_grupo(g, dat):
+        for i, sub in zip(grupos[g], dat if isinstance(dat, list) else [dat]):
+            start, end = seg.rangos[i]
+            seg.descartar(i)
+            if trabajo: trabajo.anotar(i, sub, start)
+            if sub.get('idioma') == "ERROR": errores.append(i)
+            acta.agregar(start, sub)
+        if progreso and dur_total: progreso(min(1.0, end / dur_total))
+
+    transcribir_en_orden(grupos.existe, transcribir_grupo, lambda: transcriptor.lengua[1], concurrencia, al_completar=cerrar_grupo, previos=previos)
+    tiempos['transcripcion'] = time.perf_counter() - t0
+    nombre_lb, iso_lb = transcriptor.lengua
+    acta.cabecera = cabecera_acta(nombre, nombre_lb, iso_lb)
+    chunks = [list(r) for r in seg.rangos]
+    informar(f"✅ {len(chunks)} intervenciones transcritas ({transcriptor.peticiones} peticiones).")
+    if trabajo: trabajo.actualizar(chunks=chunks, estado="con_errores" if errores else "completado")
+    _avisar_errores(errores, informar)
+    if cache is not None:
+        informar(f"♻️ Caché: {transcriptor.uso_cache['aciertos']} segmentos reutilizados, {transcriptor.uso_cache['fallos']} enviados a la API.")
+
+    return {
+        "texto": acta.texto,
+        "nombre_acta": nombre_acta(nombre, iso_lb),
+        "lengua_b": nombre_lb,
+        "iso_lb": iso_lb,
+        "chunks": chunks,
+        "cache": transcriptor.uso_cache,
+        "peticiones": transcriptor.peticiones,
+        "errores": len(errores),
+        "tiempos": tiempos,
+        "trabajo_id": trabajo.id if trabajo else None,
+    }
@@ -0,0 +1,216 @@
+import re
+import hashlib
+import subprocess
+from math import gcd
+from collections import deque
+
+import numpy as np
+
+from transcriptor.audio import ANCHO_MUESTRA, FRECUENCIA, MAX_AMPLITUD, MUESTRAS_POR_MS
+from transcriptor.vad import rms_audioop
+
+# ================= DECODIFICACIÓN EN STREAMING =================
+# Para grabaciones de varias horas: ffmpeg decodifica a una tubería en bloques fijos de PCM
+# 16 kHz mono y nada se materializa entero. La memoria pico queda acotada por el tamaño de
+# bloque y la intervención más larga, no por la duración del archivo.
+
+
+def hash_archivo(ruta: str, tam: int = 1 << 20) -> str:
+    # Mismo valor que hash_contenido(datos) sin leer el archivo entero en memoria
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for trozo in iter(lambda: f.read(tam), b""):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+_DURACION = re.compile(r"Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)")
+
+
+def bytes_pcm_estimados(ruta: str):
+    """
+    Memoria que ocuparía el audio decodificado (PCM 16 kHz mono int16, 32 KB/s) según la duración
+    que declara el contenedor. ffmpeg solo lee las cabeceras, sin decodificar nada (no siempre hay
+    ffprobe instalado junto a él). None si el archivo no declara su duración.
+    """
+    from pydub import AudioSegment
+    salida = subprocess.run([AudioSegment.converter, "-nostdin", "-hide_banner", "-i", ruta], capture_output=True, text=True)
+    m = _DURACION.search(salida.stderr)
+    if not m: return None
+    segundos = int(m[1]) * 3600 + int(m[2]) * 60 + float(m[3])
+    return int(segundos * FRECUENCIA) * ANCHO_MUESTRA
+
+
+def leer_bloques(ruta: str, segundos_bloque: float = 30.0):
+    """Genera bloques int16 (mono, 16 kHz) de `segundos_bloque` leídos de una tubería de ffmpeg."""
+    from pydub import AudioSegment # Solo para localizar ffmpeg igual que el resto de la app
+    cmd = [
+        AudioSegment.converter, "-nostdin", "-v", "error", "-i", ruta,
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(FRECUENCIA), "-"
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    tam = int(segundos_bloque * FRECUENCIA) * 2
+    try:
+        while True:
+            datos = proc.stdout.read(tam)
+            if not datos: break
+            yield np.frombuffer(datos[:len(datos) - len(datos) % 2], dtype=np.int16)
+    finally:
+        if proc.poll() is None: proc.kill()
+        proc.stdout.close()
+        error = proc.stderr.read().decode("utf-8", "replace").strip()
+        proc.stderr.close()
+        codigo = proc.wait()
+    if codigo != 0:
+        raise RuntimeError(f"ffmpeg no pudo decodificar el audio: {error}")
+
+
+def niveles_en_streaming(bloques) -> tuple:
+    """(max_dBFS, dBFS, n_muestras) en una pasada, con el mismo cálculo que niveles_dbfs."""
+    pico, suma, total = 0, 0.0, 0
+    for bloque in bloques:
+        if not len(bloque): continue
+        pico = max(pico, int(np.abs(bloque.astype(np.int32)).max()))
+        b = bloque.astype(np.float64)
+        suma += float(np.dot(b, b))
+        total += len(bloque)
+    rms = int(np.sqrt(suma / total)) if total else 0
+    max_db = 20 * np.log10(pico / MAX_AMPLITUD) if pico else -float("inf")
+    avg_db = 20 * np.log10(rms / MAX_AMPLITUD) if rms else -float("inf")
+    return float(max_db), float(avg_db), total
+
+
+# ================= DETECCIÓN INCREMENTAL DE INTERVENCIONES =================
+
+class DetectorIncremental:
+    """
+    Versión por bloques de detectar_intervenciones (misma semántica que pydub.detect_nonsilent).
+    `alimentar(bloque)` devuelve las intervenciones que ya se han cerrado como tuplas
+    (inicio_ms, fin_ms, muestras), donde `muestras` incluye `margen_ms` a cada lado
+    (igual que a_segmento(muestras, inicio - margen, fin + margen)). `finalizar()` entrega el resto.
+    """
+
+    def __init__(self, min_silence_len: int, silence_thresh: float, seek_step: int = 1, margen_ms: int = 200):
+        self.msl = min_silence_len
+        self.step = seek_step
+        self.margen = margen_ms
+        self.umbral = (10 ** (silence_thresh / 20)) * MAX_AMPLITUD
+        self.g = gcd(seek_step, min_silence_len)
+        self.tam_frame = self.g * MUESTRAS_POR_MS
+        self.n_ventana = min_silence_len * MUESTRAS_POR_MS
+
+        self.total = 0                                  # muestras recibidas
+        self._buf = np.empty(0, dtype=np.int16)         # muestras retenidas [_buf_ini, total)
+        self._buf_ini = 0
+        self._frames = np.empty(0, dtype=np.int64)      # energía de frames completos desde _f0
+        self._f0 = 0
+        self._siguiente_s = 0                           # próxima ventana (ms) por evaluar
+        self._grupo = None                              # [inicio, último inicio] del silencio abierto
+        self._pendientes = deque()                      # intervenciones cerradas a la espera de su audio
+
+    # --- entrada ---
+
+    def alimentar(self, bloque: np.ndarray) -> list:
+        self._buf = np.concatenate((self._buf, bloque)) if len(self._buf) else np.array(bloque, dtype=np.int16)
+        self.total += len(bloque)
+        self._actualizar_frames()
+        self._evaluar_ventanas_completas()
+        salida = self._emitir(final=False)
+        self._recortar()
+        return salida
+
+    def finalizar(self) -> list:
+        seg_len = round(1000 * self.total / FRECUENCIA)
+        if seg_len < self.msl:
+            # Sin ventanas posibles: todo es intervención (pydub devuelve [[0, len]])
+            self._pendientes.append((0, seg_len))
+        else:
+            last_slice_start = seg_len - self.msl
+            # Ventanas que rozan el final: pydub las rellena con ceros
+            for s in range(self._siguiente_s, last_slice_start + 1, self.step):
+                if self._rms_directo(s) <= self.umbral: self._marcar_silencio(s)
+            if last_slice_start % self.step and self._rms_directo(last_slice_start) <= self.umbral:
+                self._marcar_silencio(last_slice_start)
+
+            if self._grupo is None:
+                self._pendientes.append((0, seg_len))
+            elif self._grupo[1] + self.msl != seg_len:
+                self._pendientes.append((self._grupo[1] + self.msl, seg_len))
+        return self._emitir(final=True)
+
+    # --- energía y ventanas ---
+
+    def _actualizar_frames(self):
+        f_hasta = self._f0 + len(self._frames)
+        f_nuevo = self.total // self.tam_frame
+        if f_nuevo <= f_hasta: return
+        ini = f_hasta * self.tam_frame - self._buf_ini
+        datos = self._buf[ini:ini + (f_nuevo - f_hasta) * self.tam_frame].astype(np.float64)
+        matriz = datos.reshape(f_nuevo - f_hasta, self.tam_frame)
+        self._frames = np.concatenate((self._frames, np.einsum('ij,ij->i', matriz, matriz).astype(np.int64)))
+
+    def _evaluar_ventanas_completas(self):
+        f_hasta = self._f0 + len(self._frames)
+        s_max = f_hasta * self.g - self.msl
+        if s_max < self._siguiente_s: return
+        inicios = np.arange(self._siguiente_s, s_max + 1, self.step, dtype=np.int64)
+        prefijo = np.concatenate(([0], np.cumsum(self._frames)))
+        suma = (prefijo[(inicios + self.msl) // self.g - self._f0] - prefijo[inicios // self.g - self._f0]).astype(np.float64)
+        for s in inicios[rms_audioop(suma, self.n_ventana) <= self.umbral]:
+            self._marcar_silencio(int(s))
+        self._siguiente_s = int(inicios[-1]) + self.step
+
+    def _rms_directo(self, s: int):
+        ini = s * MUESTRAS_POR_MS - self._buf_ini
+        ventana = self._buf[max(0, ini):ini + self.n_ventana].astype(np.float64)
+        return rms_audioop(np.dot(ventana, ventana), self.n_ventana)
+
+    def _marcar_silencio(self, s: int):
+        # Misma agrupación que pydub.detect_silence, aplicada según llegan los inicios
+        if self._grupo is None:
+            self._grupo = [s, s]
+            if s > 0: self._pendientes.append((0, s))
+            return
+        prev = self._grupo[1]
+        if s - prev != self.step and s - prev > self.msl:
+            self._pendientes.append((prev + self.msl, s))
+            self._grupo = [s, s]
+        else:
+            self._grupo[1] = s
+
+    # --- salida y memoria ---
+
+    def _emitir(self, final: bool) -> list:
+        salida = []
+        while self._pendientes:
+            ini, fin = self._pendientes[0]
+            fin_muestra = min(self.total, (fin + self.margen) * MUESTRAS_POR_MS)
+            if not final and fin_muestra < (fin + self.margen) * MUESTRAS_POR_MS: break
+            ini_muestra = max(0, ini - self.margen) * MUESTRAS_POR_MS
+            self._pendientes.popleft()
+            salida.append((ini, fin, self._buf[ini_muestra - self._buf_ini:max(ini_muestra, fin_muestra) - self._buf_ini].copy()))
+        return salida
+
+    def _recortar(self):
+        limites = [
+            max(0, self._siguiente_s - self.step) * MUESTRAS_POR_MS,        # ventanas por evaluar
+            (self._f0 + len(self._frames)) * self.tam_frame,                # frame incompleto
+            max(0, (self._grupo[1] + self.msl if self._grupo else 0) - self.margen) * MUESTRAS_POR_MS,
+        ]
+        limites += [max(0, ini - self.margen) * MUESTRAS_POR_MS for ini, _ in self._pendientes]
+        corte = min(limites) - self._buf_ini
+        if corte > 0:
+            self._buf = self._buf[corte:].copy()
+            self._buf_ini += corte
+        f_corte = self._siguiente_s // self.g - self._f0
+        if f_corte > 0:
+            self._frames = self._frames[f_corte:]
+            self._f0 += f_corte
+
+
+def intervenciones_en_streaming(bloques, min_silence_len: int, silence_thresh: float, seek_step: int = 100, margen_ms: int = 200):
+    """Genera (inicio_ms, fin_ms, muestras_con_margen) según se cierra cada intervención."""
+    detector = DetectorIncremental(min_silence_len, silence_thresh, seek_step, margen_ms)
+    for bloque in bloques:
+        yield from detector.alimentar(bloque)
+    yield from detector.finalizar()
@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+from transcriptor.acta import ActaIncremental, cabecera_acta
+
+# ================= TRABAJOS REANUDABLES (DIARIO EN DISCO) =================
+# Cada examen + ajustes es un trabajo con id estable. Cada segmento cerrado se añade (en
+# orden) a un diario JSONL; si la sesión se cae o el contenedor se reinicia, al relanzar el
+# mismo trabajo se saltan los segmentos ya anotados y el acta se reconstruye desde el diario.
+# Las intervenciones fallidas (ERROR) también se anotan, para verlas en el acta, pero no cuentan
+# como hechas: el trabajo queda "con_errores" y al relanzarlo se reenvían.
+# Un solo ejecutor por trabajo a la vez (flock sobre su carpeta): dos sesiones, o una pestaña y
+# el worker, intercalarían sus entradas en el diario.
+
+
+class TrabajoOcupadoError(Exception):
+    """Otro proceso o sesión está ejecutando ya este trabajo."""
+
+
+def id_trabajo(hash_audio: str, umbral_db: int, min_silence_ms: int, modelo: str, version_prompt: str) -> str:
+    partes = [hash_audio, int(umbral_db), int(min_silence_ms), modelo, version_prompt]
+    return hashlib.sha256(json.dumps(partes).encode("utf-8")).hexdigest()[:24]
+
+
+class Trabajo:
+
+    def __init__(self, directorio: str, id_trab: str):
+        self.id = id_trab
+        self.ruta = os.path.join(directorio, id_trab)
+        self._ruta_meta = os.path.join(self.ruta, "trabajo.json")
+        self._ruta_diario = os.path.join(self.ruta, "diario.jsonl")
+        self._ruta_bloqueo = os.path.join(self.ruta, "bloqueo")
+
+    @property
+    def existe(self) -> bool:
+        return os.path.exists(self._ruta_meta)
+
+    @property
+    def meta(self) -> dict:
+        try:
+            with open(self._ruta_meta, encoding="utf-8") as f: return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def actualizar(self, **campos):
+        """Escritura atómica de los metadatos (nombre, chunks, lengua B, estado...)."""
+        os.makedirs(self.ruta, exist_ok=True)
+        meta = self.meta
+        meta.update(campos)
+        tmp = self._ruta_meta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self._ruta_meta)
+
+    @contextmanager
+    def en_exclusiva(self):
+        """Bloqueo exclusivo del trabajo mientras dura una ejecución (TrabajoOcupadoError si ya lo tiene otro)."""
+        os.makedirs(self.ruta, exist_ok=True)
+        with open(self._ruta_bloqueo, "a") as f:
+            if fcntl:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise TrabajoOcupadoError("Este examen ya se está transcribiendo en otra sesión o en la cola.") from None
+            try:
+                yield self
+            finally:
+                if fcntl: fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @property
+    def terminado(self) -> bool:
+        return self.meta.get("estado") == "completado"
+
+    def _entradas(self) -> list:
+        """Prefijo contiguo del diario (se ignora una última línea a medio escribir)."""
+        entradas = []
+        try:
+            with open(self._ruta_diario, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        entrada = json.loads(linea)
+                    except json.JSONDecodeError:
+                        break
+                    if entrada.get("i") != len(entradas): break
+                    entradas.append(entrada)
+        except FileNotFoundError:
+            pass
+        return entradas
+
+    def resultados(self) -> list:
+        """
+        Resultados reanudables: el prefijo del diario hasta la primera intervención fallida
+        (ERROR de la API), que al relanzar se vuelve a enviar junto con todo lo posterior.
+        """
+        resultados = []
+        for e in self._entradas():
+            if e.get("idioma") == "ERROR": break
+            resultados.append({"idioma": e.get("idioma", "??"), "texto": e.get("texto", "")})
+        return resultados
+
+    def anotar(self, i: int, dat: dict, inicio_ms: int = None):
+        entrada = {"i": i, "idioma": dat.get("idioma", "??"), "texto": dat.get("texto", "")}
+        if inicio_ms is not None: entrada["inicio"] = inicio_ms
+        linea = json.dumps(entrada, ensure_ascii=False)
+        with open(self._ruta_diario, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+            f.flush(); os.fsync(f.fileno())
+
+    def truncar(self, n: int):
+        """Deja solo los n primeros resultados válidos (limpia restos de una escritura cortada)."""
+        entradas = self._entradas()[:n]
+        tmp = self._ruta_diario + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entrada in entradas:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._ruta_diario)
+
+
+def _inicio(entrada: dict, meta: dict) -> int:
+    # En modo streaming los rangos no se conocen hasta el final: el diario guarda el inicio
+    return entrada["inicio"] if "inicio" in entrada else meta["chunks"][entrada["i"]][0]
+
+
+class SeguimientoActa:
+    """
+    Acta de un trabajo leída del diario de forma incremental, para verla crecer mientras se
+    transcribe (en este proceso o en un worker): actualizar() solo lee las líneas nuevas.
+    """
+
+    def __init__(self, trabajo: Trabajo):
+        self.trabajo = trabajo
+        self.acta = ActaIncremental()
+        self._inodo, self._posicion = None, 0
+
+    def actualizar(self) -> tuple:
+        """
+        Lee lo añadido al diario desde la última llamada -> (bloques nuevos, reiniciado). Si el
+        diario se ha reescrito (truncar al reanudar), el acta se rehace desde el principio,
+        `reiniciado` es True y los bloques nuevos son todos.
+        """
+        meta = self.trabajo.meta
+        if not self.acta.cabecera and "iso_lb" in meta:
+            self.acta.cabecera = cabecera_acta(meta.get("nombre", ""), meta["lengua_b"], meta["iso_lb"])
+        try:
+            with open(self.trabajo._ruta_diario, "rb") as f:
+                estado = os.fstat(f.fileno())
+                reiniciado = False
+                if estado.st_ino != self._inodo or estado.st_size < self._posicion:
+                    reiniciado = self._inodo is not None
+                    self.acta = ActaIncremental(self.acta.cabecera)
+                    self._inodo, self._posicion = estado.st_ino, 0
+                f.seek(self._posicion)
+                datos = f.read()
+        except FileNotFoundError:
+            return [], False
+
+        nuevos = []
+        for linea in datos.splitlines(keepends=True):
+            # Misma regla que _entradas: se para en una línea a medio escribir o fuera de orden
+            if not linea.endswith(b"\n"): break
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                break
+            if entrada.get("i") != len(self.acta): break
+            self.acta.agregar(_inicio(entrada, meta), entrada)
+            nuevos.append(self.acta.bloques[-1])
+            self._posicion += len(linea)
+        return nuevos, reiniciado
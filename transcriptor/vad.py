@@ -0,0 +1,235 @@
+from math import gcd
+
+import numpy as np
+
+from transcriptor.audio import MAX_AMPLITUD, MUESTRAS_POR_MS, duracion_ms, niveles_dbfs
+from transcriptor.empaquetado import FRAME_CORTE_MS, cortes_por_energia
+from transcriptor.metricas import tramo
+
+# ================= DETECCIÓN DE SILENCIOS (NUMPY) =================
+# Reimplementación vectorizada de pydub.silence.detect_silence / detect_nonsilent.
+# Misma semántica (ventanas de min_silence_len cada seek_step ms, RMS entero de
+# audioop comparado con el umbral) y mismos rangos [inicio, fin] en ms, pero con
+# una sola pasada de energía por bloques en lugar de un bucle Python por ventana.
+
+MUESTRAS_POR_LOTE = 1 << 20
+
+
+def _energia_por_bloques(muestras: np.ndarray, tam_bloque: int) -> np.ndarray:
+    """Suma de cuadrados por bloque de `tam_bloque` muestras (el último puede ser parcial)."""
+    n_bloques = -(-len(muestras) // tam_bloque)
+    energia = np.zeros(n_bloques, dtype=np.int64)
+    paso = max(1, MUESTRAS_POR_LOTE // tam_bloque) * tam_bloque
+    for ini in range(0, len(muestras), paso):
+        lote = muestras[ini:ini + paso].astype(np.float64)
+        completos = len(lote) // tam_bloque
+        b0 = ini // tam_bloque
+        if completos:
+            matriz = lote[:completos * tam_bloque].reshape(completos, tam_bloque)
+            # float64 es exacto aquí: cada bloque suma < 2**53
+            energia[b0:b0 + completos] = np.einsum('ij,ij->i', matriz, matriz)
+        resto = lote[completos * tam_bloque:]
+        if len(resto):
+            energia[b0 + completos] = np.dot(resto, resto)
+    return energia
+
+
+def rms_audioop(suma, n: int):
+    # audioop.rms: (unsigned int) sqrt(suma / n)
+    return np.floor(np.sqrt(suma / n)) if n else 0
+
+
+def _silencios_desde_prefijo(prefijo: np.ndarray, g: int, seg_len: int, min_silence_len: int, umbral: float,
+                             seek_step: int, energia_final) -> list:
+    """
+    Núcleo de detectar_silencios sobre la energía acumulada por bloques de `g` ms (g divide a
+    seek_step y a min_silence_len). `energia_final(inicio)` da la de la última ventana.
+    """
+    # pydub rellena con ceros las ventanas que rozan el final: n siempre es la ventana completa
+    n = min_silence_len * MUESTRAS_POR_MS
+
+    last_slice_start = seg_len - min_silence_len
+    inicios = np.arange(0, last_slice_start + 1, seek_step, dtype=np.int64)
+
+    b_ini = np.minimum(inicios // g, len(prefijo) - 1)
+    b_fin = np.minimum((inicios + min_silence_len) // g, len(prefijo) - 1)
+    suma = (prefijo[b_fin] - prefijo[b_ini]).astype(np.float64)
+    silencio = rms_audioop(suma, n) <= umbral
+    silence_starts = inicios[silencio]
+
+    # pydub añade siempre la última ventana aunque no caiga en el paso
+    if last_slice_start % seek_step:
+        if rms_audioop(float(energia_final(last_slice_start)), n) <= umbral:
+            silence_starts = np.append(silence_starts, last_slice_start)
+
+    if not len(silence_starts): return []
+
+    # Agrupar ventanas contiguas o solapadas (misma regla que pydub)
+    saltos = np.diff(silence_starts)
+    corte = (saltos != seek_step) & (saltos > min_silence_len)
+    idx_corte = np.flatnonzero(corte)
+    primeros = np.concatenate(([0], idx_corte + 1))
+    ultimos = np.concatenate((idx_corte, [len(silence_starts) - 1]))
+    return [[int(silence_starts[a]), int(silence_starts[b]) + min_silence_len] for a, b in zip(primeros, ultimos)]
+
+
+def detectar_silencios(muestras: np.ndarray, min_silence_len: int = 1000, silence_thresh: float = -16, seek_step: int = 1) -> list:
+    seg_len = duracion_ms(muestras)
+    if seg_len < min_silence_len: return []
+
+    umbral = (10 ** (silence_thresh / 20)) * MAX_AMPLITUD
+    # Bloques de gcd(seek_step, min_silence_len) ms: toda ventana alineada es suma de bloques enteros
+    g = gcd(seek_step, min_silence_len)
+    prefijo = np.concatenate(([0], np.cumsum(_energia_por_bloques(muestras, g * MUESTRAS_POR_MS))))
+
+    def energia_final(inicio):
+        ventana = muestras[inicio * MUESTRAS_POR_MS:(inicio + min_silence_len) * MUESTRAS_POR_MS].astype(np.float64)
+        return np.dot(ventana, ventana)
+
+    return _silencios_desde_prefijo(prefijo, g, seg_len, min_silence_len, umbral, seek_step, energia_final)
+
+
+def _intervenciones_desde_silencios(silent_ranges: list, len_seg: int) -> list:
+    if not silent_ranges: return [[0, len_seg]]
+    if silent_ranges[0][0] == 0 and silent_ranges[0][1] == len_seg: return []
+
+    prev_end_i = 0
+    nonsilent_ranges = []
+    for start_i, end_i in silent_ranges:
+        nonsilent_ranges.append([prev_end_i, start_i])
+        prev_end_i = end_i
+
+    if end_i != len_seg:
+        nonsilent_ranges.append([prev_end_i, len_seg])
+
+    if nonsilent_ranges[0] == [0, 0]:
+        nonsilent_ranges.pop(0)
+
+    return nonsilent_ranges
+
+
+def detectar_intervenciones(muestras: np.ndarray, min_silence_len: int = 1000, silence_thresh: float = -16, seek_step: int = 1) -> list:
+    """Sustituto directo de pydub.silence.detect_nonsilent sobre el buffer PCM compartido."""
+    return _intervenciones_desde_silencios(detectar_silencios(muestras, min_silence_len, silence_thresh, seek_step), duracion_ms(muestras))
+
+
+def intervenciones_con_respaldo(detectar, max_peak: float, umbral_db: int, min_silence_ms: int, avisar=None) -> list:
+    """
+    Umbral relativo al pico; si no sale ninguna intervención, segunda pasada con alta
+    sensibilidad. `detectar(min_silence_ms, silence_thresh)` hace la detección en sí.
+    """
+    chunks = detectar(min_silence_ms, max_peak + umbral_db)
+    if not chunks:
+        if avisar: avisar("⚠️ Voz muy baja. Reintentando con alta sensibilidad...")
+        chunks = detectar(1000, max_peak - 50)
+    return chunks
+
+
+# ================= PERFIL DE ENERGÍA (VISTA PREVIA INSTANTÁNEA) =================
+# La detección solo depende de la energía por ventanas alineadas a seek_step. Guardando la
+# energía acumulada por bloques de 10 ms (~3 MB por hora de audio) se responde a cualquier
+# combinación de sensibilidad y silencio mínimo en milisegundos, con los mismos rangos que
+# detectar_chunks + partir_largos sobre las muestras. La última ventana de pydub (que no cae
+# en el paso) sale de la energía por ms de los últimos COLA_PERFIL_MS.
+
+MS_BLOQUE_PERFIL = 10
+COLA_PERFIL_MS = 10000
+PASO_VAD_MS = 100                 # seek_step del pipeline
+RANGO_UMBRAL_DB = (-60, -10)      # Mismo rango que el slider de la app
+MAX_COBERTURA = 0.9               # Una "intervención" que cubre casi todo el audio es ruido de fondo
+
+
+class PerfilEnergia:
+    """Energía acumulada de un audio, calculada una vez por archivo."""
+
+    def __init__(self, prefijo: np.ndarray, cola: np.ndarray, inicio_cola: int, n_muestras: int, max_peak: float, avg: float):
+        self.prefijo, self.cola, self.inicio_cola = prefijo, cola, inicio_cola
+        self.n_muestras = n_muestras
+        self.duracion = round(n_muestras / MUESTRAS_POR_MS)
+        self.max_peak, self.avg = max_peak, avg
+
+    @classmethod
+    def desde_muestras(cls, muestras: np.ndarray) -> "PerfilEnergia":
+        prefijo = np.concatenate(([0], np.cumsum(_energia_por_bloques(muestras, MS_BLOQUE_PERFIL * MUESTRAS_POR_MS))))
+        seg_len = duracion_ms(muestras)
+        inicio_cola = max(0, seg_len - COLA_PERFIL_MS)
+        ultimos = muestras[inicio_cola * MUESTRAS_POR_MS:seg_len * MUESTRAS_POR_MS]
+        cola = np.concatenate(([0], np.cumsum(_energia_por_bloques(ultimos, MUESTRAS_POR_MS))))
+        return cls(prefijo, cola, inicio_cola, len(muestras), *niveles_dbfs(muestras))
+
+    @property
+    def nbytes(self) -> int:
+        return self.prefijo.nbytes + self.cola.nbytes
+
+    def intervenciones(self, silence_thresh: float, min_silence_len: int, seek_step: int = PASO_VAD_MS) -> list:
+        """detectar_intervenciones(muestras, min_silence_len, silence_thresh, seek_step) sin las muestras."""
+        if gcd(seek_step, min_silence_len) % MS_BLOQUE_PERFIL or min_silence_len > COLA_PERFIL_MS:
+            raise ValueError(f"El perfil solo admite silencios múltiplos de {MS_BLOQUE_PERFIL} ms y de hasta {COLA_PERFIL_MS} ms")
+        if self.duracion < min_silence_len: return [[0, self.duracion]]
+        umbral = (10 ** (silence_thresh / 20)) * MAX_AMPLITUD
+        energia_final = lambda inicio: self.cola[-1] - self.cola[inicio - self.inicio_cola]
+        silencios = _silencios_desde_prefijo(self.prefijo, MS_BLOQUE_PERFIL, self.duracion, min_silence_len, umbral, seek_step, energia_final)
+        return _intervenciones_desde_silencios(silencios, self.duracion)
+
+    def _energia_frames(self, inicio: int, fin: int) -> np.ndarray:
+        # Frames completos de FRAME_CORTE_MS desde `inicio`, como puntos_de_corte sobre las muestras
+        n_frames = (min(self.n_muestras, fin * MUESTRAS_POR_MS) - inicio * MUESTRAS_POR_MS) // (FRAME_CORTE_MS * MUESTRAS_POR_MS)
+        por_frame = FRAME_CORTE_MS // MS_BLOQUE_PERFIL
+        idx = inicio // MS_BLOQUE_PERFIL + por_frame * np.arange(n_frames + 1)
+        return np.diff(self.prefijo[idx]).astype(np.float64)
+
+    def chunks(self, umbral_db: int, min_silence_ms: int, max_segmento_ms: int = 0) -> list:
+        """Mismos rangos que partir_largos(detectar_chunks(...)) del pipeline ([] si no hay voz)."""
+        detectar = lambda ms, thresh: self.intervenciones(thresh, ms)
+        resultado = []
+        for inicio, fin in intervenciones_con_respaldo(detectar, self.max_peak, umbral_db, min_silence_ms):
+            total_ms = (min(self.n_muestras, fin * MUESTRAS_POR_MS) - inicio * MUESTRAS_POR_MS) // MUESTRAS_POR_MS
+            cortes = cortes_por_energia(self._energia_frames(inicio, fin), total_ms, max_segmento_ms) if max_segmento_ms else []
+            limites = [inicio] + [inicio + c for c in cortes] + [fin]
+            resultado += [[a, b] for a, b in zip(limites, limites[1:])]
+        return resultado
+
+    def autocalibrar(self, min_silence_ms: int = 2000) -> tuple:
+        """
+        Busca la sensibilidad en todo el rango del slider: el centro del tramo más ancho de
+        umbrales que dan (casi) las mismas intervenciones, es decir, el ajuste más estable frente
+        a pequeños cambios. Mismo formato que autocalibrar_niveles, que queda como respaldo.
+        """
+        respaldo = autocalibrar_niveles(self.max_peak, self.avg)
+        candidatos = []
+        for umbral_db in range(RANGO_UMBRAL_DB[0], RANGO_UMBRAL_DB[1] + 1):
+            rangos = self.intervenciones(self.max_peak + umbral_db, min_silence_ms)
+            cubierto = sum(fin - ini for ini, fin in rangos)
+            candidatos.append((umbral_db, len(rangos) if rangos and cubierto < MAX_COBERTURA * self.duracion else None))
+
+        mejor, tramo_actual = [], []
+        for umbral_db, n in candidatos:
+            # Un tramo sigue mientras el número de intervenciones no se aleja >10 % del inicial
+            if n is not None and tramo_actual and abs(n - tramo_actual[0][1]) <= max(1, 0.1 * tramo_actual[0][1]):
+                tramo_actual.append((umbral_db, n))
+            else:
+                tramo_actual = [(umbral_db, n)] if n is not None else []
+            centro = lambda t: t[len(t) // 2][0]
+            if len(tramo_actual) > len(mejor) or (
+                len(tramo_actual) == len(mejor) and mejor and abs(centro(tramo_actual) - respaldo[0]) < abs(centro(mejor) - respaldo[0])
+            ):
+                mejor = list(tramo_actual)
+        if not mejor: return respaldo
+        return mejor[len(mejor) // 2][0], self.max_peak, self.avg
+
+
+# ================= LÓGICA DE AUTO-CALIBRACIÓN =================
+
+def autocalibrar_audio(muestras: np.ndarray, min_silence_ms: int = 2000):
+    with tramo("calibracion"):
+        return PerfilEnergia.desde_muestras(muestras).autocalibrar(min_silence_ms)
+
+def autocalibrar_niveles(peak: float, avg: float):
+    try:
+        target_threshold = avg - 10 
+        suggested_slider = target_threshold - peak
+        suggested_slider = max(-60, min(-10, int(suggested_slider)))
+        
+        return suggested_slider, peak, avg
+    except:
+        return -28, 0, 0